@@ -2,7 +2,25 @@ import sys
 import os
 import yt_dlp
 import time
+import re
 import ctypes
+import threading
+import subprocess
+import shutil
+import hashlib
+import itertools
+import sqlite3
+import struct
+import http.server
+import json
+import tempfile
+import queue
+import random
+import urllib.parse
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
 import librosa
 import numpy as np
 from scipy import signal
@@ -12,8 +30,8 @@ __version__ = "1.1.0"
 __author__ = "catwarez@proton.me"
 __app_name__ = "Waver"
 
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QPoint, QUrl, QTimer, QSize, QEvent, QSettings
-from PyQt6.QtGui import QIcon, QPainter, QColor, QPixmap, QFont, QPen
+from PyQt6.QtCore import Qt, QThread, pyqtSignal, QPoint, QUrl, QTimer, QSize, QEvent, QSettings, QStandardPaths, QAbstractTableModel, QAbstractListModel, QModelIndex, QLineF, QObject, QFileSystemWatcher
+from PyQt6.QtGui import QIcon, QPainter, QColor, QPixmap, QFont, QPen, QBrush, QFontMetrics
 from PyQt6.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -23,28 +41,25 @@ from PyQt6.QtWidgets import (
     QLabel,
     QPushButton,
     QLineEdit,
-    QProgressBar,
     QFileDialog,
     QComboBox,
     QCheckBox,
-    QProxyStyle,
     QStyle,
     QStyleOptionComboBox,
+    QPlainTextEdit,
+    QTableView,
+    QHeaderView,
+    QAbstractItemView,
+    QListView,
+    QStyledItemDelegate,
 )
-from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
-
-# --- Custom QProxyStyle to remove focus rectangle for combo boxes ---
-class NoFocusRectStyle(QProxyStyle):
-    def drawPrimitive(self, element, option, painter, widget=None):
-        if element == QStyle.PrimitiveElement.PE_FrameFocusRect:
-            return
-        return super().drawPrimitive(element, option, painter, widget)
 
 # --- Custom ComboBox subclass ---
+# Paints without the focus state, so no focus rectangle is drawn. It keeps the
+# application style (no proxy style) so the theme stylesheet applies to it.
 class NoFocusComboBox(QComboBox):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.setStyle(NoFocusRectStyle(self.style()))
         self.setEditable(False)
     def paintEvent(self, event):
         opt = QStyleOptionComboBox()
@@ -61,42 +76,359 @@ class CustomLineEdit(QLineEdit):
         super().focusOutEvent(event)
         self.focusOut.emit()
 
-# --- Dynamic Progress Bar ---
-class DynamicProgressBar(QProgressBar):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setTextVisible(False)
-        self.setStyleSheet("""
-            QProgressBar {
-                background-color: #151515;
-                border: 1px solid #333;
-                border-radius: 5px;
-                text-align: center;
-                color: white;
-                font: 12pt "Segoe UI";
-            }
-            QProgressBar::chunk {
-                background-color: #39FF14;
-                border-radius: 5px;
-            }
-        """)
-    def paintEvent(self, event):
-        super().paintEvent(event)
-        painter = QPainter(self)
-        value = self.value()
-        text = f"{int(value)}%"
-        textColor = QColor("white") if value < 50 else QColor("black")
-        painter.setPen(QPen(textColor))
-        font = QFont(self.font().family(), self.font().pointSize(), QFont.Weight.Bold)
-        painter.setFont(font)
-        rect = self.rect()
-        painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, text)
-
 # --- Global resource path helper ---
 def resource_path(relative_path):
     base_path = getattr(sys, '_MEIPASS', os.getcwd())
     return os.path.join(base_path, relative_path)
 
+# --- Per-user data folder (library, caches, metrics) ---
+def app_data_path(*parts):
+    base = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.GenericDataLocation)
+    folder = os.path.join(base or os.path.expanduser("~"), __app_name__)
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, *parts)
+
+# --- FFmpeg helpers ---
+def ffmpeg_executable():
+    """The bundled ffmpeg, outside Windows the system one is used when ffmpeg_bin is absent"""
+    exe_name = "ffmpeg.exe" if sys.platform == "win32" else "ffmpeg"
+    bundled = os.path.join(resource_path("ffmpeg_bin/bin"), exe_name)
+    if sys.platform != "win32" and not os.path.exists(bundled):
+        return shutil.which("ffmpeg") or bundled
+    return bundled
+
+def ensure_ffmpeg_on_path():
+    """Some yt-dlp checks (e.g. whether sections can be cut) only search PATH, not ffmpeg_location"""
+    ffmpeg_dir = os.path.dirname(ffmpeg_executable())
+    paths = os.environ.get("PATH", "").split(os.pathsep)
+    if ffmpeg_dir not in paths:
+        os.environ["PATH"] = os.pathsep.join([ffmpeg_dir, *paths])
+
+def run_ffmpeg(args):
+    """Run the bundled ffmpeg without flashing a console window, raise on failure"""
+    creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+    result = subprocess.run(
+        [ffmpeg_executable(), "-hide_banner", "-loglevel", "error", "-y", *args],
+        capture_output=True, text=True, creationflags=creationflags
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg failed: {result.stderr.strip() or result.returncode}")
+    return result
+
+def audio_sample_rate(path):
+    """Sample rate of the first audio stream from ffmpeg's stream listing, None if it can't be read"""
+    creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+    try:
+        result = subprocess.run([ffmpeg_executable(), "-hide_banner", "-i", path], capture_output=True,
+                                encoding="utf-8", errors="replace", timeout=30, creationflags=creationflags)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    match = re.search(r"Stream #.*?Audio:.*?(\d+) Hz", result.stderr)
+    return int(match.group(1)) if match else None
+
+def ffmpeg_filter_path(path):
+    """Quote a file path for use as a filter option value (Windows drive colons included)"""
+    return "'" + path.replace("\\", "/").replace(":", "\\:").replace("'", "'\\''") + "'"
+
+# --- FFmpeg Capabilities ---
+FFMPEG_CAPS_VERSION = 1
+
+# Encoders per audio format, preferred first. The first one is what yt-dlp asks for.
+AUDIO_ENCODERS = {
+    "mp3": ("libmp3lame", "mp3_mf", "libshine"),
+    "wav": ("pcm_s16le",),
+}
+UNKNOWN_FFMPEG = {"version": None, "encoders": {}, "muxers": [], "filters": []}
+
+def _ffmpeg_listing(output):
+    """Split rows of an ffmpeg -encoders/-muxers listing below its legend"""
+    rows = []
+    in_legend = True
+    for line in output.splitlines():
+        if in_legend:
+            in_legend = not (line.strip() and set(line.strip()) == {"-"})
+        elif line.strip():
+            rows.append(line.split(None, 2))
+    return rows
+
+def parse_ffmpeg_capabilities(version_output, encoders_output, muxers_output, filters_output):
+    match = re.match(r"\S+ version (\S+)", version_output)
+    encoders = {row[1]: row[0][0] for row in _ffmpeg_listing(encoders_output) if len(row) > 1}
+    muxers = sorted({name for row in _ffmpeg_listing(muxers_output) if len(row) > 1 and "E" in row[0]
+                     for name in row[1].split(",")})
+    # Filter rows look like " TSC name  A->A  description", the legend has no arrow
+    filters = sorted(row[1] for row in (line.split(None, 3) for line in filters_output.splitlines())
+                     if len(row) > 2 and "->" in row[2])
+    return {
+        "version": match.group(1) if match else None,
+        "encoders": encoders,
+        "muxers": muxers,
+        "filters": filters,
+    }
+
+class FFmpegCapabilities:
+    """Version, encoders, muxers and filters of the ffmpeg in use.
+
+    Probed once per binary and cached in ffmpeg_caps.json keyed by its SHA-256.
+    A binary whose size and modification time match the cache isn't hashed again,
+    so jobs only look the answer up instead of starting probe processes.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.path = None
+        self.manifest = None
+
+    def get(self):
+        path = ffmpeg_executable()
+        with self.lock:
+            # Unknown (missing or broken ffmpeg) is looked at again next time
+            if self.manifest is None or self.manifest is UNKNOWN_FFMPEG or self.path != path:
+                self.manifest = self.load(path)
+                self.path = path
+            return self.manifest
+
+    def load(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return UNKNOWN_FFMPEG
+        cache_path = app_data_path("ffmpeg_caps.json")
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        if cache.get("format") != FFMPEG_CAPS_VERSION:
+            cache = {"format": FFMPEG_CAPS_VERSION, "binaries": {}, "manifests": {}}
+
+        known = cache["binaries"].get(path)
+        if known and known[:2] == [stat.st_size, stat.st_mtime_ns] and known[2] in cache["manifests"]:
+            return cache["manifests"][known[2]]
+        # New or changed binary, an identical copy elsewhere still needs no probe
+        digest = self.file_hash(path)
+        manifest = cache["manifests"].get(digest)
+        if manifest is None:
+            try:
+                manifest = self.probe(path)
+            except (OSError, subprocess.SubprocessError) as e:
+                print("Error probing FFmpeg:", e)
+                return UNKNOWN_FFMPEG
+
+        cache["binaries"][path] = [stat.st_size, stat.st_mtime_ns, digest]
+        cache["manifests"][digest] = manifest
+        used = {entry[2] for entry in cache["binaries"].values()}
+        cache["manifests"] = {key: value for key, value in cache["manifests"].items() if key in used}
+        try:
+            tmp = cache_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(cache, f)
+            os.replace(tmp, cache_path)
+        except OSError as e:
+            print("Error saving FFmpeg capabilities:", e)
+        return manifest
+
+    @staticmethod
+    def file_hash(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def probe(path):
+        flags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+
+        def listing(option):
+            return subprocess.run([path, "-hide_banner", option], capture_output=True, encoding="utf-8",
+                                  errors="replace", timeout=30, creationflags=flags).stdout
+        return parse_ffmpeg_capabilities(listing("-version"), listing("-encoders"),
+                                         listing("-muxers"), listing("-filters"))
+
+    def audio_encoder(self, format_type):
+        """Preferred available encoder for an audio format, None when unknown"""
+        encoders = self.get()["encoders"]
+        return next((name for name in AUDIO_ENCODERS.get(format_type, ()) if name in encoders), None)
+
+    def has_filters(self, *names):
+        """Whether all filters exist, assumed when ffmpeg couldn't be probed"""
+        filters = self.get()["filters"]
+        return not filters or all(name in filters for name in names)
+
+    def describe(self):
+        """One line for the diagnostics panel, without probing from the GUI thread"""
+        manifest = self.manifest
+        if manifest is None:
+            return "FFmpeg: not probed yet"
+        if not manifest["version"]:
+            return f"FFmpeg: not found ({ffmpeg_executable()})"
+        mp3 = next((name for name in AUDIO_ENCODERS["mp3"] if name in manifest["encoders"]), "none")
+        return (f"FFmpeg {manifest['version']} ({self.path}): {len(manifest['encoders'])} encoders, "
+                f"{len(manifest['muxers'])} muxers, {len(manifest['filters'])} filters, MP3 encoder {mp3}")
+
+ffmpeg_caps = FFmpegCapabilities()
+
+# --- Loudness ---
+LOUDNESS_TRUE_PEAK = -1.0  # dBTP ceiling when normalizing
+LOUDNESS_RANGE = 11.0  # LU
+TRUE_PEAK_CHUNK = 1 << 16  # samples per channel oversampled at once
+TRUE_PEAK_OVERLAP = 256
+
+def loudness_filter(metadata_path, target=None, sample_rate=None):
+    """-af graph that measures EBU R128 loudness of what gets encoded, normalizing first if target is set.
+
+    The measurements are printed per 100 ms frame to metadata_path and read back
+    with read_loudness_metadata, so no second decode pass is needed. Without a
+    metadata_path the graph only normalizes. The encoded audio keeps its sample
+    rate: normalized audio is resampled back to sample_rate (48 kHz if unknown).
+    """
+    chain = ""
+    if target:
+        # Single-pass (dynamic) loudnorm, it works and outputs at 192 kHz
+        chain = f"loudnorm=I={target}:TP={LOUDNESS_TRUE_PEAK}:LRA={LOUDNESS_RANGE},"
+    encode = f"aresample={sample_rate or 48000}" if target else "anull"
+    if not metadata_path:
+        return chain + encode
+    # Older ffmpeg builds run ebur128 at 48 kHz only, measuring on a branch of
+    # its own keeps that resampling out of the encoded audio
+    return (f"{chain}asplit[encode][measure];[measure]ebur128=metadata=1:peak=true,"
+            f"ametadata=mode=print:file={ffmpeg_filter_path(metadata_path)},anullsink;[encode]{encode}")
+
+def read_loudness_metadata(metadata_path):
+    """(integrated LUFS, true peak dBTP, loudness range LU) from the last frame ebur128 printed"""
+    values = {}
+    with open(metadata_path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            key, sep, value = line.strip().partition("=")
+            if sep and key in ("lavfi.r128.I", "lavfi.r128.LRA", "lavfi.r128.true_peak"):
+                values[key] = float(value)
+    if "lavfi.r128.I" not in values:
+        return None
+    peak = values.get("lavfi.r128.true_peak", 0.0)
+    return (values["lavfi.r128.I"], float(20 * np.log10(peak)) if peak > 0 else None, values.get("lavfi.r128.LRA"))
+
+def _k_weighting(sr):
+    """BS.1770 pre-filter (high shelf + high pass) as two biquads for any sample rate"""
+    k = np.tan(np.pi * 1681.974450955533 / sr)
+    vh, vb, q = 10 ** (3.999843853973347 / 20), 10 ** (3.999843853973347 / 40), 0.7071752369554196
+    a0 = 1 + k / q + k * k
+    shelf = ([(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0],
+             [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+    k = np.tan(np.pi * 38.13547087602444 / sr)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    highpass = ([1.0, -2.0, 1.0], [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+    return shelf, highpass
+
+def measure_loudness(y, sr):
+    """(integrated LUFS, true peak dBTP, loudness range LU) of decoded audio, channels first.
+
+    Works in float32, only the running power sum is float64 (one row for all channels).
+    """
+    y = np.atleast_2d(np.asarray(y, dtype=np.float32))
+    weighted = y
+    for b, a in _k_weighting(sr):
+        weighted = signal.lfilter(np.float32(b), np.float32(a), weighted, axis=1)
+    # Channel powers summed first, a block's loudness is the sum of the channel means
+    power = np.concatenate([[0.0], np.cumsum(np.square(weighted).sum(axis=0), dtype=np.float64)])
+    del weighted
+
+    def block_loudness(length, step):
+        size, hop = int(length * sr), int(step * sr)
+        if len(power) - 1 < size:
+            return np.empty(0)
+        count = 1 + (len(power) - 1 - size) // hop
+        starts = np.arange(count) * hop
+        means = (power[starts + size] - power[starts]) / size
+        return -0.691 + 10 * np.log10(np.maximum(means, 1e-12))
+
+    momentary = block_loudness(0.4, 0.1)
+    gated = momentary[momentary > -70]
+    integrated = None
+    if len(gated):
+        relative = 10 * np.log10(np.mean(10 ** (gated / 10))) - 10
+        gated = gated[gated > relative]
+        integrated = float(10 * np.log10(np.mean(10 ** (gated / 10))))
+    short_term = block_loudness(3.0, 1.0)
+    short_term = short_term[short_term > -70]
+    loudness_range = None
+    if len(short_term):
+        short_term = short_term[short_term > 10 * np.log10(np.mean(10 ** (short_term / 10))) - 20]
+        low, high = np.percentile(short_term, [10, 95])
+        loudness_range = float(high - low)
+    # 4x oversampling approximates the inter-sample (true) peak, a chunk at a time so
+    # the oversampled signal never exists whole. Chunks overlap so edges don't ring.
+    peak = 0.0
+    for start in range(0, y.shape[1], TRUE_PEAK_CHUNK):
+        end = min(start + TRUE_PEAK_CHUNK, y.shape[1])
+        low = max(start - TRUE_PEAK_OVERLAP, 0)
+        upsampled = signal.resample_poly(y[:, low:end + TRUE_PEAK_OVERLAP], 4, 1, axis=1)
+        peak = max(peak, float(np.max(np.abs(upsampled[:, (start - low) * 4:(end - low) * 4]))))
+    return integrated, float(20 * np.log10(peak)) if peak > 0 else None, loudness_range
+
+# --- Time range helpers ---
+def parse_timestamp(text):
+    """Parse "90", "1:30" or "1:02:03.5" into seconds, None when empty"""
+    text = (text or "").strip()
+    if not text:
+        return None
+    seconds = 0.0
+    for part in text.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def parse_time_range(text):
+    """Parse "1:30-2:00" (or "1:30-" for "until the end") into (start, end)"""
+    start, sep, end = (text or "").partition("-")
+    if not sep:
+        raise ValueError(f"Invalid time range: {text}")
+    start, end = parse_timestamp(start) or 0.0, parse_timestamp(end)
+    if end is not None and end <= start:
+        raise ValueError(f"Time range ends before it starts: {text}")
+    return start, end
+
+def split_url_and_range(line):
+    """Split a batch line like "https://youtu.be/... 1:30-2:00" into (url, section or None)"""
+    parts = (line or "").split()
+    if len(parts) >= 2 and re.fullmatch(r"[\d:.]*-[\d:.]*", parts[-1]):
+        return " ".join(parts[:-1]), parse_time_range(parts[-1])
+    return (line or "").strip(), None
+
+def format_timestamp(seconds):
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{secs:02d}s" if hours else f"{minutes}m{secs:02d}s"
+
+# --- Link helpers ---
+URL_PATTERN = re.compile(r"https?://[^\s<>\"']+")
+YOUTUBE_ID_PATTERN = re.compile(
+    r"(?:youtube\.com/(?:watch\?(?:[^#\s]*&)?v=|shorts/|embed/|live/)|youtu\.be/)([A-Za-z0-9_-]{11})")
+
+def url_key(url, section=None):
+    """Identity of a link for dedup: the video id for single YouTube videos, else the normalized URL"""
+    match = YOUTUBE_ID_PATTERN.search(url)
+    key = "youtube:" + match.group(1) if match and "list=" not in url else url.split("#")[0].rstrip("/")
+    return f"{key}@{section[0]}-{section[1]}" if section else key
+
+def extract_links(text, youtube_only=False):
+    """[(url, section)] for every line of text that contains a link ("<url> 1:30-2:00" keeps its range)"""
+    links = []
+    for line in (text or "").splitlines():
+        urls = URL_PATTERN.findall(line)
+        section = None
+        if len(urls) == 1:
+            # A single link may be followed by a time range
+            try:
+                url, section = split_url_and_range(line[line.index(urls[0]):])
+                section = section if url == urls[0] else None
+            except ValueError:
+                pass
+        for url in urls:
+            if youtube_only and not YOUTUBE_ID_PATTERN.search(url) and "list=" not in url:
+                continue
+            links.append((url, section))
+    return links
+
 # --- Force taskbar icon update ---
 def forceTaskbarIcon(winId):
     GCL_HICON = -14
@@ -110,6 +442,1485 @@ def forceTaskbarIcon(winId):
     else:
         print("Failed to load icon via LoadImageW")
 
+# --- Bandwidth Scheduler ---
+# Job priorities, lower value wins when the link is contended
+PRIORITY_SINGLE = 0
+PRIORITY_PLAYLIST = 1
+
+def parse_bandwidth_schedule(text):
+    """Parse a schedule like "09:00-18:00=512, 18:00-09:00=0" (KB/s, 0 = unlimited)"""
+    windows = []
+    for entry in (text or "").replace(";", ",").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            span, rate = entry.split("=")
+            start, end = span.split("-")
+            start_h, start_m = (int(part) for part in start.strip().split(":"))
+            end_h, end_m = (int(part) for part in end.strip().split(":"))
+            windows.append((start_h * 60 + start_m, end_h * 60 + end_m, int(float(rate)) * 1024))
+        except ValueError:
+            print(f"Ignoring invalid bandwidth schedule entry: {entry}")
+    return windows
+
+class BandwidthScheduler:
+    """Global token bucket shared by every active DownloadWorker transfer.
+
+    Workers report received bytes from yt-dlp's progress hook and are held
+    there until the bucket covers them. While the link is contended, waiting
+    transfers are served strictly by priority, so interactive downloads keep
+    their speed and playlist backlog soaks up the leftover capacity.
+    """
+    def __init__(self, rate_limit=0, schedule=None):
+        self._cond = threading.Condition()
+        self.rate_limit = rate_limit  # bytes per second, 0 = unlimited
+        self.schedule = schedule or []  # [(start_minute, end_minute, bytes per second)]
+        self._tokens = 0.0
+        self._last_refill = time.monotonic()
+        self._waiting = {PRIORITY_SINGLE: 0, PRIORITY_PLAYLIST: 0}
+        self.total_bytes = 0
+
+    def configure(self, rate_limit, schedule=None):
+        with self._cond:
+            self.rate_limit = max(0, int(rate_limit))
+            self.schedule = schedule or []
+            self._cond.notify_all()
+
+    def current_rate(self):
+        """Rate for the current time of day, schedule windows override the global limit"""
+        now = time.localtime()
+        minute = now.tm_hour * 60 + now.tm_min
+        for start, end, rate in self.schedule:
+            if start <= end:
+                if start <= minute < end:
+                    return rate
+            elif minute >= start or minute < end:  # Window wraps past midnight
+                return rate
+        return self.rate_limit
+
+    def register(self, priority=PRIORITY_SINGLE):
+        return {'priority': priority, 'filename': None, 'reported': 0}
+
+    def _refill(self, rate):
+        now = time.monotonic()
+        # Allow at most one second of burst so idle periods don't bank bandwidth
+        self._tokens = min(float(rate), self._tokens + (now - self._last_refill) * rate)
+        self._last_refill = now
+
+    def throttle(self, handle, info):
+        """Account for a yt-dlp progress update and block until it fits the budget"""
+        downloaded = info.get('downloaded_bytes') or 0
+        filename = info.get('filename')
+        with self._cond:
+            if filename != handle['filename'] or downloaded < handle['reported']:
+                # A new file (playlist entry, separate stream) restarts the byte count
+                handle['filename'] = filename
+                handle['reported'] = 0
+            delta = downloaded - handle['reported']
+            handle['reported'] = downloaded
+            self.total_bytes += delta
+            if delta <= 0:
+                return
+            priority = handle['priority']
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    rate = self.current_rate()
+                    if not rate:
+                        return
+                    self._refill(rate)
+                    outranked = any(self._waiting[p] for p in self._waiting if p < priority)
+                    if self._tokens > 0 and not outranked:
+                        # Bytes already arrived, so the bucket may go into debt
+                        self._tokens -= delta
+                        return
+                    deficit = max(-self._tokens, 1.0)
+                    self._cond.wait(min(deficit / rate, 0.25))
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+bandwidth_scheduler = BandwidthScheduler()
+
+# --- YoutubeDL Session Pool ---
+class YoutubeDLPool:
+    """Long-lived YoutubeDL instances keyed by option profile.
+
+    Building a YoutubeDL sets up extractors, the cookie jar and HTTP handlers,
+    so back-to-back jobs borrow an idle instance with the same options and keep
+    its open connections. Each instance is only used by one worker at a time.
+    """
+    # Options that change per job, applied on checkout instead of keying the profile
+    JOB_OPTIONS = ('progress_hooks', 'postprocessor_hooks', 'download_ranges', 'force_keyframes_at_cuts')
+    HOOK_OPTIONS = ('progress_hooks', 'postprocessor_hooks')
+
+    def __init__(self, max_idle=8, idle_timeout=300):
+        self._lock = threading.Lock()
+        self._idle = []  # [(profile, session, returned_at)], oldest first
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+
+    @staticmethod
+    def profile_key(options):
+        return repr(sorted((k, v) for k, v in options.items() if k not in YoutubeDLPool.JOB_OPTIONS))
+
+    @contextmanager
+    def session(self, options):
+        profile = self.profile_key(options)
+        session = self._checkout(profile, options)
+        for key in self.JOB_OPTIONS:
+            if key in self.HOOK_OPTIONS:
+                session['hooks'][key] = list(options.get(key, []))
+            elif key in options:
+                session['ydl'].params[key] = options[key]
+        reusable = False
+        try:
+            yield session['ydl']
+            reusable = True
+        finally:
+            for key in self.JOB_OPTIONS:
+                if key in self.HOOK_OPTIONS:
+                    session['hooks'][key] = []
+                else:
+                    session['ydl'].params.pop(key, None)
+            if reusable:
+                self._checkin(profile, session)
+            else:
+                # Don't hand a session that failed mid-job to the next worker
+                self._close(session)
+
+    def _checkout(self, profile, options):
+        now = time.monotonic()
+        expired = []
+        found = None
+        with self._lock:
+            for entry in list(self._idle):
+                if now - entry[2] > self.idle_timeout:
+                    self._idle.remove(entry)
+                    expired.append(entry[1])
+                elif found is None and entry[0] == profile:
+                    self._idle.remove(entry)
+                    found = entry[1]
+        for session in expired:
+            self._close(session)
+        return found or self._create(options)
+
+    def _create(self, options):
+        session = {'hooks': {key: [] for key in self.HOOK_OPTIONS}}
+        params = {k: v for k, v in options.items() if k not in self.JOB_OPTIONS}
+
+        def dispatcher(key):
+            last = [None]
+
+            def dispatch(info):
+                # yt-dlp registers postprocessor hooks on each postprocessor twice and
+                # calls them with the same status dict, forward each event once
+                if key == 'postprocessor_hooks':
+                    if info is last[0]:
+                        return
+                    last[0] = info
+                # Forward to whichever job currently holds the session
+                for hook in session['hooks'][key]:
+                    hook(info)
+            return dispatch
+        for key in self.HOOK_OPTIONS:
+            params[key] = [dispatcher(key)]
+        session['ydl'] = yt_dlp.YoutubeDL(params)
+        return session
+
+    def _checkin(self, profile, session):
+        evicted = None
+        with self._lock:
+            self._idle.append((profile, session, time.monotonic()))
+            if len(self._idle) > self.max_idle:
+                evicted = self._idle.pop(0)[1]
+        if evicted:
+            self._close(evicted)
+
+    def _close(self, session):
+        try:
+            session['ydl'].close()
+        except Exception as e:
+            print("Error closing YoutubeDL session:", e)
+
+    def close_all(self):
+        with self._lock:
+            sessions = [entry[1] for entry in self._idle]
+            self._idle = []
+        for session in sessions:
+            self._close(session)
+
+youtube_dl_pool = YoutubeDLPool()
+
+# --- Job Tracing and Metrics ---
+_job_ids = itertools.count(1)
+
+def _children_cpu_time():
+    # CPU of finished child processes (ffmpeg), not reported on Windows
+    times = os.times()
+    return times.children_user + times.children_system
+
+class JobTrace:
+    """Timed spans (wall time, CPU time, bytes, throughput) for the stages of one job"""
+    def __init__(self, job_type, label):
+        self.job_id = next(_job_ids)
+        self.job_type = job_type
+        self.label = label
+        self.started = time.time()
+        self.status = "running"
+        self.spans = []
+        self.memory = None  # {'estimate', 'peak'} bytes, for jobs run by the analysis scheduler
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def begin(self, stage, token=None):
+        """Open a span, spans of the same stage running at once need their own token"""
+        with self._lock:
+            if (stage, token) not in self._open:
+                self._open[(stage, token)] = (time.perf_counter(), time.thread_time(), _children_cpu_time(),
+                                              threading.get_ident())
+
+    def end(self, stage, nbytes=0, extra_cpu=0.0, token=None):
+        with self._lock:
+            opened = self._open.pop((stage, token), None)
+        if opened is None:
+            return None
+        wall_start, cpu_start, children_start, thread_id = opened
+        seconds = time.perf_counter() - wall_start
+        cpu_seconds = _children_cpu_time() - children_start + extra_cpu
+        # Thread CPU is only meaningful when the span ends on the thread that began it
+        if thread_id == threading.get_ident():
+            cpu_seconds += time.thread_time() - cpu_start
+        span = {
+            'stage': stage,
+            'seconds': seconds,
+            'cpu_seconds': cpu_seconds,
+            'bytes': nbytes or 0,
+            'throughput': (nbytes or 0) / seconds if seconds > 0 else 0.0,
+        }
+        with self._lock:
+            self.spans.append(span)
+        metrics.observe_span(self.job_type, span)
+        return span
+
+    @contextmanager
+    def span(self, stage):
+        """Time a block, the block may set result['bytes'] and add to result['cpu_seconds']"""
+        result = {'bytes': 0, 'cpu_seconds': 0.0}
+        token = object()
+        self.begin(stage, token)
+        try:
+            yield result
+        finally:
+            self.end(stage, result['bytes'], result['cpu_seconds'], token)
+
+    def finish(self, status):
+        with self._lock:
+            opened = list(self._open)
+        for stage, token in opened:
+            self.end(stage, token=token)
+        self.status = status
+        metrics.finish_job(self)
+
+class MetricsRegistry:
+    """Process-wide stage counters, exported as Prometheus text and shown in the diagnostics panel"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}  # (job_type, stage) -> totals
+        self.jobs = {}  # (job_type, status) -> count
+        self.memory = {}  # job_type -> {'last', 'max', 'estimate'} peak bytes
+        self.concurrency = {}  # stage -> {'limit', 'active', 'queued', 'increases', 'decreases'}
+        self.recent = deque(maxlen=100)
+        self.textfile_path = None
+        self._server = None
+
+    def observe_span(self, job_type, span):
+        with self._lock:
+            totals = self.stages.setdefault((job_type, span['stage']), {
+                'count': 0, 'seconds': 0.0, 'cpu_seconds': 0.0, 'bytes': 0, 'max_seconds': 0.0,
+            })
+            totals['count'] += 1
+            totals['seconds'] += span['seconds']
+            totals['cpu_seconds'] += span['cpu_seconds']
+            totals['bytes'] += span['bytes']
+            totals['max_seconds'] = max(totals['max_seconds'], span['seconds'])
+
+    def observe_memory(self, job_type, peak, estimate):
+        with self._lock:
+            totals = self.memory.setdefault(job_type, {'last': 0, 'max': 0, 'estimate': 0})
+            totals['last'] = peak
+            totals['max'] = max(totals['max'], peak)
+            totals['estimate'] = estimate
+
+    def observe_concurrency(self, stage, limit, active, queued):
+        with self._lock:
+            totals = self.concurrency.setdefault(stage, {'limit': 0, 'active': 0, 'queued': 0, 'increases': 0,
+                                                         'decreases': 0})
+            totals.update(limit=limit, active=active, queued=queued)
+
+    def observe_concurrency_change(self, stage, increased):
+        with self._lock:
+            totals = self.concurrency.setdefault(stage, {'limit': 0, 'active': 0, 'queued': 0, 'increases': 0,
+                                                         'decreases': 0})
+            totals['increases' if increased else 'decreases'] += 1
+
+    def finish_job(self, trace):
+        with self._lock:
+            key = (trace.job_type, trace.status)
+            self.jobs[key] = self.jobs.get(key, 0) + 1
+            self.recent.appendleft(trace)
+        if self.textfile_path:
+            self.write_textfile(self.textfile_path)
+
+    def render_prometheus(self):
+        with self._lock:
+            stages = {key: dict(value) for key, value in self.stages.items()}
+            jobs = dict(self.jobs)
+            memory = {key: dict(value) for key, value in self.memory.items()}
+            concurrency = {key: dict(value) for key, value in self.concurrency.items()}
+        lines = []
+        series = [
+            ('waver_stage_spans_total', 'counter', 'Number of completed spans per job stage', 'count'),
+            ('waver_stage_seconds_total', 'counter', 'Wall time spent per job stage', 'seconds'),
+            ('waver_stage_cpu_seconds_total', 'counter', 'CPU time spent per job stage, including ffmpeg', 'cpu_seconds'),
+            ('waver_stage_bytes_total', 'counter', 'Bytes processed per job stage', 'bytes'),
+            ('waver_stage_max_seconds', 'gauge', 'Slowest span seen per job stage', 'max_seconds'),
+        ]
+        for name, metric_type, help_text, field in series:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for (job_type, stage), totals in sorted(stages.items()):
+                lines.append(f'{name}{{job="{job_type}",stage="{stage}"}} {totals[field]:.6g}')
+        lines.append("# HELP waver_jobs_total Finished jobs by type and status")
+        lines.append("# TYPE waver_jobs_total counter")
+        for (job_type, status), count in sorted(jobs.items()):
+            lines.append(f'waver_jobs_total{{job="{job_type}",status="{status}"}} {count}')
+        memory_series = [
+            ('waver_job_peak_memory_bytes', 'Peak memory of the last job above its starting RSS', 'last'),
+            ('waver_job_peak_memory_max_bytes', 'Largest peak memory of any job', 'max'),
+            ('waver_job_memory_estimate_bytes', 'Estimated peak memory of the last job', 'estimate'),
+        ]
+        for name, help_text, field in memory_series:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for job_type, totals in sorted(memory.items()):
+                lines.append(f'{name}{{job="{job_type}"}} {totals[field]}')
+        concurrency_series = [
+            ('waver_concurrency_limit', 'gauge', 'Current adaptive concurrency limit per stage', 'limit'),
+            ('waver_concurrency_active', 'gauge', 'Jobs running per stage', 'active'),
+            ('waver_concurrency_queued', 'gauge', 'Jobs waiting for a slot per stage', 'queued'),
+            ('waver_concurrency_increases_total', 'counter', 'Times the concurrency limit was raised', 'increases'),
+            ('waver_concurrency_decreases_total', 'counter', 'Times the concurrency limit was lowered', 'decreases'),
+        ]
+        for name, metric_type, help_text, field in concurrency_series:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for stage, totals in sorted(concurrency.items()):
+                lines.append(f'{name}{{stage="{stage}"}} {totals[field]}')
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        # Write then rename so scrapers never read a half-written file
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self.render_prometheus())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print("Error writing metrics file:", e)
+
+    def serve(self, port):
+        """Expose /metrics on localhost, port 0 disables the endpoint"""
+        if self._server or not port:
+            return
+        registry = self
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200 if self.path.startswith("/metrics") else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self._server = http.server.ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+        except OSError as e:
+            print(f"Could not start metrics endpoint on port {port}: {e}")
+            return
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def shutdown(self):
+        if self._server:
+            self._server.shutdown()
+            self._server = None
+
+    def summary_text(self):
+        """Plain-text report for the diagnostics panel"""
+        with self._lock:
+            stages = {key: dict(value) for key, value in self.stages.items()}
+            recent = list(self.recent)[:20]
+        lines = [f"{'JOB':<10}{'STAGE':<14}{'COUNT':>6}{'AVG s':>9}{'MAX s':>9}{'CPU s':>9}{'MB':>9}{'MB/s':>8}"]
+        for (job_type, stage), totals in sorted(stages.items()):
+            count = max(totals['count'], 1)
+            rate = totals['bytes'] / totals['seconds'] / 1e6 if totals['seconds'] else 0
+            lines.append(
+                f"{job_type:<10}{stage:<14}{totals['count']:>6}{totals['seconds'] / count:>9.2f}"
+                f"{totals['max_seconds']:>9.2f}{totals['cpu_seconds']:>9.2f}{totals['bytes'] / 1e6:>9.1f}{rate:>8.2f}"
+            )
+        lines.append("")
+        lines.append("Recent jobs")
+        for trace in recent:
+            stamp = time.strftime("%H:%M:%S", time.localtime(trace.started))
+            memory = ""
+            if trace.memory:
+                memory = f" peak {trace.memory['peak'] / 1e6:.0f} MB (est. {trace.memory['estimate'] / 1e6:.0f} MB)"
+            lines.append(f"#{trace.job_id} {stamp} {trace.job_type} [{trace.status}] {trace.label}{memory}")
+            for span in trace.spans:
+                lines.append(
+                    f"    {span['stage']:<14}{span['seconds']:>8.2f}s  cpu {span['cpu_seconds']:>6.2f}s"
+                    f"  {span['bytes'] / 1e6:>8.2f} MB  {span['throughput'] / 1e6:>6.2f} MB/s"
+                )
+        return "\n".join(lines)
+
+metrics = MetricsRegistry()
+
+# --- Camelot key helpers ---
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+CAMELOT_WHEEL = {
+    "G# Minor": "1A", "D# Minor": "2A", "A# Minor": "3A", "F Minor": "4A", "C Minor": "5A", "G Minor": "6A",
+    "D Minor": "7A", "A Minor": "8A", "E Minor": "9A", "B Minor": "10A", "F# Minor": "11A", "C# Minor": "12A",
+    "B Major": "1B", "F# Major": "2B", "C# Major": "3B", "G# Major": "4B", "D# Major": "5B", "A# Major": "6B",
+    "F Major": "7B", "C Major": "8B", "G Major": "9B", "D Major": "10B", "A Major": "11B", "E Major": "12B",
+}
+
+def parse_key_name(text):
+    """Turn "Am", "F#", "Bbm", "8A" or "A Minor" into a Camelot code, None if unknown"""
+    text = text.strip()
+    if re.fullmatch(r"(1[0-2]|[1-9])[ABab]", text):
+        return text.upper()
+    if text in CAMELOT_WHEEL:
+        return CAMELOT_WHEEL[text]
+    match = re.fullmatch(r"([A-Ga-g])([#b]?)(m|min|minor|maj|major)?", text)
+    if not match:
+        return None
+    # Sharps step a semitone up from the letter, flats one down (Cb is B, E# is F)
+    step = {"#": 1, "b": -1}.get(match.group(2), 0)
+    note = NOTE_NAMES[(NOTE_NAMES.index(match.group(1).upper()) + step) % 12]
+    mode = "Minor" if (match.group(3) or "").startswith("m") and match.group(3) not in ("maj", "major") else "Major"
+    return CAMELOT_WHEEL.get(f"{note} {mode}")
+
+def compatible_camelot_codes(code):
+    """Same key, one step around the wheel, and the relative major/minor"""
+    number, letter = int(code[:-1]), code[-1]
+    other = "B" if letter == "A" else "A"
+    return [code, f"{number % 12 + 1}{letter}", f"{(number - 2) % 12 + 1}{letter}", f"{number}{other}"]
+
+# --- Audio Fingerprints ---
+FINGERPRINT_SR = 5512
+FINGERPRINT_HOP = 64  # ~11.6 ms
+FINGERPRINT_INDEX_STEP = 8  # only every 8th frame goes into the inverted index
+FINGERPRINT_MAX_BER = 0.35
+
+class DuplicateTrackError(Exception):
+    """A download turned out to be a track that is already in the library"""
+    def __init__(self, title, path):
+        super().__init__(f"Already in library: {title}")
+        self.title = title
+        self.path = path
+
+def decode_audio(path, seconds=60, sr=FINGERPRINT_SR):
+    """Mono float32 samples of the first seconds of any file ffmpeg can read"""
+    args = [ffmpeg_executable(), "-v", "error", "-t", str(seconds), "-i", path, "-ac", "1", "-ar", str(sr), "-f", "f32le", "-"]
+    flags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+    result = subprocess.run(args, capture_output=True, creationflags=flags)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode(errors="replace").strip() or "ffmpeg failed")
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+def audio_fingerprint(y, sr):
+    """uint32 sub-fingerprint per frame (Haitsma-Kalker).
+
+    Each bit is the sign of the change of the energy difference between two
+    neighbouring bands (33 log-spaced bands, 300-2000 Hz) from one frame to
+    the next, which survives re-encoding and volume changes.
+    """
+    if sr != FINGERPRINT_SR:
+        y = librosa.resample(y, orig_sr=sr, target_sr=FINGERPRINT_SR)
+    if len(y) < 2048:
+        return np.empty(0, dtype=np.uint32)
+    spectrum = np.abs(librosa.stft(y, n_fft=2048, hop_length=FINGERPRINT_HOP, center=False)) ** 2
+    freqs = librosa.fft_frequencies(sr=FINGERPRINT_SR, n_fft=2048)
+    edges = np.geomspace(300, 2000, 34)
+    bands = np.stack([spectrum[(freqs >= low) & (freqs < high)].sum(axis=0) for low, high in zip(edges[:-1], edges[1:])])
+    diff = bands[:-1] - bands[1:]
+    bits = (diff[:, 1:] - diff[:, :-1]) > 0
+    weights = np.left_shift(np.uint64(1), np.arange(32, dtype=np.uint64))
+    return (bits.T.astype(np.uint64) @ weights).astype(np.uint32)
+
+def fingerprint_ber(a, b):
+    """Bit error rate between two aligned fingerprints"""
+    return float(np.unpackbits(np.bitwise_xor(a, b).view(np.uint8)).mean())
+
+# --- Waveform Peak Pyramid ---
+PEAK_BLOCK = 256  # samples per min/max pair at the finest level
+PEAK_FACTOR = 4  # each level merges this many blocks of the one below
+
+def peaks_path(audio_path):
+    return audio_path + ".peaks"
+
+def build_peak_pyramid(y, sr):
+    """[(block_size, int8 (n, 2) min/max array)], finest level first"""
+    y = np.clip(np.asarray(y, dtype=np.float32), -1.0, 1.0)
+    blocks = -(-len(y) // PEAK_BLOCK)
+    padded = np.zeros(blocks * PEAK_BLOCK, dtype=np.float32)
+    padded[:len(y)] = y
+    padded = padded.reshape(blocks, PEAK_BLOCK)
+    mins, maxs = padded.min(axis=1), padded.max(axis=1)
+    levels, block = [], PEAK_BLOCK
+    while True:
+        levels.append((block, np.stack([np.round(mins * 127), np.round(maxs * 127)], axis=1).astype(np.int8)))
+        if len(mins) <= 256:
+            break
+        count = -(-len(mins) // PEAK_FACTOR)
+        edge = count * PEAK_FACTOR - len(mins)
+        mins = np.pad(mins, (0, edge), mode="edge").reshape(count, PEAK_FACTOR).min(axis=1)
+        maxs = np.pad(maxs, (0, edge), mode="edge").reshape(count, PEAK_FACTOR).max(axis=1)
+        block *= PEAK_FACTOR
+    return levels
+
+def save_peak_pyramid(audio_path, y, sr):
+    """Write the pyramid for y (the full decoded file) next to the audio file"""
+    stat = os.stat(audio_path)
+    arrays = {f"level{i}": peaks for i, (_, peaks) in enumerate(build_peak_pyramid(y, sr))}
+    arrays["info"] = np.array([sr, len(y), stat.st_size, stat.st_mtime], dtype=np.float64)
+    temp_path = peaks_path(audio_path) + ".tmp"
+    with open(temp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(temp_path, peaks_path(audio_path))
+
+def restamp_peak_pyramid(audio_path, stat):
+    """Keep a sidecar valid after the audio file changed without its samples changing (tags)"""
+    path = peaks_path(audio_path)
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in data.files}
+    arrays["info"][2:] = (stat.st_size, stat.st_mtime)
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(path + ".tmp", path)
+
+class PeakPyramid:
+    """Min/max peaks of a whole file at several resolutions, loaded from the .peaks sidecar"""
+    def __init__(self, sr, length, levels):
+        self.sr = sr
+        self.length = length
+        self.levels = levels
+
+    @property
+    def duration(self):
+        return self.length / self.sr
+
+    @classmethod
+    def load(cls, audio_path):
+        """The cached pyramid, None when missing or older than the audio file"""
+        try:
+            stat = os.stat(audio_path)
+            with np.load(peaks_path(audio_path)) as data:
+                sr, length, size, mtime = data["info"]
+                if size != stat.st_size or abs(mtime - stat.st_mtime) > 1:
+                    return None
+                levels, i = [], 0
+                while f"level{i}" in data:
+                    levels.append((PEAK_BLOCK * PEAK_FACTOR ** i, data[f"level{i}"]))
+                    i += 1
+        except (OSError, KeyError, ValueError):
+            return None
+        return cls(int(sr), int(length), levels) if levels else None
+
+    def columns(self, start, end, width):
+        """(mins, maxs) in -1..1 for up to width pixel columns covering start..end seconds.
+
+        Uses the coarsest level that still has at least one block per column,
+        so the work depends on the width, not on the zoom or the file length.
+        When the view holds fewer samples than the widget has pixels, the
+        columns past the end of the view (or of the file) are left out.
+        """
+        samples_per_pixel = max((end - start) * self.sr / width, 1.0)
+        block, peaks = self.levels[0]
+        for level_block, level_peaks in self.levels:
+            if level_block <= samples_per_pixel:
+                block, peaks = level_block, level_peaks
+        positions = start * self.sr + np.arange(width) * samples_per_pixel
+        positions = positions[positions < min(end * self.sr, self.length)]
+        if not len(positions):
+            return np.zeros(0), np.zeros(0)
+        edges = np.clip((positions // block).astype(np.int64), 0, len(peaks) - 1)
+        mins = np.minimum.reduceat(peaks[:, 0], edges)
+        maxs = np.maximum.reduceat(peaks[:, 1], edges)
+        # reduceat runs the last column to the end of the file, it must stop at the view
+        last = min(int((end * self.sr) // block) + 1, len(peaks))
+        hi = max(last, edges[-1] + 1)
+        mins[-1] = peaks[edges[-1]:hi, 0].min()
+        maxs[-1] = peaks[edges[-1]:hi, 1].max()
+        return mins / 127.0, maxs / 127.0
+
+# --- Beat Grids ---
+def fit_beat_grid(beat_times, beat_strengths):
+    """Fit a constant-tempo grid to detected beats.
+
+    Returns (bpm, first_downbeat seconds). The downbeat is the beat phase
+    (of 4) with the strongest onsets, moved to the first bar of the file.
+    """
+    beat_times = np.asarray(beat_times, dtype=np.float64)
+    if len(beat_times) < 4:
+        return None
+    gaps = np.diff(beat_times)
+    # Grid index of every detected beat, counted gap by gap so a skipped beat
+    # advances the index by two without rounding errors piling up
+    steps = np.maximum(np.round(gaps / np.median(gaps)), 1)
+    index = np.concatenate([[0], np.cumsum(steps)])
+    period, offset = np.polyfit(index, beat_times, 1)
+    strengths = np.asarray(beat_strengths, dtype=np.float64)
+    phase = int(np.argmax([strengths[index % 4 == p].sum() for p in range(4)]))
+    first_downbeat = offset + phase * period
+    first_downbeat -= np.floor(first_downbeat / (4 * period)) * 4 * period
+    return float(60.0 / period), float(first_downbeat)
+
+def beat_grid_dict(bpm, first_downbeat, beat_times, duration=None):
+    period = 60.0 / bpm
+    downbeats = []
+    if duration:
+        downbeats = [round(t, 4) for t in np.arange(first_downbeat, duration, 4 * period).tolist()]
+    return {
+        "bpm": round(bpm, 3),
+        "first_downbeat": round(first_downbeat, 4),
+        "beats_per_bar": 4,
+        "beats": [round(t, 4) for t in np.asarray(beat_times).tolist()],
+        "downbeats": downbeats,
+    }
+
+def write_beat_grid_sidecar(audio_path, grid):
+    """<file>.beats.json next to the audio file"""
+    with open(audio_path + ".beats.json", "w", encoding="utf-8") as f:
+        json.dump(grid, f, indent=1)
+
+def export_rekordbox_xml(tracks, out_path):
+    """Write a rekordbox collection XML with a TEMPO grid and a downbeat cue per track.
+
+    tracks are rows from TrackLibrary.fetch_beatgrids.
+    """
+    root = ET.Element("DJ_PLAYLISTS", Version="1.0.0")
+    ET.SubElement(root, "PRODUCT", Name=__app_name__, Version=__version__, Company="")
+    collection = ET.SubElement(root, "COLLECTION", Entries=str(len(tracks)))
+    for track_id, title, path, duration, bpm, key, grid_bpm, first_downbeat, _ in tracks:
+        location = QUrl.fromLocalFile(path).toString(QUrl.ComponentFormattingOption.FullyEncoded)
+        track = ET.SubElement(collection, "TRACK", TrackID=str(track_id), Name=title or "",
+                              Kind=f"{os.path.splitext(path)[1][1:].upper()} File",
+                              TotalTime=str(int(duration or 0)), AverageBpm=f"{grid_bpm:.2f}",
+                              Tonality=key_tag_value(key) or "",
+                              Location=location.replace("file:///", "file://localhost/", 1))
+        ET.SubElement(track, "TEMPO", Inizio=f"{first_downbeat:.3f}", Bpm=f"{grid_bpm:.2f}", Metro="4/4", Battito="1")
+        ET.SubElement(track, "POSITION_MARK", Name="Downbeat", Type="0", Start=f"{first_downbeat:.3f}", Num="-1")
+    playlists = ET.SubElement(root, "PLAYLISTS")
+    ET.SubElement(playlists, "NODE", Type="0", Name="ROOT", Count="0")
+    ET.ElementTree(root).write(out_path, encoding="UTF-8", xml_declaration=True)
+
+# --- Track Library ---
+def parse_library_query(text):
+    """Parse "bpm:120-128 key:Am+ dur:2:00-6:00 words" into search filters.
+
+    "key:X+" also matches harmonically compatible Camelot keys, remaining words match the title.
+    """
+    filters = {'text': [], 'bpm': None, 'keys': None, 'duration': None}
+    for token in (text or "").split():
+        field, sep, value = token.partition(":")
+        field = field.lower()
+        try:
+            if sep and field == "bpm":
+                low, _, high = value.partition("-")
+                low = float(low)
+                filters['bpm'] = (low, float(high)) if high else (low - 0.5, low + 0.5)
+                continue
+            if sep and field in ("dur", "duration"):
+                low, high = parse_time_range(value if "-" in value else f"{value}-")
+                filters['duration'] = (low, high)
+                continue
+        except ValueError:
+            pass
+        if sep and field == "key":
+            compatible = value.endswith("+")
+            code = parse_key_name(value.rstrip("+"))
+            if code:
+                codes = compatible_camelot_codes(code) if compatible else [code]
+                filters['keys'] = sorted(set((filters['keys'] or []) + codes))
+                continue
+        filters['text'].append(token)
+    return filters
+
+class TrackLibrary:
+    """Local SQLite index of every downloaded and analyzed file.
+
+    Indexed on BPM, Camelot key and duration so range queries stay fast for
+    large libraries. One connection is shared by all workers behind a lock.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tracks (
+            id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL UNIQUE,
+            title TEXT,
+            source_url TEXT,
+            format TEXT,
+            duration REAL,
+            size INTEGER,
+            bpm REAL,
+            musical_key TEXT,
+            camelot TEXT,
+            added_at REAL,
+            analyzed_at REAL,
+            loudness_lufs REAL,
+            true_peak_db REAL,
+            loudness_range REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_tracks_bpm ON tracks(bpm);
+        CREATE INDEX IF NOT EXISTS idx_tracks_camelot_bpm ON tracks(camelot, bpm);
+        CREATE INDEX IF NOT EXISTS idx_tracks_duration ON tracks(duration);
+        CREATE INDEX IF NOT EXISTS idx_tracks_added ON tracks(added_at);
+        CREATE TABLE IF NOT EXISTS beatgrids (
+            track_id INTEGER PRIMARY KEY,
+            grid_bpm REAL NOT NULL,
+            first_downbeat REAL NOT NULL,
+            beats BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            track_id INTEGER PRIMARY KEY,
+            frames BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS fingerprint_hashes (
+            hash INTEGER NOT NULL,
+            track_id INTEGER NOT NULL,
+            frame INTEGER NOT NULL,
+            PRIMARY KEY (hash, track_id, frame)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS link_metadata (
+            url_key TEXT PRIMARY KEY,
+            title TEXT,
+            duration REAL,
+            uploader TEXT,
+            view_count INTEGER,
+            entries INTEGER,
+            audio_size INTEGER,
+            video_sizes TEXT,
+            fetched_at REAL NOT NULL
+        );
+    """
+    COLUMNS = "id, title, bpm, musical_key, camelot, duration, format, path, loudness_lufs"
+    # Columns added after the first release, created on databases that predate them
+    ADDED_COLUMNS = (("loudness_lufs", "REAL"), ("true_peak_db", "REAL"), ("loudness_range", "REAL"))
+
+    def __init__(self, path=None):
+        self.path = path
+        self._conn = None
+        self._lock = threading.RLock()
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path or app_data_path("library.db"), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(tracks)")}
+            for name, column_type in self.ADDED_COLUMNS:
+                if name not in existing:
+                    self._conn.execute(f"ALTER TABLE tracks ADD COLUMN {name} {column_type}")
+        return self._conn
+
+    def execute(self, sql, params=()):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                return conn.execute(sql, params).fetchall()
+
+    def add_track(self, path, title=None, source_url=None, duration=None, file_format=None):
+        """Insert or refresh a track, returns its id"""
+        path = os.path.abspath(path)
+        size = os.path.getsize(path) if os.path.exists(path) else None
+        self.execute("""
+            INSERT INTO tracks (path, title, source_url, format, duration, size, added_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                title = COALESCE(excluded.title, title),
+                source_url = COALESCE(excluded.source_url, source_url),
+                format = excluded.format,
+                duration = COALESCE(excluded.duration, duration),
+                size = excluded.size,
+                added_at = excluded.added_at
+        """, (path, title or os.path.splitext(os.path.basename(path))[0], source_url,
+              file_format or os.path.splitext(path)[1][1:].lower(), duration, size, time.time()))
+        return self.execute("SELECT id FROM tracks WHERE path = ?", (path,))[0][0]
+
+    def update_analysis(self, path, bpm, key):
+        """Store analysis results, returns the track id"""
+        path = os.path.abspath(path)
+        with self._lock:
+            if not self.execute("SELECT 1 FROM tracks WHERE path = ?", (path,)):
+                self.add_track(path)
+            self.execute(
+                "UPDATE tracks SET bpm = ?, musical_key = ?, camelot = ?, analyzed_at = ? WHERE path = ?",
+                (bpm, key, CAMELOT_WHEEL.get(key), time.time(), path),
+            )
+            return self.execute("SELECT id FROM tracks WHERE path = ?", (path,))[0][0]
+
+    def search_ids(self, query=""):
+        """Ids of matching tracks, newest first"""
+        filters = parse_library_query(query)
+        clauses, params = [], []
+        for word in filters['text']:
+            clauses.append("title LIKE ? ESCAPE '\\'")
+            params.append("%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if filters['bpm']:
+            clauses.append("bpm BETWEEN ? AND ?")
+            params.extend(filters['bpm'])
+        if filters['keys']:
+            clauses.append(f"camelot IN ({', '.join('?' * len(filters['keys']))})")
+            params.extend(filters['keys'])
+        if filters['duration']:
+            low, high = filters['duration']
+            clauses.append("duration >= ?")
+            params.append(low)
+            if high is not None:
+                clauses.append("duration <= ?")
+                params.append(high)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return [row[0] for row in self.execute(f"SELECT id FROM tracks {where} ORDER BY added_at DESC, id DESC", params)]
+
+    def store_loudness(self, track_id, loudness):
+        """loudness is (integrated LUFS, true peak dBTP, loudness range LU)"""
+        self.execute("UPDATE tracks SET loudness_lufs = ?, true_peak_db = ?, loudness_range = ? WHERE id = ?",
+                     (*loudness, track_id))
+
+    def duration_of(self, path):
+        rows = self.execute("SELECT duration FROM tracks WHERE path = ?", (os.path.abspath(path),))
+        return rows[0][0] if rows and rows[0][0] else None
+
+    def has_loudness(self, path):
+        return bool(self.execute("SELECT 1 FROM tracks WHERE path = ? AND loudness_lufs IS NOT NULL",
+                                 (os.path.abspath(path),)))
+
+    def store_beatgrid(self, track_id, grid_bpm, first_downbeat, beat_times):
+        """Beat times are kept as a float32 blob"""
+        self.execute("INSERT OR REPLACE INTO beatgrids (track_id, grid_bpm, first_downbeat, beats) VALUES (?, ?, ?, ?)",
+                     (track_id, grid_bpm, first_downbeat, np.asarray(beat_times, dtype="<f4").tobytes()))
+
+    def fetch_beatgrids(self, ids):
+        """[(id, title, path, duration, bpm, key, grid_bpm, first_downbeat, beat_times)] for the ids that have a grid"""
+        rows = []
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows.extend(self.execute(f"""
+                SELECT t.id, t.title, t.path, t.duration, t.bpm, t.musical_key, g.grid_bpm, g.first_downbeat, g.beats
+                FROM tracks t JOIN beatgrids g ON g.track_id = t.id
+                WHERE t.id IN ({', '.join('?' * len(chunk))})
+            """, chunk))
+        return [row[:8] + (np.frombuffer(row[8], dtype="<f4"),) for row in rows]
+
+    def source_urls(self):
+        return [row[0] for row in self.execute("SELECT DISTINCT source_url FROM tracks WHERE source_url IS NOT NULL")]
+
+    def has_fingerprint(self, track_id):
+        return bool(self.execute("SELECT 1 FROM fingerprints WHERE track_id = ?", (track_id,)))
+
+    def store_fingerprint(self, track_id, fingerprint):
+        """Save a fingerprint and index a subset of its frames by hash"""
+        with self._lock:
+            old = self.execute("SELECT frames FROM fingerprints WHERE track_id = ?", (track_id,))
+            if old:
+                old_hashes = np.unique(np.frombuffer(old[0][0], dtype="<u4")[::FINGERPRINT_INDEX_STEP])
+                self._connection().executemany(
+                    "DELETE FROM fingerprint_hashes WHERE hash = ? AND track_id = ?",
+                    [(int(h), track_id) for h in old_hashes])
+            frames = np.arange(0, len(fingerprint), FINGERPRINT_INDEX_STEP)
+            rows = [(int(fingerprint[i]), track_id, int(i)) for i in frames if fingerprint[i] not in (0, 0xFFFFFFFF)]
+            conn = self._connection()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO fingerprints (track_id, frames) VALUES (?, ?)",
+                             (track_id, fingerprint.astype("<u4").tobytes()))
+                conn.executemany("INSERT OR IGNORE INTO fingerprint_hashes (hash, track_id, frame) VALUES (?, ?, ?)", rows)
+
+    def find_duplicate(self, fingerprint, exclude_id=None):
+        """(track_id, title, path, ber) of a library track with the same audio, or None.
+
+        Hash hits vote for a (track, time offset) pair, the best candidates are
+        then checked bit by bit over the aligned overlap.
+        """
+        if len(fingerprint) == 0:
+            return None
+        positions = {}
+        for frame, value in enumerate(fingerprint.tolist()):
+            if value not in (0, 0xFFFFFFFF):
+                positions.setdefault(value, []).append(frame)
+        votes = {}
+        hashes = list(positions)
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            rows = self.execute(
+                f"SELECT hash, track_id, frame FROM fingerprint_hashes WHERE hash IN ({', '.join('?' * len(chunk))})", chunk)
+            for value, track_id, frame in rows:
+                if track_id == exclude_id:
+                    continue
+                for query_frame in positions[value]:
+                    key = (track_id, frame - query_frame)
+                    votes[key] = votes.get(key, 0) + 1
+        candidates = sorted((count, key) for key, count in votes.items() if count >= 2)[-5:]
+        best = None
+        for _, (track_id, offset) in reversed(candidates):
+            stored = self.execute("SELECT frames FROM fingerprints WHERE track_id = ?", (track_id,))
+            if not stored:
+                continue
+            other = np.frombuffer(stored[0][0], dtype="<u4").astype(np.uint32)
+            query = fingerprint[max(0, -offset):]
+            other = other[max(0, offset):]
+            overlap = min(len(query), len(other))
+            if overlap < 200:
+                continue
+            ber = fingerprint_ber(query[:overlap], other[:overlap])
+            if ber < FINGERPRINT_MAX_BER and (best is None or ber < best[1]):
+                best = (track_id, ber)
+        if best is None:
+            return None
+        row = self.execute("SELECT title, path FROM tracks WHERE id = ?", (best[0],))
+        return (best[0], row[0][0], row[0][1], best[1]) if row else None
+
+    METADATA_FIELDS = ("title", "duration", "uploader", "view_count", "entries", "audio_size", "video_sizes")
+
+    def cached_metadata(self, keys, max_age):
+        """Link metadata fetched less than max_age seconds ago, keyed by url_key"""
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.execute(f"""
+                SELECT url_key, {', '.join(self.METADATA_FIELDS)} FROM link_metadata
+                WHERE fetched_at > ? AND url_key IN ({', '.join('?' * len(chunk))})
+            """, [time.time() - max_age] + chunk)
+            for row in rows:
+                meta = dict(zip(self.METADATA_FIELDS, row[1:]))
+                meta["video_sizes"] = {int(height): size for height, size in json.loads(meta["video_sizes"] or "{}").items()}
+                found[row[0]] = meta
+        return found
+
+    def store_metadata(self, key, meta):
+        values = [meta.get(field) for field in self.METADATA_FIELDS]
+        values[-1] = json.dumps(meta.get("video_sizes") or {})
+        self.execute(f"""
+            INSERT OR REPLACE INTO link_metadata (url_key, {', '.join(self.METADATA_FIELDS)}, fetched_at)
+            VALUES (?, {', '.join('?' * len(self.METADATA_FIELDS))}, ?)
+        """, [key] + values + [time.time()])
+
+    def fetch_rows(self, ids):
+        """Display rows for the given ids, keyed by id"""
+        if not ids:
+            return {}
+        rows = self.execute(f"SELECT {self.COLUMNS} FROM tracks WHERE id IN ({', '.join('?' * len(ids))})", list(ids))
+        return {row[0]: row for row in rows}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+track_library = TrackLibrary()
+
+# --- Track Similarity Index ---
+FEATURE_DIM = 16
+
+def track_feature_vector(chroma_mean, bpm, onset_env, onset_count, duration):
+    """Unit-length vector of chroma, tempo and onset statistics; dot product = similarity"""
+    chroma = np.asarray(chroma_mean, dtype=np.float64)
+    chroma = chroma / (np.linalg.norm(chroma) or 1.0)
+    # log2 tempo on a circle, so half and double tempo land on the same spot
+    angle = 2 * np.pi * np.log2(max(bpm, 1.0))
+    tempo = np.array([np.cos(angle), np.sin(angle)])
+    onset_mean = float(np.mean(onset_env)) if len(onset_env) else 0.0
+    onset_cv = float(np.std(onset_env)) / onset_mean if onset_mean else 0.0
+    onsets = np.array([np.tanh(onset_count / max(duration, 1.0) / 4.0), np.tanh(onset_cv)])
+    vector = np.concatenate([chroma, tempo, 0.5 * onsets])
+    return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+class FeatureIndex:
+    """Feature vectors of all analyzed tracks in one contiguous float32 array.
+
+    Stored as features.npy/feature_ids.npy next to the library. Queries are a
+    brute-force matrix product, a few milliseconds for 100k tracks.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._ids = None
+        self._rows = None
+        self._count = 0
+
+    def _paths(self):
+        directory = self.directory or app_data_path()
+        return os.path.join(directory, "features.npy"), os.path.join(directory, "feature_ids.npy")
+
+    def _load(self):
+        if self._vectors is not None:
+            return
+        vectors_path, ids_path = self._paths()
+        try:
+            vectors, ids = np.load(vectors_path), np.load(ids_path)
+            if vectors.shape != (len(ids), FEATURE_DIM):
+                raise ValueError("feature index shape mismatch")
+        except (OSError, ValueError):
+            vectors, ids = np.empty((0, FEATURE_DIM), dtype=np.float32), np.empty(0, dtype=np.int64)
+        self._count = len(ids)
+        self._vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self._ids = ids.astype(np.int64)
+        self._rows = {int(track_id): row for row, track_id in enumerate(self._ids)}
+
+    def _save(self):
+        for path, array in zip(self._paths(), (self._vectors[:self._count], self._ids[:self._count])):
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(path + ".tmp", path)
+
+    def add(self, track_id, vector):
+        with self._lock:
+            self._load()
+            row = self._rows.get(track_id)
+            if row is None:
+                row = self._count
+                if row == len(self._vectors):
+                    # Grow by doubling so the array stays contiguous without a copy per track
+                    capacity = max(64, 2 * len(self._vectors))
+                    vectors = np.zeros((capacity, FEATURE_DIM), dtype=np.float32)
+                    ids = np.full(capacity, -1, dtype=np.int64)
+                    vectors[:row], ids[:row] = self._vectors[:row], self._ids[:row]
+                    self._vectors, self._ids = vectors, ids
+                self._ids[row] = track_id
+                self._rows[track_id] = row
+                self._count += 1
+            self._vectors[row] = vector
+            self._save()
+
+    def nearest(self, track_id, k=100):
+        """[(track_id, score)] of the tracks that mix best with track_id, best first.
+
+        The query chroma is also rotated a fifth up and down, so neighbouring
+        Camelot keys score like the same key.
+        """
+        with self._lock:
+            self._load()
+            row = self._rows.get(track_id)
+            if row is None:
+                return []
+            vectors, ids = self._vectors[:self._count], self._ids[:self._count]
+            query = vectors[row]
+            queries = np.stack([query] + [np.concatenate([np.roll(query[:12], shift), query[12:]]) for shift in (7, -7)])
+            scores = (vectors @ queries.T).max(axis=1)
+            scores[row] = -np.inf
+            k = min(k, len(scores) - 1)
+            if k <= 0:
+                return []
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [(int(ids[i]), float(scores[i])) for i in best]
+
+feature_index = FeatureIndex()
+
+# --- In-place BPM/key tagging ---
+# Only the tag bytes are rewritten: ID3 padding, a RIFF "id3 " chunk or the MP4
+# moov atom. Audio data is never moved, except once for an MP3 without a tag.
+TAG_PADDING = 2048
+
+def key_tag_value(key):
+    """"A Minor" -> "Am", "F# Major" -> "F#" (ID3 TKEY notation)"""
+    note, _, mode = (key or "").partition(" ")
+    if note not in NOTE_NAMES:
+        return None
+    return note + ("m" if mode == "Minor" else "")
+
+def _synchsafe(value):
+    return bytes((value >> shift) & 0x7F for shift in (21, 14, 7, 0))
+
+def _unsynchsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+def _id3_frames(data, version):
+    """Split the frame area of an ID3v2.3/2.4 tag into (frame_id, raw_frame) pairs"""
+    frames, pos = [], 0
+    while pos + 10 <= len(data) and data[pos:pos + 1] != b"\x00":
+        frame_id = data[pos:pos + 4]
+        size = _unsynchsafe(data[pos + 4:pos + 8]) if version == 4 else struct.unpack(">I", data[pos + 4:pos + 8])[0]
+        frames.append((frame_id, data[pos:pos + 10 + size]))
+        pos += 10 + size
+    return frames
+
+def _id3_text_frame(frame_id, text, version):
+    body = b"\x00" + text.encode("latin-1")
+    size = _synchsafe(len(body)) if version == 4 else struct.pack(">I", len(body))
+    return frame_id + size + b"\x00\x00" + body
+
+def build_id3_frames(existing, version, bpm, key):
+    """Existing frames with TBPM/TKEY replaced"""
+    frames = [raw for frame_id, raw in existing if frame_id not in (b"TBPM", b"TKEY")]
+    frames.append(_id3_text_frame(b"TBPM", str(int(round(bpm))), version))
+    if key_tag_value(key):
+        frames.append(_id3_text_frame(b"TKEY", key_tag_value(key), version))
+    return b"".join(frames)
+
+def _id3_tag(frames, version, size):
+    return b"ID3" + bytes((version, 0, 0)) + _synchsafe(size) + frames + b"\x00" * (size - len(frames))
+
+def _read_id3(f):
+    """(version, tag_size, frames) of the ID3v2 tag at the current offset, None if there is none"""
+    header = f.read(10)
+    if len(header) < 10 or header[:3] != b"ID3":
+        return None
+    version, flags, size = header[3], header[5], _unsynchsafe(header[6:10])
+    if version not in (3, 4) or flags & 0xD0:
+        # v2.2, unsynchronised and footer tags are left alone
+        raise ValueError(f"Unsupported ID3v2.{version} tag (flags {flags:#x})")
+    data = f.read(size)
+    if flags & 0x40:
+        # Keep the extended header out of the frame list, it's dropped on rewrite
+        ext_size = _unsynchsafe(data[:4]) if version == 4 else struct.unpack(">I", data[:4])[0] + 4
+        data = data[ext_size:]
+    return version, size, _id3_frames(data, version)
+
+def tag_mp3(path, bpm, key):
+    with open(path, "r+b") as f:
+        existing = _read_id3(f)
+        if existing:
+            version, size, frames = existing
+            frames = build_id3_frames(frames, version, bpm, key)
+            if len(frames) <= size:
+                f.seek(0)
+                f.write(_id3_tag(frames, version, size))
+                return 10 + size
+        else:
+            version, size = 4, 0
+            frames = build_id3_frames([], version, bpm, key)
+    # No tag or not enough padding: the audio has to move once, leave room for next time
+    tag = _id3_tag(frames, version, len(frames) + TAG_PADDING)
+    temp_path = path + ".tagtmp"
+    with open(path, "rb") as src, open(temp_path, "wb") as dst:
+        src.seek(10 + size if existing else 0)
+        dst.write(tag)
+        while chunk := src.read(1 << 20):
+            dst.write(chunk)
+    os.replace(temp_path, path)
+    return os.path.getsize(path)
+
+def tag_wav(path, bpm, key):
+    with open(path, "r+b") as f:
+        header = f.read(12)
+        if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            raise ValueError("Not a RIFF/WAVE file")
+        file_size = os.fstat(f.fileno()).st_size
+        pos, id3_chunk = 12, None
+        while pos + 8 <= file_size:
+            f.seek(pos)
+            chunk_id, chunk_size = struct.unpack("<4sI", f.read(8))
+            if chunk_id in (b"id3 ", b"ID3 "):
+                id3_chunk = (pos, chunk_size)
+            pos += 8 + chunk_size + (chunk_size & 1)
+        version, frames = 3, []
+        if id3_chunk:
+            f.seek(id3_chunk[0] + 8)
+            existing = _read_id3(f)
+            if existing:
+                version, _, frames = existing
+        frames = build_id3_frames(frames, version, bpm, key)
+        if id3_chunk and len(frames) + 10 <= id3_chunk[1]:
+            f.seek(id3_chunk[0] + 8)
+            tag = _id3_tag(frames, version, id3_chunk[1] - 10)
+            f.write(tag)
+            if pos < file_size or struct.unpack("<I", header[4:8])[0] != file_size - 8:
+                # Repair files tagged by earlier versions, which left a stale
+                # RIFF size and 4 stray bytes at the end
+                f.truncate(min(pos, file_size))
+                f.seek(4)
+                f.write(struct.pack("<I", min(pos, file_size) - 8))
+            return len(tag)
+        if id3_chunk and id3_chunk[0] + 8 + id3_chunk[1] + (id3_chunk[1] & 1) >= file_size:
+            # Last chunk, just grow it
+            pos = id3_chunk[0]
+        elif id3_chunk:
+            # Retire the old chunk in place and append a new one
+            f.seek(id3_chunk[0])
+            f.write(b"JUNK")
+            pos = file_size + (file_size & 1)
+        else:
+            pos = file_size + (file_size & 1)
+        tag = _id3_tag(frames, version, len(frames) + TAG_PADDING)
+        f.seek(pos)
+        # Chunks start on even offsets, an odd-sized chunk is followed by a pad byte
+        f.write(struct.pack("<4sI", b"id3 ", len(tag)) + tag + b"\x00" * (len(tag) & 1))
+        f.truncate()
+        riff_size = f.seek(0, os.SEEK_END) - 8
+        f.seek(4)
+        f.write(struct.pack("<I", riff_size))
+        return 12 + len(tag)
+
+def _mp4_atoms(data, pos=0, end=None):
+    """(type, start, header_size, size) of the atoms in data[pos:end]"""
+    end = len(data) if end is None else end
+    atoms = []
+    while pos + 8 <= end:
+        size, atom_type = struct.unpack(">I4s", data[pos:pos + 8])
+        header = 8
+        if size == 1:
+            size, header = struct.unpack(">Q", data[pos + 8:pos + 16])[0], 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            break
+        atoms.append((atom_type, pos, header, size))
+        pos += size
+    return atoms
+
+def _mp4_atom(atom_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), atom_type) + payload
+
+def _mp4_data(type_code, value):
+    return _mp4_atom(b"data", struct.pack(">II", type_code, 0) + value)
+
+def _mp4_replace_child(data, atom_type, build, offset=0):
+    """data is an atom payload; replace (or add) the child atom_type with build(old_payload)"""
+    children = _mp4_atoms(data, offset)
+    for child_type, start, header, size in children:
+        if child_type == atom_type:
+            return data[:start] + _mp4_atom(atom_type, build(data[start + header:start + size])) + data[start + size:]
+    return data + _mp4_atom(atom_type, build(None))
+
+def build_mp4_ilst(ilst, bpm, key):
+    items = []
+    for item_type, start, header, size in _mp4_atoms(ilst or b""):
+        raw = ilst[start:start + size]
+        if item_type == b"tmpo" or (item_type == b"----" and b"initialkey" in raw):
+            continue
+        items.append(raw)
+    items.append(_mp4_atom(b"tmpo", _mp4_data(21, struct.pack(">H", int(round(bpm))))))
+    if key_tag_value(key):
+        items.append(_mp4_atom(b"----", _mp4_atom(b"mean", b"\x00\x00\x00\x00com.apple.iTunes")
+                               + _mp4_atom(b"name", b"\x00\x00\x00\x00initialkey")
+                               + _mp4_data(1, key_tag_value(key).encode("utf-8"))))
+    return b"".join(items)
+
+def tag_mp4(path, bpm, key):
+    with open(path, "r+b") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        # Walk top-level atoms by seeking past them, mdat is never read
+        atoms, pos = [], 0
+        while pos + 8 <= file_size:
+            f.seek(pos)
+            header = f.read(16)
+            size, atom_type = struct.unpack(">I4s", header[:8])
+            header_size = 8
+            if size == 1:
+                size, header_size = struct.unpack(">Q", header[8:16])[0], 16
+            elif size == 0:
+                size = file_size - pos
+            if size < header_size:
+                break
+            atoms.append((atom_type, pos, header_size, size))
+            pos += size
+        moov_index = next((i for i, atom in enumerate(atoms) if atom[0] == b"moov"), None)
+        if moov_index is None:
+            raise ValueError("No moov atom")
+        _, moov_start, moov_header, moov_size = atoms[moov_index]
+        f.seek(moov_start)
+        moov = f.read(moov_size)
+
+        def build_meta(meta):
+            if meta is None:
+                hdlr = _mp4_atom(b"hdlr", b"\x00" * 8 + b"mdirappl" + b"\x00" * 9)
+                meta = b"\x00\x00\x00\x00" + hdlr
+            return _mp4_replace_child(meta, b"ilst", lambda ilst: build_mp4_ilst(ilst, bpm, key), offset=4)
+
+        udta_builder = lambda udta: _mp4_replace_child(udta or b"", b"meta", build_meta)
+        new_moov = _mp4_atom(b"moov", _mp4_replace_child(moov[moov_header:], b"udta", udta_builder))
+
+        # Space we may use without moving mdat: moov plus any free atoms right after it
+        available, end = moov_size, moov_index + 1
+        while end < len(atoms) and atoms[end][0] in (b"free", b"skip"):
+            available += atoms[end][3]
+            end += 1
+        if end == len(atoms):
+            f.seek(moov_start)
+            f.write(new_moov)
+            f.truncate()
+        elif len(new_moov) == available or available - len(new_moov) >= 8:
+            f.seek(moov_start)
+            f.write(new_moov)
+            if len(new_moov) < available:
+                f.write(_mp4_atom(b"free", b"\x00" * (available - len(new_moov) - 8)))
+        else:
+            # moov sits in front of mdat and grew: turn it into free space and
+            # append the new one so no chunk offsets change
+            f.seek(moov_start + 4)
+            f.write(b"free")
+            f.seek(file_size)
+            f.write(new_moov)
+        return len(new_moov)
+
+def write_analysis_tags(path, bpm, key):
+    """Store BPM and key in the file's own tags. Returns the number of bytes written."""
+    ext = os.path.splitext(path)[1].lower()
+    writers = {'.mp3': tag_mp3, '.wav': tag_wav, '.mp4': tag_mp4, '.m4a': tag_mp4}
+    if ext not in writers:
+        raise ValueError(f"Tagging {ext or 'this file type'} is not supported")
+    peaks_fresh = PeakPyramid.load(path) is not None
+    written = writers[ext](path, bpm, key)
+    if peaks_fresh:
+        restamp_peak_pyramid(path, os.stat(path))
+    return written
+
+# --- Theme Stylesheets ---
+# Colors per theme, keyed by light mode
+THEME_COLORS = {
+    False: {
+        "fg": "white", "muted": "#ddd", "window": "#0d0d0d",
+        "field": "#161616", "field_border": "#333", "hover": "#2a2a2a", "pressed": "#444",
+        "minimize_hover": "#555", "close_hover": "#ff5555",
+        "dropdown_border": "#444", "dropdown_hover_border": "#555", "dropdown_hover": "#1a1a1a",
+        "popup": "#1a1a1a", "item_hover": "#2a2a2a", "arrow_icon": "PHN2ZyB3aWR0aD0iMTIiIGhlaWdodD0iOCIgdmlld0JveD0iMCAwIDEyIDgiIGZpbGw9Im5vbmUiIHhtbG5zPSJodHRwOi8vd3d3LnczLm9yZy8yMDAwL3N2ZyI+CjxwYXRoIGQ9Ik0xIDFMNiA2TDExIDEiIHN0cm9rZT0iI2FhYSIgc3Ryb2tlLXdpZHRoPSIyIiBzdHJva2UtbGluZWNhcD0icm91bmQiIHN0cm9rZS1saW5lam9pbj0icm91bmQiLz4KPC9zdmc+",
+        "panel": "#161616", "panel_hover": "#333", "check_border": "#555", "check_bg": "#2a2a2a",
+        "alt": "#1c1c1c",
+    },
+    True: {
+        "fg": "black", "muted": "#333", "window": "#f0f0f0",
+        "field": "#ffffff", "field_border": "#ccc", "hover": "#ddd", "pressed": "#bbb",
+        "minimize_hover": "#ccc", "close_hover": "#ffaaaa",
+        "dropdown_border": "#ddd", "dropdown_hover_border": "#bbb", "dropdown_hover": "#f8f8f8",
+        "popup": "#ffffff", "item_hover": "#f0f0f0", "arrow_icon": "PHN2ZyB3aWR0aD0iMTIiIGhlaWdodD0iOCIgdmlld0JveD0iMCAwIDEyIDgiIGZpbGw9Im5vbmUiIHhtbG5zPSJodHRwOi8vd3d3LnczLm9yZy8yMDAwL3N2ZyI+CjxwYXRoIGQ9Ik0xIDFMNiA2TDExIDEiIHN0cm9rZT0iIzY2NiIgc3Ryb2tlLXdpZHRoPSIyIiBzdHJva2UtbGluZWNhcD0icm91bmQiIHN0cm9rZS1saW5lam9pbj0icm91bmQiLz4KPC9zdmc+",
+        "panel": "#ffffff", "panel_hover": "#f0f0f0", "check_border": "#ccc", "check_bg": "white",
+        "alt": "#f4f4f4",
+    },
+}
+
+CHECK_MARK_ICON = "PHN2ZyB3aWR0aD0iMTIiIGhlaWdodD0iMTIiIHZpZXdCb3g9IjAgMCAxMiAxMiIgZmlsbD0ibm9uZSIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj4KPHBhdGggZD0iTTEwIDNMNC41IDguNUwyIDYiIHN0cm9rZT0id2hpdGUiIHN0cm9rZS13aWR0aD0iMiIgc3Ryb2tlLWxpbmVjYXA9InJvdW5kIiBzdHJva2UtbGluZWpvaW49InJvdW5kIi8+Cjwvc3ZnPgo="
+
+# One application-wide sheet per theme. Widgets are matched by object name so the
+# popups and the main window can share it without their rules leaking into each other.
+THEME_TEMPLATE = """
+QWidget#titleBar, QWidget#titleBar QLabel {{ background-color: {window}; }}
+QPushButton#optionsButton {{ background-color: transparent; color: {fg}; border: none; font: 16pt 'Segoe UI'; }}
+QPushButton#optionsButton:hover {{ background-color: {hover}; }}
+QPushButton#optionsButton:pressed {{ background-color: {pressed}; }}
+QLabel#titleLabel {{ color: {fg}; font: bold 16pt 'Segoe UI'; }}
+QPushButton#minimizeButton {{ background-color: transparent; color: {fg}; border: none; font: bold 14pt 'Segoe UI'; }}
+QPushButton#minimizeButton:hover {{ background-color: {minimize_hover}; }}
+QPushButton#closeButton {{ background-color: transparent; color: {fg}; border: none; }}
+QPushButton#closeButton:hover {{ background-color: {close_hover}; }}
+
+QWidget#mainContent QLineEdit {{
+    background-color: {field}; border: 2px solid {field_border}; padding: 10px;
+    border-radius: 5px; color: {fg}; font: 14pt 'Segoe UI';
+}}
+QWidget#mainContent QLineEdit:focus {{ border: 2px solid #1e90ff; }}
+QWidget#mainContent QComboBox {{
+    background-color: {field}; border: 2px solid {dropdown_border}; padding: 10px 16px; border-radius: 8px;
+    color: {fg}; font: 13pt 'Segoe UI'; outline: none; min-width: 80px;
+}}
+QWidget#mainContent QComboBox:hover {{ border: 2px solid {dropdown_hover_border}; background-color: {dropdown_hover}; }}
+QWidget#mainContent QComboBox:focus {{ border: 2px solid #1e90ff; outline: none; }}
+QWidget#mainContent QComboBox::drop-down {{
+    subcontrol-origin: padding; subcontrol-position: top right; width: 20px; border: none; background: transparent;
+}}
+QWidget#mainContent QComboBox::down-arrow {{ image: url(data:image/svg+xml;base64,{arrow_icon}); width: 12px; height: 8px; }}
+QWidget#mainContent QComboBox QAbstractItemView {{
+    background: {popup}; border: 2px solid {dropdown_border}; border-radius: 8px; color: {fg};
+    padding: 4px; selection-background-color: #1e90ff; outline: none;
+}}
+QWidget#mainContent QComboBox QAbstractItemView::item {{ padding: 8px 12px; border: none; min-height: 20px; }}
+QWidget#mainContent QComboBox QAbstractItemView::item:selected {{ background: #1e90ff; color: white; border-radius: 4px; }}
+QWidget#mainContent QComboBox QAbstractItemView::item:hover {{ background: {item_hover}; border-radius: 4px; }}
+
+QListView#jobList {{ background: transparent; border: none; }}
+QListView#jobList QScrollBar:vertical {{ background: transparent; width: 8px; }}
+QListView#jobList QScrollBar::handle:vertical {{ background: {field_border}; border-radius: 4px; min-height: 20px; }}
+QListView#jobList QScrollBar::add-line:vertical, QListView#jobList QScrollBar::sub-line:vertical {{ height: 0px; }}
+QListView#jobList QScrollBar::add-page:vertical, QListView#jobList QScrollBar::sub-page:vertical {{ background: none; }}
+QLabel#fieldLabel {{ color: {fg}; font: 13pt 'Segoe UI'; }}
+QLabel#videoInfoLabel {{ color: {muted}; font: 10pt 'Segoe UI'; }}
+QLabel#downloadStatusLabel {{ color: {fg}; font: bold 14pt 'Segoe UI'; }}
+QLabel#queueStatusLabel {{ color: {muted}; font: italic 10pt 'Segoe UI'; }}
+QLabel#analysisProgressLabel {{ color: {fg}; font: italic 12pt 'Segoe UI'; }}
+QLabel#analysisResultsLabel {{
+    color: #bbb; font: 14pt 'Segoe UI'; background-color: #1a1a1a; border: 1px solid #333;
+    border-radius: 8px; padding: 8px; min-height: 50px;
+}}
+
+QPushButton#muteButton, QPushButton#pasteButton {{
+    background-color: {field}; color: {fg}; border: 2px solid {field_border};
+}}
+QPushButton#muteButton {{ border-radius: 8px; font: bold 12pt 'Segoe UI'; }}
+QPushButton#pasteButton {{ padding: 10px 15px; border-radius: 5px; font: 12pt 'Segoe UI'; }}
+QPushButton#muteButton:hover, QPushButton#pasteButton:hover {{ background-color: {hover}; }}
+QPushButton#muteButton:pressed, QPushButton#pasteButton:pressed {{ background-color: {pressed}; }}
+QPushButton#browseButton, QPushButton#resetButton {{
+    color: white; border: none; padding: 10px 15px; border-radius: 8px; font: 12pt 'Segoe UI';
+}}
+QPushButton#browseButton {{ background-color: #147cd3; }}
+QPushButton#browseButton:hover {{ background-color: #126bb0; }}
+QPushButton#browseButton:pressed {{ background-color: #0f5a8e; }}
+QPushButton#resetButton {{ background-color: #666; }}
+QPushButton#resetButton:hover {{ background-color: #777; }}
+QPushButton#resetButton:pressed {{ background-color: #555; }}
+QPushButton#downloadButton, QPushButton#analyzeButton {{
+    color: white; border: none; padding: 12px 20px; border-radius: 8px; font: bold 14pt 'Segoe UI';
+}}
+QPushButton#downloadButton {{ background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #147cd3, stop:1 #126bb0); }}
+QPushButton#downloadButton:hover {{ background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #126bb0, stop:1 #0f5a8e); }}
+QPushButton#downloadButton:pressed {{ background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #0f5a8e, stop:1 #0c4675); }}
+QPushButton#analyzeButton {{ background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #9333ea, stop:1 #7c3aed); }}
+QPushButton#analyzeButton:hover {{ background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #7c3aed, stop:1 #6d28d9); }}
+QPushButton#analyzeButton:pressed {{ background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #6d28d9, stop:1 #5b21b6); }}
+
+QWidget#optionsPopup, QWidget#optionsPopup QWidget {{ background-color: {panel}; border: none; border-radius: 5px; }}
+QWidget#optionsPopup QCheckBox {{ color: {fg}; font: 12pt "Segoe UI"; padding: 5px; outline: none; spacing: 8px; }}
+QWidget#optionsPopup QCheckBox::indicator {{
+    width: 16px; height: 16px; border: 2px solid {check_border}; border-radius: 3px; background-color: {check_bg};
+}}
+QWidget#optionsPopup QCheckBox::indicator:hover {{ border: 2px solid #1e90ff; }}
+QWidget#optionsPopup QCheckBox::indicator:checked {{
+    background-color: #1e90ff; border: 2px solid #1e90ff; image: url(data:image/svg+xml;base64,{check_icon});
+}}
+QWidget#optionsPopup QCheckBox::indicator:focus {{ outline: none; }}
+QWidget#optionsPopup QCheckBox:hover {{ background-color: {panel_hover}; border-radius: 3px; }}
+QWidget#optionsPopup QPushButton {{
+    color: {fg}; background-color: transparent; font: 12pt "Segoe UI"; padding: 5px; text-align: left;
+}}
+QWidget#optionsPopup QPushButton:hover {{ background-color: {panel_hover}; border-radius: 3px; }}
+
+QWidget#diagnosticsPopup, QWidget#diagnosticsPopup QWidget {{ background-color: {panel}; color: {fg}; font: 10pt 'Segoe UI'; }}
+QWidget#diagnosticsPopup QPlainTextEdit {{ border: 1px solid {field_border}; border-radius: 5px; font: 10pt 'Consolas', monospace; }}
+
+QWidget#libraryPopup, QWidget#libraryPopup QWidget {{ background-color: {panel}; color: {fg}; font: 11pt 'Segoe UI'; }}
+QWidget#libraryPopup QLineEdit {{ border: 2px solid {field_border}; border-radius: 5px; padding: 6px; }}
+QWidget#libraryPopup QLineEdit:focus {{ border: 2px solid #1e90ff; }}
+QWidget#libraryPopup QTableView {{
+    border: 1px solid {field_border}; gridline-color: {field_border}; alternate-background-color: {alt};
+    selection-background-color: #1e90ff; selection-color: white;
+}}
+QWidget#libraryPopup QHeaderView::section {{ background-color: {alt}; color: {fg}; border: none; padding: 4px; }}
+QWidget#libraryPopup QPushButton {{ border: 1px solid {field_border}; border-radius: 5px; padding: 4px 12px; }}
+QWidget#libraryPopup QPushButton:hover {{ border: 1px solid #1e90ff; }}
+"""
+
+# Built once at startup, switching themes is a single QApplication.setStyleSheet call
+THEME_STYLESHEETS = {light_mode: THEME_TEMPLATE.format(check_icon=CHECK_MARK_ICON, **colors)
+                     for light_mode, colors in THEME_COLORS.items()}
+
 # --- Options Popup Widget ---
 class OptionsWidget(QWidget):
     def __init__(self, light_mode, open_folder_after_download, auto_analyze, main_window):
@@ -117,8 +1928,8 @@ class OptionsWidget(QWidget):
         self.setFocusPolicy(Qt.FocusPolicy.NoFocus)
         self.light_mode = light_mode
         self.main_window = main_window
+        self.setObjectName("optionsPopup")
         self.initUI(open_folder_after_download, auto_analyze)
-        self.updateStyleMode()
 
     def initUI(self, open_folder_after_download, auto_analyze):
         layout = QVBoxLayout(self)
@@ -139,6 +1950,32 @@ class OptionsWidget(QWidget):
         # Connect all checkboxes to update options
         for checkbox in [self.lightModeCheck, self.openFolderCheck, self.autoAnalyzeCheck]:
             checkbox.toggled.connect(self.updateOptions)
+
+        # Ingestion: links copied to the clipboard or dropped into a folder as text files are queued
+        self.watchClipboardCheck = QCheckBox("Queue links from clipboard")
+        self.watchClipboardCheck.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.watchClipboardCheck.toggled.connect(
+            lambda checked: self.main_window.setIngestion(self.main_window.watchFolder, checked))
+        layout.addWidget(self.watchClipboardCheck)
+        self.watchFolderButton = QPushButton()
+        self.watchFolderButton.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.watchFolderButton.clicked.connect(self.main_window.chooseWatchFolder)
+        layout.addWidget(self.watchFolderButton)
+        self.stopWatchingButton = QPushButton("Stop watching folder")
+        self.stopWatchingButton.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.stopWatchingButton.clicked.connect(
+            lambda: self.main_window.setIngestion("", self.main_window.watchClipboard))
+        layout.addWidget(self.stopWatchingButton)
+        self.setIngestion(self.main_window.watchFolder, self.main_window.watchClipboard)
+
+        self.diagnosticsButton = QPushButton("Diagnostics")
+        self.diagnosticsButton.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.diagnosticsButton.clicked.connect(self.main_window.toggleDiagnostics)
+        layout.addWidget(self.diagnosticsButton)
+        self.libraryButton = QPushButton("Library")
+        self.libraryButton.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.libraryButton.clicked.connect(self.main_window.toggleLibrary)
+        layout.addWidget(self.libraryButton)
     
     def updateOptions(self):
         self.main_window.setOptions(
@@ -147,77 +1984,526 @@ class OptionsWidget(QWidget):
             auto_analyze=self.autoAnalyzeCheck.isChecked()
         )
 
-    def updateStyleMode(self):
-        if self.light_mode:
-            self.setStyleSheet("""
-                QWidget {
-                    background-color: #ffffff;
-                    border: none;
-                    border-radius: 5px;
-                }
-                QCheckBox {
-                    color: black;
-                    font: 12pt "Segoe UI";
-                    padding: 5px;
-                    outline: none;
-                    spacing: 8px;
-                }
-                QCheckBox::indicator {
-                    width: 16px;
-                    height: 16px;
-                    border: 2px solid #ccc;
-                    border-radius: 3px;
-                    background-color: white;
-                }
-                QCheckBox::indicator:hover {
-                    border: 2px solid #1e90ff;
-                }
-                QCheckBox::indicator:checked {
-                    background-color: #1e90ff;
-                    border: 2px solid #1e90ff;
-                    image: url(data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMTIiIGhlaWdodD0iMTIiIHZpZXdCb3g9IjAgMCAxMiAxMiIgZmlsbD0ibm9uZSIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj4KPHBhdGggZD0iTTEwIDNMNC41IDguNUwyIDYiIHN0cm9rZT0id2hpdGUiIHN0cm9rZS13aWR0aD0iMiIgc3Ryb2tlLWxpbmVjYXA9InJvdW5kIiBzdHJva2UtbGluZWpvaW49InJvdW5kIi8+Cjwvc3ZnPgo=);
-                }
-                QCheckBox::indicator:focus { outline: none; }
-                QCheckBox:hover { background-color: #f0f0f0; border-radius: 3px; }
-            """)
-        else:
-            self.setStyleSheet("""
-                QWidget {
-                    background-color: #161616;
-                    border: none;
-                    border-radius: 5px;
-                }
-                QCheckBox {
-                    color: white;
-                    font: 12pt "Segoe UI";
-                    padding: 5px;
-                    outline: none;
-                    spacing: 8px;
-                }
-                QCheckBox::indicator {
-                    width: 16px;
-                    height: 16px;
-                    border: 2px solid #555;
-                    border-radius: 3px;
-                    background-color: #2a2a2a;
-                }
-                QCheckBox::indicator:hover {
-                    border: 2px solid #1e90ff;
-                }
-                QCheckBox::indicator:checked {
-                    background-color: #1e90ff;
-                    border: 2px solid #1e90ff;
-                    image: url(data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMTIiIGhlaWdodD0iMTIiIHZpZXdCb3g9IjAgMCAxMiAxMiIgZmlsbD0ibm9uZSIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj4KPHBhdGggZD0iTTEwIDNMNC41IDguNUwyIDYiIHN0cm9rZT0id2hpdGUiIHN0cm9rZS13aWR0aD0iMiIgc3Ryb2tlLWxpbmVjYXA9InJvdW5kIiBzdHJva2UtbGluZWpvaW49InJvdW5kIi8+Cjwvc3ZnPgo=);
-                }
-                QCheckBox::indicator:focus { outline: none; }
-                QCheckBox:hover { background-color: #333; border-radius: 3px; }
-            """)
+    def setIngestion(self, watch_folder, watch_clipboard):
+        self.watchClipboardCheck.blockSignals(True)
+        self.watchClipboardCheck.setChecked(watch_clipboard)
+        self.watchClipboardCheck.blockSignals(False)
+        name = os.path.basename(os.path.normpath(watch_folder)) if watch_folder else ""
+        self.watchFolderButton.setText(f"Watch folder: {name}" if name else "Watch folder...")
+        self.watchFolderButton.setToolTip(watch_folder or "Queue links from text files dropped into a folder")
+        self.stopWatchingButton.setVisible(bool(watch_folder))
+        self.adjustSize()
 
     def getLightMode(self):
         return self.lightModeCheck.isChecked()
     def getOpenFolderAfterDownload(self):
         return self.openFolderCheck.isChecked()
 
+# --- Waveform Widget ---
+class WaveformWidget(QWidget):
+    """Waveform overview drawn from the cached peak pyramid.
+
+    Wheel zooms around the cursor, dragging scrolls, double-click shows the whole file.
+    """
+    def __init__(self, light_mode, parent=None):
+        super().__init__(parent)
+        self.setFixedHeight(70)
+        self.pyramid = None
+        self.view = (0.0, 0.0)
+        self.dragStart = None
+        self.lightMode = light_mode
+
+    def setLightMode(self, light_mode):
+        self.lightMode = light_mode
+        self.update()
+
+    def setFile(self, audio_path):
+        """Show the file's waveform if its peaks are cached, returns whether it is shown"""
+        self.pyramid = PeakPyramid.load(audio_path) if audio_path else None
+        if self.pyramid is None:
+            self.hide()
+            return False
+        self.view = (0.0, self.pyramid.duration)
+        self.show()
+        self.update()
+        return True
+
+    def setView(self, start, end):
+        duration = self.pyramid.duration
+        length = min(max(end - start, 0.05), duration)
+        start = min(max(start, 0.0), duration - length)
+        self.view = (start, start + length)
+        self.update()
+
+    def wheelEvent(self, event):
+        if not self.pyramid:
+            return
+        start, end = self.view
+        anchor = start + (end - start) * event.position().x() / max(self.width(), 1)
+        scale = 0.8 if event.angleDelta().y() > 0 else 1.25
+        self.setView(anchor - (anchor - start) * scale, anchor + (end - anchor) * scale)
+
+    def mousePressEvent(self, event):
+        self.dragStart = (event.position().x(), self.view)
+
+    def mouseMoveEvent(self, event):
+        if self.pyramid and self.dragStart:
+            x, (start, end) = self.dragStart
+            shift = (x - event.position().x()) * (end - start) / max(self.width(), 1)
+            self.setView(start + shift, end + shift)
+
+    def mouseReleaseEvent(self, event):
+        self.dragStart = None
+
+    def mouseDoubleClickEvent(self, event):
+        if self.pyramid:
+            self.setView(0.0, self.pyramid.duration)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("#f4f4f4" if self.lightMode else "#1c1c1c"))
+        if not self.pyramid or self.width() <= 0:
+            return
+        mins, maxs = self.pyramid.columns(self.view[0], self.view[1], self.width())
+        middle = self.height() / 2
+        scale = middle - 2
+        painter.setPen(QPen(QColor("#1e90ff"), 1))
+        painter.drawLines([QLineF(x + 0.5, middle - high * scale, x + 0.5, middle - low * scale)
+                           for x, (low, high) in enumerate(zip(mins.tolist(), maxs.tolist()))])
+
+# --- Diagnostics Popup Widget ---
+class DiagnosticsWidget(QWidget):
+    """Per-stage job metrics, refreshed while the panel is open"""
+    def __init__(self):
+        super().__init__(None, flags=Qt.WindowType.Tool)
+        self.setObjectName("diagnosticsPopup")
+        self.setWindowTitle("Waver Diagnostics")
+        self.resize(760, 480)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(10, 10, 10, 10)
+        self.pathLabel = QLabel(f"Prometheus metrics: {metrics.textfile_path or 'disabled'}")
+        self.pathLabel.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        layout.addWidget(self.pathLabel)
+        self.ffmpegLabel = QLabel()
+        self.ffmpegLabel.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        layout.addWidget(self.ffmpegLabel)
+        self.concurrencyLabel = QLabel()
+        self.concurrencyLabel.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        layout.addWidget(self.concurrencyLabel)
+        self.reportView = QPlainTextEdit()
+        self.reportView.setReadOnly(True)
+        self.reportView.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        layout.addWidget(self.reportView)
+        self.refreshTimer = QTimer(self)
+        self.refreshTimer.setInterval(1000)
+        self.refreshTimer.timeout.connect(self.refresh)
+
+    def refresh(self):
+        scroll = self.reportView.verticalScrollBar().value()
+        self.ffmpegLabel.setText(ffmpeg_caps.describe())
+        self.concurrencyLabel.setText(adaptive_concurrency.describe() + "\nPipeline: " +
+                                      " \u2022 ".join(stage.describe() for stage in (transcode_stage, analysis_stage)) +
+                                      "\n" + retry_policy.describe())
+        self.reportView.setPlainText(metrics.summary_text() + "\n\n" + adaptive_concurrency.summary_text())
+        self.reportView.verticalScrollBar().setValue(scroll)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.refreshTimer.start()
+
+    def hideEvent(self, event):
+        self.refreshTimer.stop()
+        super().hideEvent(event)
+
+# --- Library Model and Popup Widget ---
+class LibraryModel(QAbstractTableModel):
+    """Table model over TrackLibrary that only loads the pages the view asks for.
+
+    A search keeps just the ordered list of matching ids, display rows are
+    read from SQLite a page at a time and a bounded number of pages is cached.
+    """
+    HEADERS = ["Title", "BPM", "Key", "Camelot", "Duration", "Format", "LUFS"]
+    PAGE_SIZE = 200
+    MAX_PAGES = 50
+
+    def __init__(self, library, parent=None):
+        super().__init__(parent)
+        self.library = library
+        self.ids = []
+        self.pages = {}
+
+    def search(self, query):
+        self.setIds(self.library.search_ids(query))
+
+    def setIds(self, ids):
+        self.beginResetModel()
+        self.ids = ids
+        self.pages = {}
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.ids)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def rowAt(self, row):
+        page = row // self.PAGE_SIZE
+        if page not in self.pages:
+            if len(self.pages) >= self.MAX_PAGES:
+                self.pages.pop(next(iter(self.pages)))
+            ids = self.ids[page * self.PAGE_SIZE:(page + 1) * self.PAGE_SIZE]
+            self.pages[page] = self.library.fetch_rows(ids)
+        return self.pages[page].get(self.ids[row])
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self.rowAt(index.row())
+        if record is None:
+            return None
+        _, title, bpm, key, camelot, duration, file_format, path, lufs = record
+        if role == Qt.ItemDataRole.DisplayRole:
+            column = index.column()
+            if column == 0:
+                return title
+            if column == 1:
+                return f"{bpm:.1f}" if bpm else ""
+            if column == 2:
+                return key or ""
+            if column == 3:
+                return camelot or ""
+            if column == 4:
+                return f"{int(duration) // 60}:{int(duration) % 60:02d}" if duration else ""
+            if column == 5:
+                return (file_format or "").upper()
+            if column == 6:
+                return f"{lufs:.1f}" if lufs is not None else ""
+        elif role == Qt.ItemDataRole.ToolTipRole:
+            return path
+        elif role == Qt.ItemDataRole.UserRole:
+            return path
+        return None
+
+class LibraryWidget(QWidget):
+    """Searchable view of the local track library"""
+    def __init__(self, main_window):
+        super().__init__(None, flags=Qt.WindowType.Tool)
+        self.main_window = main_window
+        self.setObjectName("libraryPopup")
+        self.setWindowTitle("Waver Library")
+        self.resize(820, 520)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(10, 10, 10, 10)
+        self.searchInput = QLineEdit()
+        self.searchInput.setPlaceholderText("Search titles, e.g. bpm:120-128 key:Am+ dur:2:00-6:00")
+        self.searchInput.setToolTip("key:Am+ also matches harmonically compatible keys (Camelot wheel)")
+        layout.addWidget(self.searchInput)
+        statusLayout = QHBoxLayout()
+        self.countLabel = QLabel("")
+        statusLayout.addWidget(self.countLabel, 1)
+        self.mixButton = QPushButton("Mixes With")
+        self.mixButton.setToolTip("Tracks with a similar tempo and a compatible key to the selected one")
+        self.mixButton.clicked.connect(self.showMixableTracks)
+        statusLayout.addWidget(self.mixButton)
+        self.exportButton = QPushButton("Export Grids")
+        self.exportButton.setToolTip("Export beat grids of the listed tracks as rekordbox XML and .beats.json sidecars")
+        self.exportButton.clicked.connect(self.exportBeatGrids)
+        statusLayout.addWidget(self.exportButton)
+        self.tagButton = QPushButton("Write Tags")
+        self.tagButton.setToolTip("Write BPM and key into the tags of the listed tracks")
+        self.tagButton.clicked.connect(self.writeTags)
+        statusLayout.addWidget(self.tagButton)
+        layout.addLayout(statusLayout)
+        self.tagWorker = None
+        self.exportWorker = None
+        self.model = LibraryModel(track_library, self)
+        self.tableView = QTableView()
+        self.tableView.setModel(self.model)
+        self.tableView.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.tableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.tableView.setWordWrap(False)
+        # Fixed row heights keep scrolling independent of the number of rows
+        self.tableView.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.tableView.verticalHeader().setDefaultSectionSize(24)
+        self.tableView.verticalHeader().hide()
+        self.tableView.setAlternatingRowColors(True)
+        self.tableView.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.tableView.doubleClicked.connect(self.openTrackFolder)
+        layout.addWidget(self.tableView)
+        # Debounce typing so every keystroke doesn't run a query
+        self.searchTimer = QTimer(self)
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(200)
+        self.searchTimer.timeout.connect(self.refresh)
+        self.searchInput.textChanged.connect(self.searchTimer.start)
+
+    def refresh(self):
+        started = time.perf_counter()
+        try:
+            self.model.search(self.searchInput.text())
+        except sqlite3.Error as e:
+            self.countLabel.setText(f"Library error: {e}")
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        self.countLabel.setText(f"{self.model.rowCount()} tracks ({elapsed:.0f} ms)")
+
+    def showMixableTracks(self):
+        index = self.tableView.currentIndex()
+        if not index.isValid():
+            self.countLabel.setText("Select a track first")
+            return
+        track_id = self.model.ids[index.row()]
+        title = self.model.data(self.model.index(index.row(), 0))
+        started = time.perf_counter()
+        matches = feature_index.nearest(track_id)
+        elapsed = (time.perf_counter() - started) * 1000
+        if not matches:
+            self.countLabel.setText(f"No analysis data for {title}")
+            return
+        self.model.setIds([track_id] + [match_id for match_id, _ in matches])
+        self.tableView.selectRow(0)
+        self.countLabel.setText(f"{len(matches)} tracks that mix with {title} ({elapsed:.0f} ms)")
+
+    def writeTags(self):
+        if self.tagWorker and self.tagWorker.isRunning():
+            return
+        self.tagButton.setEnabled(False)
+        self.tagWorker = TagWriterWorker(list(self.model.ids))
+        self.tagWorker.progress.connect(lambda done, total: self.countLabel.setText(f"Tagging {done}/{total}..."))
+        self.tagWorker.tagging_complete.connect(self.onTaggingComplete)
+        self.tagWorker.start()
+
+    def onTaggingComplete(self, tagged, failed):
+        self.tagButton.setEnabled(True)
+        self.countLabel.setText(f"Tagged {tagged} tracks" + (f", {failed} failed" if failed else ""))
+
+    def exportBeatGrids(self):
+        if self.exportWorker and self.exportWorker.isRunning():
+            return
+        xml_path, _ = QFileDialog.getSaveFileName(self, "Export Beat Grids", "waver_beatgrids.xml", "rekordbox XML (*.xml)")
+        if not xml_path:
+            return
+        self.exportButton.setEnabled(False)
+        self.countLabel.setText("Exporting beat grids...")
+        self.exportWorker = BeatGridExportWorker(list(self.model.ids), xml_path)
+        self.exportWorker.export_complete.connect(self.onExportComplete)
+        self.exportWorker.start()
+
+    def onExportComplete(self, count, error):
+        self.exportButton.setEnabled(True)
+        self.countLabel.setText(f"Export failed: {error}" if error else f"Exported beat grids for {count} tracks")
+
+    def openTrackFolder(self, index):
+        path = self.model.data(index, Qt.ItemDataRole.UserRole)
+        if path:
+            self.main_window.openDownloadFolder(os.path.dirname(path))
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+
+# --- Job List Model and Delegate ---
+class JobListModel(QAbstractListModel):
+    """Download jobs, one row each, queued ones included.
+
+    Workers report progress much more often than the screen refreshes, so changes
+    are collected per job and applied once per frame: new jobs as one row insert,
+    updates as one dataChanged over the changed rows.
+    """
+    ProgressRole = Qt.ItemDataRole.UserRole + 1
+    StatusRole = Qt.ItemDataRole.UserRole + 2
+    StateRole = Qt.ItemDataRole.UserRole + 3
+    QUEUED, RUNNING, DONE, FAILED = range(4)
+    FRAME_MS = 16
+    MAX_FINISHED = 50  # Finished jobs kept in the list, oldest are dropped first
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.jobs = []  # dicts with key, title, progress, status, state
+        self.rows = {}  # key -> row
+        self.added = {}  # key -> job, inserted on the next flush
+        self.changed = set()
+        self.finished = deque()  # keys in the order they finished
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.FRAME_MS)
+        self.timer.timeout.connect(self.flush)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.jobs)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        job = self.jobs[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return job["title"]
+        if role == self.ProgressRole:
+            return job["progress"]
+        if role == self.StatusRole:
+            return job["status"]
+        if role == self.StateRole:
+            return job["state"]
+        return None
+
+    def addJob(self, key, title, state=QUEUED, first=False):
+        """Add a job, or restart the one already listed under this key.
+
+        Jobs are appended in batches, first=True inserts at the top right away
+        so a manual download isn't listed below a long queue.
+        """
+        job = self.job(key)
+        if job is not None:
+            self.updateJob(key, title=title, state=state, progress=0.0, status="")
+            return
+        job = {"key": key, "title": title, "progress": 0.0, "status": "", "state": state}
+        if first:
+            self.flush()
+            self.beginInsertRows(QModelIndex(), 0, 0)
+            self.jobs.insert(0, job)
+            self.rows = {job["key"]: row for row, job in enumerate(self.jobs)}
+            self.endInsertRows()
+            return
+        self.added[key] = job
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def updateJob(self, key, **changes):
+        job = self.job(key)
+        if job is None:
+            return
+        if changes.get("state") in (self.DONE, self.FAILED) and job["state"] not in (self.DONE, self.FAILED):
+            self.finished.append(key)
+        job.update(changes)
+        self.changed.add(key)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def track(self, key, worker):
+        """Show a DownloadWorker's progress in the row of this job"""
+        self.updateJob(key, state=self.RUNNING)
+
+        def finished():
+            if self.job(key) is not None and self.job(key)["state"] != self.FAILED:
+                self.updateJob(key, state=self.DONE, progress=100.0)
+
+        worker.title_signal.connect(lambda title: self.updateJob(key, title=title))
+        worker.progress_signal.connect(lambda value: self.updateJob(key, progress=value))
+        # The percentage is painted separately
+        worker.status_signal.connect(lambda text: self.updateJob(key, status=re.sub(r"\s*\d+(\.\d+)?%$", "", text)))
+        worker.error_signal.connect(lambda error: self.updateJob(key, state=self.FAILED, status=f"Error: {error}"))
+        worker.finished_signal.connect(finished)
+
+    def job(self, key):
+        if key in self.rows:
+            return self.jobs[self.rows[key]]
+        return self.added.get(key)
+
+    def flush(self):
+        if self.added:
+            first = len(self.jobs)
+            self.beginInsertRows(QModelIndex(), first, first + len(self.added) - 1)
+            for row, job in enumerate(self.added.values(), first):
+                self.jobs.append(job)
+                self.rows[job["key"]] = row
+            self.added = {}
+            self.endInsertRows()
+        rows = [self.rows[key] for key in self.changed if key in self.rows]
+        self.changed.clear()
+        if rows:
+            self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)),
+                                  [Qt.ItemDataRole.DisplayRole, self.ProgressRole, self.StatusRole, self.StateRole])
+        while len(self.finished) > self.MAX_FINISHED:
+            key = self.finished.popleft()
+            row = self.rows.get(key)
+            if row is None or self.jobs[row]["state"] not in (self.DONE, self.FAILED):
+                continue
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.jobs[row]
+            self.rows = {job["key"]: row for row, job in enumerate(self.jobs)}
+            self.endRemoveRows()
+
+
+class JobDelegate(QStyledItemDelegate):
+    """Paints a job row as a progress bar with title, status and percentage.
+
+    Fonts, pens and brushes are created once per theme instead of on every paint.
+    """
+    ROW_HEIGHT = 30
+    CHUNK_COLOR = "#39FF14"
+    FAILED_COLOR = "#ff5555"
+
+    def __init__(self, light_mode, parent=None):
+        super().__init__(parent)
+        self.titleFont = QFont("Segoe UI", 10)
+        self.percentFont = QFont("Segoe UI", 10, QFont.Weight.Bold)
+        self.titleMetrics = QFontMetrics(self.titleFont)
+        self.percentMetrics = QFontMetrics(self.percentFont)
+        self.chunkBrush = QBrush(QColor(self.CHUNK_COLOR))
+        self.failedBrush = QBrush(QColor(self.FAILED_COLOR))
+        self.onChunkPen = QPen(QColor("black"))
+        self.setLightMode(light_mode)
+
+    def setLightMode(self, light_mode):
+        background, border, text, muted = (("#ffffff", "#ccc", "black", "#666") if light_mode
+                                           else ("#151515", "#333", "white", "#aaa"))
+        self.backgroundBrush = QBrush(QColor(background))
+        self.borderPen = QPen(QColor(border))
+        self.textPen = QPen(QColor(text))
+        self.mutedPen = QPen(QColor(muted))
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+
+    def paint(self, painter, option, index):
+        model = index.model()
+        progress = model.data(index, JobListModel.ProgressRole) or 0.0
+        state = model.data(index, JobListModel.StateRole)
+        status = model.data(index, JobListModel.StatusRole) or ""
+        rect = option.rect.adjusted(2, 2, -2, -2)
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(self.borderPen)
+        painter.setBrush(self.backgroundBrush)
+        painter.drawRoundedRect(rect, 5, 5)
+        chunk = rect.adjusted(0, 0, -int(rect.width() * (1 - min(progress, 100.0) / 100)), 0)
+        if chunk.width() > 0 or state == JobListModel.FAILED:
+            chunk = rect if state == JobListModel.FAILED else chunk
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(self.failedBrush if state == JobListModel.FAILED else self.chunkBrush)
+            painter.drawRoundedRect(chunk, 5, 5)
+
+        text_rect = rect.adjusted(10, 0, -10, 0)
+        percent = f"{int(progress)}%" if state in (JobListModel.RUNNING, JobListModel.DONE) else ""
+        percent_width = self.percentMetrics.horizontalAdvance("100%")
+        status_width = min(self.titleMetrics.horizontalAdvance(status) + 4, text_rect.width() // 3)
+        title_rect = text_rect.adjusted(0, 0, -(percent_width + status_width + 20), 0)
+        status_rect = text_rect.adjusted(title_rect.width() + 10, 0, -(percent_width + 10), 0)
+        title = self.titleMetrics.elidedText(index.data() or "", Qt.TextElideMode.ElideRight, title_rect.width())
+        status = self.titleMetrics.elidedText(status, Qt.TextElideMode.ElideRight, status_rect.width())
+        align = Qt.AlignmentFlag.AlignVCenter
+        # Text over the filled part is drawn again in black, clipped to the chunk
+        for pen, muted, clip in ((self.textPen, self.mutedPen, rect), (self.onChunkPen, self.onChunkPen, chunk)):
+            if clip.width() <= 0:
+                continue
+            painter.setClipRect(clip)
+            painter.setFont(self.titleFont)
+            painter.setPen(pen)
+            painter.drawText(title_rect, align | Qt.AlignmentFlag.AlignLeft, title)
+            painter.setPen(muted)
+            painter.drawText(status_rect, align | Qt.AlignmentFlag.AlignRight, status)
+            painter.setFont(self.percentFont)
+            painter.setPen(pen)
+            painter.drawText(text_rect, align | Qt.AlignmentFlag.AlignRight, percent)
+        painter.restore()
+
 # --- Background Widget ---
 class BackgroundWidget(QWidget):
     def __init__(self, parent=None, bg_color="#0d0d0d"):
@@ -233,22 +2519,43 @@ class DownloadWorker(QThread):
     progress_signal = pyqtSignal(float)
     status_signal = pyqtSignal(str)
     details_signal = pyqtSignal(str)
+    title_signal = pyqtSignal(str)  # Title of the video being downloaded, once per playlist entry
+    fetched_signal = pyqtSignal()  # Network part done, only conversions left
     finished_signal = pyqtSignal()
     file_downloaded_signal = pyqtSignal(str)  # Emit the downloaded file path
     error_signal = pyqtSignal(str)
-    def __init__(self, url, download_dir, format_type="wav", quality="320k"):
+    def __init__(self, url, download_dir, format_type="wav", quality="320k", priority=PRIORITY_SINGLE, section=None,
+                 skip_duplicates=True, loudness_target=None):
         super().__init__()
+        self.loudness_target = loudness_target  # LUFS, None = measure only
+        self.skip_duplicates = skip_duplicates
+        self.duplicate_of = None
+        self.analyze = False  # hand converted files to the analysis stage
+        self.stage_jobs = []  # Futures of this job's work on the transcode stage
         self.url = url
+        self.priority = priority
+        self.section = section  # (start, end) seconds, end None = until the end
         self.download_dir = download_dir
         self.format_type = format_type.lower()
         self.quality = quality
         self.downloaded_file = None
+        self.title = None
         self.is_video = format_type.lower() == "mp4"
+        self.trace = JobTrace("download", url)
     def run(self):
-        ffmpeg_dir = resource_path("ffmpeg_bin/bin")
+        ffmpeg_dir = os.path.dirname(ffmpeg_executable())
+        bandwidth = bandwidth_scheduler.register(self.priority)
+        outtmpl = os.path.join(self.download_dir, '%(title)s.%(ext)s')
+        if self.section:
+            start, end = self.section
+            label = f"{format_timestamp(start)}-{format_timestamp(end) if end is not None else 'end'}"
+            outtmpl = os.path.join(self.download_dir, f'%(title)s [{label}].%(ext)s')
         
         def progress_hook(info):
+            self.report_title(info.get('info_dict'))
             if info.get('status') == 'downloading':
+                self.trace.begin("download")
+                bandwidth_scheduler.throttle(bandwidth, info)
                 total = info.get('total_bytes') or info.get('total_bytes_estimate')
                 if total:
                     downloaded = info.get('downloaded_bytes', 0)
@@ -260,6 +2567,7 @@ class DownloadWorker(QThread):
                     self.status_signal.emit(f"Downloading... {percent:.1f}%")
                     self.details_signal.emit(f"Speed: {speed_kbps:.1f} KB/s | ETA: {eta} sec")
             elif info.get('status') == 'finished':
+                self.trace.end("download", info.get('total_bytes') or info.get('downloaded_bytes') or 0)
                 filename = info.get("filename")
                 if filename:
                     self.downloaded_file = os.path.abspath(filename)
@@ -268,143 +2576,1242 @@ class DownloadWorker(QThread):
                     self.status_signal.emit("Download completed!")
                 else:
                     self.status_signal.emit("Download completed, converting...")
+
+        def postprocessor_hook(info):
+            if info.get('postprocessor') == 'MoveFiles':
+                # Runs last for every file, so the info has the final path
+                if info.get('status') == 'finished' and (info.get('info_dict') or {}).get('filepath'):
+                    if self.is_video:
+                        self.record_track(info['info_dict'], info['info_dict']['filepath'])
+                    else:
+                        # Convert on the transcode stage while the next entry downloads
+                        self.submit_stage(self.transcode, dict(info['info_dict']), info['info_dict']['filepath'])
+                return
+            if info.get('status') == 'started':
+                self.trace.begin("postprocess")
+            elif info.get('status') == 'finished':
+                path = (info.get('info_dict') or {}).get('filepath')
+                self.trace.end("postprocess", os.path.getsize(path) if path and os.path.exists(path) else 0)
         
         if self.is_video:
             # Video download settings
-            # Convert quality like "1080p" to format selection
-            if "2160p" in self.quality or "4K" in self.quality:
-                format_selector = "best[height<=2160]"
-            elif "1440p" in self.quality:
-                format_selector = "best[height<=1440]"
-            elif "1080p" in self.quality:
-                format_selector = "best[height<=1080]"
-            elif "720p" in self.quality:
-                format_selector = "best[height<=720]"
-            elif "480p" in self.quality:
-                format_selector = "best[height<=480]"
-            else:
-                format_selector = "best"
+            # Pick the best separate video stream up to the requested height plus the best
+            # audio stream, prefer MP4/M4A so the mux is a plain stream copy, and only fall
+            # back to pre-muxed progressive formats when no separate streams exist
+            match = re.search(r"(\d{3,4})p", self.quality)
+            height = f"[height<={match.group(1)}]" if match else ""
+            format_selector = (
+                f"bestvideo{height}[ext=mp4]+bestaudio[ext=m4a]/"
+                f"bestvideo{height}+bestaudio/best{height}/best"
+            )
                 
             ydl_opts = {
                 'format': format_selector,
-                'outtmpl': os.path.join(self.download_dir, '%(title)s.%(ext)s'),
+                'outtmpl': outtmpl,
                 'updatetime': False,
                 'ffmpeg_location': ffmpeg_dir,
                 'progress_hooks': [progress_hook],
+                'postprocessor_hooks': [postprocessor_hook],
                 'quiet': True,
                 'no_warnings': True,
             }
         else:
-            # Audio download settings
-            postprocessors = [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': self.format_type,
-            }]
-            if self.format_type == "mp3":
-                postprocessors[0]['preferredquality'] = self.quality.replace("k", "")
+            # Audio download settings, the raw stream is converted by transcode()
             ydl_opts = {
                 'format': 'bestaudio/best',
-                'outtmpl': os.path.join(self.download_dir, '%(title)s.%(ext)s'),
+                'outtmpl': outtmpl,
                 'updatetime': False,
                 'ffmpeg_location': ffmpeg_dir,
-                'postprocessors': postprocessors,
                 'progress_hooks': [progress_hook],
+                'postprocessor_hooks': [postprocessor_hook],
                 'quiet': True,
                 'no_warnings': True,
             }
+        if self.section:
+            ensure_ffmpeg_on_path()
+            # Only the requested section is fetched (ffmpeg seeks with HTTP range requests,
+            # segmented streams skip fragments outside it) and cut with a stream copy
+            start, end = self.section
+            ydl_opts['download_ranges'] = yt_dlp.utils.download_range_func(
+                None, [(start, end if end is not None else float('inf'))]
+            )
+            ydl_opts['force_keyframes_at_cuts'] = False
+        try:
+            fetched_file = fetch_error = None
+            try:
+                if self.is_video:
+                    fetched_file = self.download_video(ydl_opts)
+                else:
+                    with youtube_dl_pool.session(ydl_opts) as ydl:
+                        with self.trace.span("extract"):
+                            info = self.with_retries(lambda: ydl.extract_info(self.url, download=False))
+                        # One entry at a time, so a retry doesn't fetch finished entries again
+                        for entry in [entry for entry in info.get('entries') or [info] if entry]:
+                            # Section downloads run through ffmpeg, which only reports when finished
+                            self.trace.begin("download")
+                            self.with_retries(lambda entry=entry: ydl.process_ie_result(entry, download=True))
+            except Exception as e:
+                # Entries already downloaded are still converted
+                fetch_error = e
+            self.fetched_signal.emit()
+            final_file, duplicates = self.finish_stages()
+            if fetch_error:
+                raise fetch_error
+            final_file = final_file or fetched_file
+
+            if final_file and os.path.exists(final_file):
+                self.file_downloaded_signal.emit(final_file)
+            elif duplicates:
+                self.trace.finish("duplicate")
+                self.status_signal.emit(f"Skipped, already in library: \u201c{duplicates[-1].title}\u201d")
+                self.finished_signal.emit()
+                return
+
+            self.trace.finish("ok")
+            if self.duplicate_of:
+                self.status_signal.emit(f"Download completed! Looks like a duplicate of \u201c{self.duplicate_of}\u201d")
+            else:
+                self.status_signal.emit("Download completed!")
+            self.finished_signal.emit()
+        except Exception as e:
+            self.trace.finish("error")
+            self.error_signal.emit(str(e))
+
+    def with_retries(self, request):
+        """Run a network request under the retry policy of the job's host"""
+        def on_retry(attempt, delay, error):
+            reason = str(error).splitlines()[0].replace("ERROR: ", "")[:80]
+            self.status_signal.emit(f"Retrying in {delay:.0f} s ({reason})...")
+
+        def on_wait(host, seconds):
+            self.status_signal.emit(f"Paused, {host} is throttling requests (resuming in {seconds:.0f} s)...")
+        return retry_policy.call(self.url, request, on_retry=on_retry, on_wait=on_wait)
+
+    def submit_stage(self, task, *args):
+        """Queue work on the transcode stage, blocks the download while the stage is full"""
+        future = transcode_stage.submit(lambda: task(*args),
+                                        on_wait=lambda: self.status_signal.emit("Waiting for a free converter..."))
+        self.stage_jobs.append(future)
+
+    def finish_stages(self):
+        """Wait for this job's transcodes, returns the last converted file and the skipped duplicates.
+
+        Raises the first error once every transcode is done.
+        """
+        final_file, duplicates, error = None, [], None
+        for future in self.stage_jobs:
+            try:
+                final_file = future.result() or final_file
+            except DuplicateTrackError as e:
+                duplicates.append(e)
+            except Exception as e:
+                error = error or e
+        self.stage_jobs = []
+        if error:
+            raise error
+        return final_file, duplicates
+
+    def transcode(self, info, source):
+        """Transcode stage: convert one downloaded file to the target format, returns the final path"""
+        self.status_signal.emit("Converting...")
+        fingerprint = None
+        if not self.section:
+            try:
+                fingerprint = self.check_duplicate(source)
+            except DuplicateTrackError:
+                # Don't convert or keep a second copy
+                os.remove(source)
+                raise
+        base_path, source_ext = os.path.splitext(source)
+        final_file = f"{base_path}.{self.format_type}"
+        # Encoder and filters come from the cached capabilities of this ffmpeg build
+        target = self.loudness_target if ffmpeg_caps.has_filters("loudnorm", "aresample") else None
+        args = ["-i", source, "-vn"]
+        loudness_file = None
+        if source_ext.lower() == f".{self.format_type}" and not target:
+            # Already in the target format, kept as it is
+            args += ["-c:a", "copy"]
+        else:
+            args += ["-c:a", ffmpeg_caps.audio_encoder(self.format_type) or AUDIO_ENCODERS[self.format_type][0]]
+            if self.format_type == "mp3":
+                args += ["-b:a", self.quality]
+            # Loudness is measured (and optionally normalized) inside the conversion itself
+            if ffmpeg_caps.has_filters("ebur128", "ametadata"):
+                fd, loudness_file = tempfile.mkstemp(prefix="waver-r128-", suffix=".txt")
+                os.close(fd)
+            if target or loudness_file:
+                sample_rate = (info.get('asr') or audio_sample_rate(source)) if target else None
+                args += ["-af", loudness_filter(loudness_file, target, sample_rate)]
+        converting = f"{base_path}.converting.{self.format_type}"
+        loudness = None
+        try:
+            with self.trace.span("postprocess") as span:
+                run_ffmpeg(args + [converting])
+                os.replace(converting, final_file)
+                span['bytes'] = os.path.getsize(final_file)
+            if os.path.abspath(source) != os.path.abspath(final_file):
+                os.remove(source)
+            if loudness_file:
+                try:
+                    loudness = read_loudness_metadata(loudness_file)
+                except OSError:
+                    loudness = None
+        finally:
+            for path in (converting, loudness_file):
+                if path and os.path.exists(path):
+                    os.remove(path)
+        with self.trace.span("finalize"):
+            os.utime(final_file, (time.time(), time.time()))
+        self.record_track(info, final_file, fingerprint, loudness)
+        if self.analyze:
+            # Blocks while the analysis stage is full, which in turn holds up the transcodes
+            analysis_stage.submit(lambda: analyze_downloaded_file(final_file),
+                                  on_wait=lambda: self.status_signal.emit("Waiting for analysis..."))
+        return final_file
+
+    def download_video(self, ydl_opts):
+        """Download every selected video, returns the path of the last progressive download"""
+        final_file = None
+        with youtube_dl_pool.session(ydl_opts) as ydl:
+            with self.trace.span("extract"):
+                info = self.with_retries(lambda: ydl.extract_info(self.url, download=False))
+            entries = [entry for entry in info.get('entries') or [info] if entry]
+            for entry in entries:
+                formats = entry.get('requested_formats')
+                if not formats:
+                    # Progressive format, a single regular download is enough
+                    self.with_retries(lambda entry=entry: ydl.process_ie_result(entry, download=True))
+                    final_file = self.downloaded_file
+                    continue
+                base_path = os.path.splitext(ydl.prepare_filename(entry))[0]
+                with self.trace.span("download") as span:
+                    stream_files = self.fetch_streams(ydl_opts, entry, formats, base_path, span)
+                # Muxed on the transcode stage while the next entry downloads
+                self.submit_stage(self.merge_streams, entry, stream_files, f"{base_path}.mp4")
+        return final_file
+
+    def merge_streams(self, entry, stream_files, final_file):
+        """Transcode stage: mux one video's streams and add it to the library, returns its path"""
+        self.status_signal.emit("Merging video and audio...")
+        with self.trace.span("postprocess") as span:
+            self.mux_streams(stream_files, final_file)
+            span['bytes'] = os.path.getsize(final_file)
+        with self.trace.span("finalize"):
+            os.utime(final_file, (time.time(), time.time()))
+        if self.section:
+            entry = dict(entry, section_start=self.section[0], section_end=self.section[1])
+        self.record_track(entry, final_file)
+        return final_file
+
+    def check_duplicate(self, path):
+        """Fingerprint the downloaded audio before it's converted, returns the fingerprint"""
+        if not path or not os.path.exists(path):
+            return None
+        fingerprint = None
+        try:
+            with self.trace.span("fingerprint") as span:
+                samples = decode_audio(path)
+                span['bytes'] = samples.nbytes
+                fingerprint = audio_fingerprint(samples, FINGERPRINT_SR)
+                match = track_library.find_duplicate(fingerprint)
+        except (RuntimeError, OSError, sqlite3.Error) as e:
+            print("Error checking for duplicates:", e)
+            return fingerprint
+        # Entries whose file has since been deleted don't count
+        if match and os.path.exists(match[2]):
+            _, title, existing_path, _ = match
+            if self.skip_duplicates:
+                raise DuplicateTrackError(title, existing_path)
+            self.duplicate_of = title
+        return fingerprint
+
+    def record_track(self, info, path, fingerprint=None, loudness=None):
+        """Add a finished file to the local library"""
+        duration = info.get('duration')
+        start, end = info.get('section_start'), info.get('section_end')
+        if start is not None or end is not None:
+            end = end if end is not None else duration
+            duration = end - (start or 0) if end is not None else None
+        try:
+            track_id = track_library.add_track(path, title=info.get('title'), source_url=info.get('webpage_url') or self.url,
+                                               duration=duration)
+            if fingerprint is not None:
+                track_library.store_fingerprint(track_id, fingerprint)
+            if loudness:
+                track_library.store_loudness(track_id, loudness)
+        except sqlite3.Error as e:
+            print("Error adding track to library:", e)
+
+    def report_title(self, info):
+        title = (info or {}).get('title')
+        if title and title != self.title:
+            self.title = title
+            self.title_signal.emit(title)
+
+    def fetch_streams(self, ydl_opts, entry, formats, base_path, span):
+        """Download the separate video and audio streams at the same time"""
+        self.report_title(entry)
+        stream_files = [f"{base_path}.f{fmt['format_id']}.{fmt['ext']}" for fmt in formats]
+        os.makedirs(os.path.dirname(base_path) or ".", exist_ok=True)
+        progress = {}  # format_id -> (downloaded, total, speed, eta)
+        lock = threading.Lock()
+        errors = []
+
+        def fetch(fmt, path):
+            bandwidth = bandwidth_scheduler.register(self.priority)
+            cpu_start = time.thread_time()
+
+            def stream_hook(info):
+                if info.get('status') != 'downloading':
+                    return
+                bandwidth_scheduler.throttle(bandwidth, info)
+                total = info.get('total_bytes') or info.get('total_bytes_estimate') or 0
+                with lock:
+                    progress[fmt['format_id']] = (
+                        info.get('downloaded_bytes', 0), total, info.get('speed') or 0, info.get('eta') or 0
+                    )
+                    downloaded = sum(p[0] for p in progress.values())
+                    total = sum(p[1] for p in progress.values())
+                    speed = sum(p[2] for p in progress.values())
+                    eta = max(p[3] for p in progress.values())
+                if total:
+                    percent = downloaded / total * 100
+                    self.progress_signal.emit(percent)
+                    self.status_signal.emit(f"Downloading video and audio... {percent:.1f}%")
+                    self.details_signal.emit(f"Speed: {speed / 1024:.1f} KB/s | ETA: {eta} sec")
+
+            try:
+                stream_info = dict(entry)
+                stream_info.pop('requested_formats', None)
+                stream_info.update(fmt)
+                if self.section:
+                    # Same cut for both streams so they stay in sync after muxing
+                    start, end = self.section
+                    duration = entry.get('duration')
+                    stream_info['section_start'] = start
+                    stream_info['section_end'] = end if end is not None and (not duration or end <= duration + 1) else None
+                with youtube_dl_pool.session(dict(ydl_opts, progress_hooks=[stream_hook], noprogress=True)) as stream_ydl:
+                    success, _ = self.with_retries(lambda: stream_ydl.dl(path, stream_info))
+                if not success:
+                    errors.append(f"Could not download format {fmt['format_id']}")
+            except Exception as e:
+                errors.append(str(e))
+            with lock:
+                span['cpu_seconds'] += time.thread_time() - cpu_start
+
+        threads = [threading.Thread(target=fetch, args=(fmt, path), daemon=True)
+                   for fmt, path in zip(formats, stream_files)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise RuntimeError(errors[0])
+        span['bytes'] = sum(os.path.getsize(path) for path in stream_files)
+        self.progress_signal.emit(100)
+        return stream_files
+
+    def mux_streams(self, stream_files, output_file):
+        """Combine the streams into one MP4 with a stream copy, no re-encoding"""
+        video_file, audio_file = stream_files
+        try:
+            run_ffmpeg([
+                "-i", video_file, "-i", audio_file,
+                "-map", "0:v:0", "-map", "1:a:0",
+                "-c", "copy", output_file,
+            ])
+        finally:
+            for path in stream_files:
+                if os.path.exists(path):
+                    os.remove(path)
+
+# --- Video Info Worker for async loading ---
+class VideoInfoWorker(QThread):
+    info_ready = pyqtSignal(str)
+    error_occurred = pyqtSignal()
+    
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self.trace = JobTrace("info", url)
+        
+    def run(self):
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([self.url])
+            key = url_key(self.url)
+            try:
+                meta = track_library.cached_metadata([key], METADATA_MAX_AGE).get(key)
+            except sqlite3.Error:
+                meta = None
+            if meta is None:
+                with youtube_dl_pool.session(METADATA_OPTIONS) as ydl:
+                    with self.trace.span("extract"):
+                        # A preview isn't worth waiting for a throttled host
+                        info = retry_policy.call(self.url, lambda: ydl.extract_info(self.url, download=False),
+                                                 wait=False, attempts=2)
+                meta = link_metadata(info)
+                try:
+                    track_library.store_metadata(key, meta)
+                except sqlite3.Error as e:
+                    print("Error caching link metadata:", e)
+            title = meta['title'] or 'Unknown Title'
+            duration = int(meta['duration'] or 0)
+            uploader = meta['uploader'] or 'Unknown'
+            view_count = meta['view_count'] or 0
             
-            # For audio files, determine the final converted file path
-            final_file = None
-            if not self.is_video and self.downloaded_file:
-                # Get the final audio file path by changing extension
-                base_path = os.path.splitext(self.downloaded_file)[0]
-                final_file = f"{base_path}.{self.format_type}"
+            # Format duration
+            if duration > 0:
+                hours = duration // 3600
+                minutes = (duration % 3600) // 60
+                seconds = duration % 60
+                if hours > 0:
+                    duration_str = f"{hours}h {minutes}m {seconds}s"
+                else:
+                    duration_str = f"{minutes}m {seconds}s"
+            else:
+                duration_str = "Unknown"
+            
+            # Format view count
+            if view_count >= 1000000:
+                views_str = f"{view_count / 1000000:.1f}M"
+            elif view_count >= 1000:
+                views_str = f"{view_count / 1000:.1f}K"
+            else:
+                views_str = str(view_count)
+            
+            # Better formatting for smaller screens
+            info_text = f"""<div style="line-height: 1.5; padding-left: 25px;">
+<div style="margin-bottom: 5px;"><b>📺 {title}</b></div>
+<div style="font-size: 11pt;">⏱️ {duration_str} • 👤 {uploader} • 👁️ {views_str} views</div>
+</div>"""
+            self.trace.finish("ok")
+            self.info_ready.emit(info_text.strip())
+        except Exception:
+            self.trace.finish("error")
+            self.error_occurred.emit()
+
+# --- Analysis Memory Budget ---
+ANALYSIS_SR = 22050
+ANALYSIS_CLIP = 60.0  # seconds that tempo and key are detected from
+SOURCE_SR = 48000  # assumed rate of the file being decoded, before resampling
+ANALYSIS_BASE_MEMORY = 96 * 1024 * 1024  # librosa/numba working memory that doesn't scale with the track
+ANALYSIS_BUDGET_SHARE = 0.25  # of physical memory when no analysisMemoryBudget is set
+ANALYSIS_DEFAULT_BUDGET = 2 * 1024 ** 3
+ANALYSIS_UNKNOWN_DURATION = 600.0
+MEMORY_SAMPLE_INTERVAL = 0.05
+
+if sys.platform == "win32":
+    class _ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong)] + [
+            (name, ctypes.c_size_t) for name in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+    class _MemoryStatus(ctypes.Structure):
+        _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong)] + [
+            (name, ctypes.c_ulonglong) for name in (
+                "ullTotalPhys", "ullAvailPhys", "ullTotalPageFile", "ullAvailPageFile",
+                "ullTotalVirtual", "ullAvailVirtual", "ullAvailExtendedVirtual")]
+
+def process_rss():
+    """Resident memory of this process in bytes, None where it can't be read"""
+    if sys.platform == "win32":
+        counters = _ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        kernel32 = ctypes.windll.kernel32
+        kernel32.GetCurrentProcess.restype = ctypes.c_void_p
+        get_info = ctypes.windll.psapi.GetProcessMemoryInfo
+        get_info.argtypes = [ctypes.c_void_p, ctypes.POINTER(_ProcessMemoryCounters), ctypes.c_ulong]
+        if get_info(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def physical_memory():
+    if sys.platform == "win32":
+        status = _MemoryStatus()
+        status.dwLength = ctypes.sizeof(status)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullTotalPhys
+        return None
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def estimate_analysis_memory(duration, stereo=False, full_decode=True, sr=ANALYSIS_SR):
+    """Peak bytes one analysis needs for a track of duration seconds.
+
+    Decoding holds the file's float32 samples at their own rate (twice while
+    chunks are joined) next to the resampled signal. Loudness adds a K-weighted
+    copy and one float64 power row. Tempo, key and fingerprint work on the
+    first ANALYSIS_CLIP seconds, where the STFTs (complex64) dominate.
+    """
+    duration = max(duration or 0.0, 1.0)
+    clip = min(duration, ANALYSIS_CLIP)
+    decoded = duration if full_decode else clip
+    channels = 2 if stereo else 1
+    signal_bytes = decoded * sr * channels * 4
+    decode = decoded * SOURCE_SR * 2 * 4 * 2 + signal_bytes
+    loudness = signal_bytes * 2 + decoded * sr * 8 if stereo else 0
+    # Three 2048-point STFTs alive at once at the analysis rate, plus the fingerprint STFT (hop 64)
+    frames = clip * sr / 512 + 1
+    spectral = frames * 1025 * 8 * 3 + (clip * FINGERPRINT_SR / FINGERPRINT_HOP + 1) * 1025 * 12
+    return int(max(decode, signal_bytes + loudness, clip * sr * 4 + spectral) + ANALYSIS_BASE_MEMORY)
+
+class AnalysisCancelled(Exception):
+    """The analysis job was cancelled before it finished"""
+
+class AnalysisScheduler:
+    """Admits analysis jobs while their estimated peak memory fits a process-wide RSS budget.
+
+    A job waits until the memory in use (the larger of the measured RSS and the
+    idle footprint plus every admitted job's estimate) leaves room for its own
+    estimate. A job that is larger than the whole budget still runs, alone.
+    While jobs run, RSS is sampled to report each job's actual peak.
+    """
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.budget = ANALYSIS_DEFAULT_BUDGET
+        self.reserved = 0
+        self.baseline = 0
+        self.active = {}  # ticket -> {'estimate', 'start_rss', 'peak_rss'}
+        self.waiting = deque()
+        self.tickets = itertools.count(1)
+        self.sampler = None
+        self.configure(0)
+
+    def configure(self, budget_mb):
+        """Budget in MB, 0 picks a share of physical memory"""
+        total = physical_memory()
+        with self.cond:
+            if budget_mb > 0:
+                self.budget = budget_mb * 1024 * 1024
+            else:
+                self.budget = int(total * ANALYSIS_BUDGET_SHARE) if total else ANALYSIS_DEFAULT_BUDGET
+            self.cond.notify_all()
+
+    def in_use(self):
+        rss = process_rss() or 0
+        if not self.active:
+            self.baseline = rss
+        return max(rss, self.baseline + self.reserved)
+
+    def acquire(self, estimate, on_wait=None, cancelled=None):
+        """Block until the job fits, returns a ticket for release.
+
+        Raises AnalysisCancelled once cancelled() returns True while waiting,
+        call wake() after setting the job's cancel flag.
+        """
+        with self.cond:
+            ticket = next(self.tickets)
+            self.waiting.append(ticket)
+            waited = False
+            try:
+                # First come, first served, so small jobs can't keep a large one waiting forever
+                while self.waiting[0] != ticket or (self.active and self.in_use() + estimate > self.budget):
+                    if cancelled and cancelled():
+                        raise AnalysisCancelled()
+                    if not waited and on_wait:
+                        on_wait()
+                    waited = True
+                    # Woken by releases, RSS is checked again every second
+                    self.cond.wait(1.0)
+            finally:
+                # Admitted or given up, either way the next job in line may go
+                self.waiting.remove(ticket)
+                self.cond.notify_all()
+            self.in_use()
+            rss = process_rss() or 0
+            self.active[ticket] = {'estimate': estimate, 'start_rss': rss, 'peak_rss': rss}
+            self.reserved += estimate
+            if self.sampler is None:
+                self.sampler = threading.Thread(target=self.sample, daemon=True)
+                self.sampler.start()
+            return ticket
+
+    def wake(self):
+        """Let waiting jobs check their cancel flag"""
+        with self.cond:
+            self.cond.notify_all()
+
+    def release(self, ticket, trace=None):
+        """Free the job's reservation, returns its sampled peak memory above its start RSS"""
+        with self.cond:
+            job = self.active.pop(ticket, None)
+            if job is None:
+                return None
+            self.reserved -= job['estimate']
+            self.cond.notify_all()
+        peak = max(job['peak_rss'], process_rss() or 0) - job['start_rss']
+        if trace is not None:
+            trace.memory = {'estimate': job['estimate'], 'peak': peak}
+            metrics.observe_memory(trace.job_type, peak, job['estimate'])
+        return peak
+
+    def sample(self):
+        while True:
+            rss = process_rss()
+            with self.cond:
+                if not self.active or rss is None:
+                    self.sampler = None
+                    return
+                for job in self.active.values():
+                    job['peak_rss'] = max(job['peak_rss'], rss)
+            time.sleep(MEMORY_SAMPLE_INTERVAL)
+
+analysis_scheduler = AnalysisScheduler()
+
+# --- Adaptive Concurrency ---
+CONCURRENCY_INTERVAL_MS = 3000
+MAX_DOWNLOADS = 6  # upper bound for queued downloads when no maxDownloads is set
+CPU_HIGH = 0.90  # system CPU load above which transcodes back off and downloads stop growing
+CPU_LOW = 0.70  # transcodes only grow below this load
+THROUGHPUT_GAIN = 0.10  # an added download slot has to raise throughput by this much to stay
+PROBE_INTERVALS = 2  # intervals measured after a download slot was added
+PROBE_COOLDOWN = 5  # intervals before probing again after a slot was taken back
+THROTTLE_PATTERN = re.compile(r"HTTP Error (429|503)|Too Many Requests|rate.?limit", re.IGNORECASE)
+HTTP_ERROR_PATTERN = re.compile(r"HTTP Error \d{3}|Connection reset|timed? ?out|Temporary failure", re.IGNORECASE)
+
+def system_cpu_times():
+    """(busy, total) CPU time counters of the whole system, None where they can't be read"""
+    if sys.platform == "win32":
+        idle, kernel, user = ctypes.c_ulonglong(), ctypes.c_ulonglong(), ctypes.c_ulonglong()
+        if ctypes.windll.kernel32.GetSystemTimes(ctypes.byref(idle), ctypes.byref(kernel), ctypes.byref(user)):
+            # Kernel time includes the idle time
+            return kernel.value + user.value - idle.value, kernel.value + user.value
+        return None
+    try:
+        with open("/proc/stat") as f:
+            values = [int(value) for value in f.readline().split()[1:9]]
+    except (OSError, ValueError):
+        return None
+    if len(values) < 5:
+        return None
+    return sum(values) - values[3] - values[4], sum(values)
+
+class AdaptiveLimit:
+    """Concurrency limit of one stage, jobs hold a slot while they run in it"""
+    def __init__(self, name, limit, maximum):
+        self.name = name
+        self.cond = threading.Condition()
+        self.maximum = maximum
+        self.limit = min(limit, maximum)
+        self.active = 0
+        self.waiting = 0  # jobs blocked in acquire
+        self.backlog = 0  # jobs queued elsewhere that would start if there were a slot
+
+    def acquire(self, on_wait=None):
+        with self.cond:
+            self.waiting += 1
+            try:
+                while self.active >= self.limit:
+                    if on_wait:
+                        on_wait()
+                        on_wait = None
+                    self.cond.wait()
+            finally:
+                self.waiting -= 1
+            self.active += 1
+
+    def try_acquire(self):
+        with self.cond:
+            if self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self.cond:
+            self.active = max(0, self.active - 1)
+            self.cond.notify_all()
+
+    @contextmanager
+    def slot(self, on_wait=None):
+        self.acquire(on_wait)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def set_limit(self, limit, maximum=None):
+        with self.cond:
+            if maximum is not None:
+                self.maximum = max(1, maximum)
+            self.limit = max(1, min(self.maximum, limit))
+            self.cond.notify_all()
+
+    def saturated(self):
+        """Every slot is taken and more jobs are waiting for one"""
+        return self.active >= self.limit and self.waiting + self.backlog > 0
+
+class ConcurrencyController:
+    """AIMD limits for concurrent downloads and transcodes, updated every CONCURRENCY_INTERVAL_MS.
+
+    Downloads gain one slot at a time while jobs wait for one, nothing failed and
+    the CPU has room. The new slot is measured for PROBE_INTERVALS and taken back
+    unless aggregate throughput rose by THROUGHPUT_GAIN. Throttled requests halve
+    the limit, other HTTP errors take a quarter off. Transcodes grow while the
+    system CPU load is below CPU_LOW and lose a quarter above CPU_HIGH.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cores = os.cpu_count() or 2
+        self.downloads = AdaptiveLimit("download", 2, MAX_DOWNLOADS)
+        self.transcodes = AdaptiveLimit("transcode", max(1, self.cores // 2), self.cores)
+        self.throttles = 0
+        self.errors = 0
+        self.throughput = 0.0
+        self.cpu_load = None
+        self.probe = None  # {'limit', 'before', 'samples'} while an added download slot is measured
+        self.cooldown = 0
+        self.decisions = deque(maxlen=50)
+        self.restart()
+
+    def configure(self, max_downloads=0, max_transcodes=0):
+        """Upper bounds, 0 = MAX_DOWNLOADS downloads and one transcode per core"""
+        self.downloads.set_limit(self.downloads.limit, max_downloads or MAX_DOWNLOADS)
+        self.transcodes.set_limit(self.transcodes.limit, max_transcodes or self.cores)
+
+    def restart(self):
+        """Start a new measuring interval, so time spent idle doesn't count"""
+        with self.lock:
+            self.last_time = time.monotonic()
+            self.last_bytes = bandwidth_scheduler.total_bytes
+            self.last_cpu = self.cpu_times()
+            self.probe = None
+
+    def cpu_times(self):
+        times = system_cpu_times()
+        if times is None:
+            # This process and its ffmpeg children only
+            own = os.times()
+            times = (own.user + own.system + own.children_user + own.children_system,
+                     time.monotonic() * self.cores)
+        return times
+
+    def report(self, error):
+        """Count the error message of a failed job"""
+        with self.lock:
+            if THROTTLE_PATTERN.search(error):
+                self.throttles += 1
+            elif HTTP_ERROR_PATTERN.search(error):
+                self.errors += 1
+            # Anything else (private video, bad link, ...) says nothing about the load
+
+    def update(self):
+        """Measure the last interval and adjust both limits"""
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.last_time
+            if elapsed <= 0:
+                return
+            total_bytes = bandwidth_scheduler.total_bytes
+            cpu = self.cpu_times()
+            self.throughput = (total_bytes - self.last_bytes) / elapsed
+            busy, total = cpu[0] - self.last_cpu[0], cpu[1] - self.last_cpu[1]
+            self.cpu_load = min(1.0, busy / total) if total > 0 else None
+            self.last_time, self.last_bytes, self.last_cpu = now, total_bytes, cpu
+            throttles, errors = self.throttles, self.errors
+            self.throttles = self.errors = 0
+            self.adjust_downloads(throttles, errors)
+            self.adjust_transcodes()
+        for limit in (self.downloads, self.transcodes):
+            metrics.observe_concurrency(limit.name, limit.limit, limit.active, limit.waiting + limit.backlog)
+
+    def adjust_downloads(self, throttles, errors):
+        downloads = self.downloads
+        limit = downloads.limit
+        cpu_busy = self.cpu_load is not None and self.cpu_load > CPU_HIGH
+        if throttles:
+            self.probe = None
+            self.cooldown = PROBE_COOLDOWN
+            self.decide(downloads, limit // 2, f"{throttles} throttled")
+        elif errors:
+            self.probe = None
+            self.cooldown = PROBE_COOLDOWN
+            self.decide(downloads, min(limit - 1, limit * 3 // 4), f"{errors} HTTP error{'s' if errors != 1 else ''}")
+        elif self.probe:
+            if downloads.active < downloads.limit:
+                # The backlog ran out, the new slot can't be judged
+                self.probe = None
+                return
+            self.probe['samples'].append(self.throughput)
+            if len(self.probe['samples']) < PROBE_INTERVALS:
+                return
+            probe, self.probe = self.probe, None
+            after = sum(probe['samples']) / len(probe['samples'])
+            if after < probe['before'] * (1 + THROUGHPUT_GAIN):
+                self.cooldown = PROBE_COOLDOWN
+                self.decide(downloads, probe['limit'],
+                            f"no gain ({probe['before'] / 1e6:.2f} -> {after / 1e6:.2f} MB/s)")
+        elif self.cooldown:
+            self.cooldown -= 1
+        elif downloads.saturated() and not cpu_busy and limit < downloads.maximum:
+            self.probe = {'limit': limit, 'before': self.throughput, 'samples': []}
+            self.decide(downloads, limit + 1, "backlog")
+
+    def adjust_transcodes(self):
+        transcodes = self.transcodes
+        if self.cpu_load is None:
+            return
+        if self.cpu_load > CPU_HIGH and transcodes.active > 1:
+            self.decide(transcodes, min(transcodes.limit - 1, transcodes.limit * 3 // 4), f"CPU {self.cpu_load:.0%}")
+        elif transcodes.saturated() and self.cpu_load < CPU_LOW:
+            self.decide(transcodes, transcodes.limit + 1, f"backlog, CPU {self.cpu_load:.0%}")
+
+    def decide(self, limit, value, reason):
+        old = limit.limit
+        limit.set_limit(value)
+        if limit.limit != old:
+            self.decisions.appendleft({
+                'time': time.time(), 'stage': limit.name, 'old': old, 'new': limit.limit, 'reason': reason,
+                'throughput': self.throughput, 'cpu': self.cpu_load,
+            })
+            metrics.observe_concurrency_change(limit.name, limit.limit > old)
+
+    def describe(self):
+        """One line for the diagnostics panel"""
+        cpu = f"{self.cpu_load:.0%}" if self.cpu_load is not None else "n/a"
+        return (f"Concurrency: downloads {self.downloads.active}/{self.downloads.limit} "
+                f"(max {self.downloads.maximum}), transcodes {self.transcodes.active}/{self.transcodes.limit} "
+                f"(max {self.transcodes.maximum}) • {self.throughput / 1e6:.2f} MB/s • CPU {cpu}")
+
+    def summary_text(self):
+        with self.lock:
+            decisions = list(self.decisions)[:20]
+        lines = ["Concurrency decisions"]
+        for decision in decisions:
+            stamp = time.strftime("%H:%M:%S", time.localtime(decision['time']))
+            cpu = f"{decision['cpu']:.0%}" if decision['cpu'] is not None else "n/a"
+            lines.append(
+                f"{stamp} {decision['stage']:<10}{decision['old']:>3} -> {decision['new']:<3} {decision['reason']}"
+                f"  ({decision['throughput'] / 1e6:.2f} MB/s, CPU {cpu})"
+            )
+        if not decisions:
+            lines.append("    none yet")
+        return "\n".join(lines)
+
+adaptive_concurrency = ConcurrencyController()
+
+# --- Retry Policy ---
+RETRY_ATTEMPTS = 4
+RETRY_BASE_DELAY = 2.0  # seconds, doubled with every failure in a row on the same host
+RETRY_MAX_DELAY = 60.0
+BREAKER_THRESHOLD = 3  # throttled requests in a row that open a host's circuit breaker
+BREAKER_COOLDOWN = 30.0  # seconds the breaker stays open, doubled every time it trips again
+BREAKER_MAX_COOLDOWN = 600.0
+TRANSIENT_PATTERN = re.compile(
+    r"HTTP Error 5\d\d|timed? ?out|Connection (reset|refused|aborted)|Temporary failure|Remote end closed|"
+    r"IncompleteRead|EOF occurred", re.IGNORECASE)
+# Hostnames that belong to one site and share its breaker, everything else is keyed on its own hostname
+HOST_ALIASES = {
+    "youtu.be": "youtube.com", "m.youtube.com": "youtube.com", "music.youtube.com": "youtube.com",
+    "m.soundcloud.com": "soundcloud.com", "on.soundcloud.com": "soundcloud.com",
+}
+
+def host_of(url):
+    """Breaker key for a URL: its hostname without www., with HOST_ALIASES merged (youtu.be is youtube.com)"""
+    host = (urllib.parse.urlsplit(url).hostname or "").lower().rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    return HOST_ALIASES.get(host, host)
+
+def classify_error(message):
+    """'throttled' or 'transient' for failures worth retrying, None for everything else"""
+    if THROTTLE_PATTERN.search(message):
+        return "throttled"
+    if TRANSIENT_PATTERN.search(message):
+        return "transient"
+    return None
+
+class HostThrottledError(Exception):
+    """A host's circuit breaker is open and the caller chose not to wait"""
+    def __init__(self, host, seconds):
+        super().__init__(f"{host} is throttling requests, try again in {seconds:.0f} s")
+        self.host = host
+        self.seconds = seconds
+
+class RetryPolicy:
+    """Retries throttled and transient failures with per-host exponential backoff and jitter.
+
+    The delay grows with the failures in a row on the host, not just the
+    caller's own attempts, so workers sharing a host back off together. After
+    BREAKER_THRESHOLD throttled requests in a row the host's circuit breaker
+    opens and every job for it waits instead of sending more requests. Once the
+    cooldown is over a single request goes through as a probe: any answer
+    closes the breaker, another failure reopens it for twice as long.
+    """
+    def __init__(self, attempts=RETRY_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY,
+                 threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN, max_cooldown=BREAKER_MAX_COOLDOWN):
+        self.cond = threading.Condition()
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.hosts = {}  # host -> {'failures', 'throttles', 'open', 'open_until', 'trips', 'probing'}
+
+    def state(self, host):
+        return self.hosts.setdefault(host, {'failures': 0, 'throttles': 0, 'open': False, 'open_until': 0.0,
+                                            'trips': 0, 'probing': False})
+
+    def open_for(self, url):
+        """Seconds until requests to the URL's host go through again, 0 if they do now"""
+        with self.cond:
+            state = self.hosts.get(host_of(url))
+            if state is None or not state['open']:
+                return 0.0
+            remaining = state['open_until'] - time.monotonic()
+            # While the probe is out, the answer decides
+            return remaining if remaining > 0 else 1.0 if state['probing'] else 0.0
+
+    def enter(self, host, on_wait=None, wait=True):
+        """Block while the host's breaker is open, the first request after the cooldown becomes the probe"""
+        with self.cond:
+            state = self.state(host)
+            waited = False
+            while state['open']:
+                remaining = state['open_until'] - time.monotonic()
+                if remaining <= 0 and not state['probing']:
+                    state['probing'] = True
+                    return
+                if not wait:
+                    raise HostThrottledError(host, max(remaining, 1.0))
+                if on_wait and not waited:
+                    on_wait(host, max(remaining, 0.0))
+                waited = True
+                self.cond.wait(min(max(remaining, 0.1), 1.0))
+
+    def succeeded(self, host):
+        with self.cond:
+            state = self.state(host)
+            state.update(failures=0, throttles=0)
+            if state['open']:
+                state.update(open=False, trips=0, probing=False)
+                self.cond.notify_all()
+
+    def failed(self, host, kind):
+        """Count a retryable failure, returns the host's failures in a row"""
+        with self.cond:
+            state = self.state(host)
+            state['failures'] += 1
+            if kind == "throttled":
+                state['throttles'] += 1
+            if state['probing'] or (not state['open'] and state['throttles'] >= self.threshold):
+                cooldown = min(self.max_cooldown, self.cooldown * 2 ** state['trips'])
+                state.update(open=True, probing=False, open_until=time.monotonic() + cooldown, throttles=0)
+                state['trips'] += 1
+                print(f"Circuit breaker for {host} open for {cooldown:.0f} s")
+                self.cond.notify_all()
+            return state['failures']
+
+    def describe(self):
+        """One line for the diagnostics panel"""
+        now = time.monotonic()
+        with self.cond:
+            hosts = [f"{host} probing" if state['probing'] else f"{host} paused {state['open_until'] - now:.0f} s"
+                     for host, state in sorted(self.hosts.items()) if state['open']]
+            failing = [f"{host} {state['failures']} failed" for host, state in sorted(self.hosts.items())
+                       if state['failures'] and not state['open']]
+        return "Hosts: " + (", ".join(hosts + failing) or "no throttling")
+
+    def backoff(self, failures):
+        delay = min(self.max_delay, self.base_delay * 2 ** (failures - 1))
+        # Jitter spreads out workers that failed together, half the delay is always kept
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def call(self, url, request, on_retry=None, on_wait=None, wait=True, attempts=None):
+        """Run request(), retrying throttled and transient failures, returns its result or raises the last error.
+
+        on_retry(attempt, delay, error) is called before each backoff sleep, on_wait(host, seconds)
+        when the host's breaker holds the request back. wait=False raises HostThrottledError instead.
+        """
+        host = host_of(url)
+        attempts = attempts or self.attempts
+        for attempt in range(1, attempts + 1):
+            self.enter(host, on_wait, wait)
+            try:
+                result = request()
+            except Exception as e:
+                adaptive_concurrency.report(str(e))
+                kind = classify_error(str(e))
+                if kind is None:
+                    # The host answered, only this request is bad
+                    self.succeeded(host)
+                    raise
+                failures = self.failed(host, kind)
+                if attempt == attempts:
+                    raise
+                delay = self.backoff(failures)
+                if on_retry:
+                    on_retry(attempt, delay, e)
+                if not self.open_for(url):
+                    time.sleep(delay)
             else:
-                # For video files, use the original downloaded file
-                final_file = self.downloaded_file
-            
-            if final_file and os.path.exists(final_file):
-                os.utime(final_file, (time.time(), time.time()))
-                self.file_downloaded_signal.emit(final_file)
-            
-            self.status_signal.emit("Download completed!")
-            self.finished_signal.emit()
-        except Exception as e:
-            self.error_signal.emit(str(e))
+                self.succeeded(host)
+                return result
 
-# --- Video Info Worker for async loading ---
-class VideoInfoWorker(QThread):
-    info_ready = pyqtSignal(str)
-    error_occurred = pyqtSignal()
-    
-    def __init__(self, url):
-        super().__init__()
-        self.url = url
-        
-    def run(self):
+retry_policy = RetryPolicy()
+
+# --- Pipeline Stages ---
+TRANSCODE_QUEUE_PER_CORE = 2  # downloaded files waiting for conversion, per core
+ANALYSIS_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+ANALYSIS_QUEUE_SIZE = 8
+
+class PipelineStage:
+    """Worker threads for one stage of the download pipeline, fed through a bounded queue.
+
+    submit blocks while the queue is full, so a stage that falls behind holds up
+    the stage feeding it instead of piling up files. A task only runs while it
+    holds a slot of the stage's AdaptiveLimit, which decides how many run at once.
+    """
+    def __init__(self, limit, capacity):
+        self.limit = limit
+        self.tasks = queue.Queue(capacity)
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def submit(self, task, on_wait=None):
+        """Queue task(), returns a Future of its result"""
+        future = Future()
+        if self.tasks.full() and on_wait:
+            on_wait()
+        self.tasks.put((task, future))
+        self.limit.backlog = self.tasks.qsize()
+        with self.lock:
+            # Threads are started on demand, up to the most the limit can allow
+            if len(self.threads) < self.limit.maximum:
+                thread = threading.Thread(target=self.work, daemon=True, name=f"waver-{self.limit.name}")
+                self.threads.append(thread)
+                thread.start()
+        return future
+
+    def work(self):
+        while True:
+            task, future = self.tasks.get()
+            self.limit.backlog = self.tasks.qsize()
+            with self.limit.slot():
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(task())
+                except BaseException as e:
+                    future.set_exception(e)
+
+    def describe(self):
+        return f"{self.limit.name} {self.limit.active}/{self.limit.limit} running, {self.tasks.qsize()} queued"
+
+# Downloads hand raw files to the transcode stage, which hands converted files to analysis
+transcode_stage = PipelineStage(adaptive_concurrency.transcodes, TRANSCODE_QUEUE_PER_CORE * adaptive_concurrency.cores)
+analysis_stage = PipelineStage(AdaptiveLimit("analysis", ANALYSIS_WORKERS, ANALYSIS_WORKERS), ANALYSIS_QUEUE_SIZE)
+
+# --- Bulk Metadata Resolver ---
+METADATA_WORKERS = 8  # extractions in flight, each mostly waits on the network
+METADATA_MAX_AGE = 7 * 24 * 3600  # seconds a cached title, duration and size stay valid
+# Playlists are listed without extracting every entry, YouTube still reports entry durations
+METADATA_OPTIONS = {'quiet': True, 'skip_download': True, 'extract_flat': 'in_playlist'}
+WAV_BYTES_PER_SECOND = 48000 * 2 * 2  # 16-bit stereo at the 48 kHz of YouTube's audio streams
+
+def link_metadata(info):
+    """Title, duration, uploader, views and stream sizes from a yt-dlp info dict, as cached per link"""
+    meta = {"title": info.get('title'), "duration": info.get('duration'),
+            "uploader": info.get('uploader') or info.get('channel'), "view_count": info.get('view_count'),
+            "entries": None, "audio_size": None, "video_sizes": {}}
+    if info.get('entries') is not None:
+        entries = [entry for entry in info['entries'] if entry]
+        durations = [entry.get('duration') for entry in entries]
+        meta.update(entries=len(entries), duration=sum(durations) if durations and all(durations) else None)
+        return meta
+    for fmt in info.get('formats') or [info]:
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if not size:
+            continue
+        if fmt.get('vcodec') == 'none':
+            meta["audio_size"] = max(meta["audio_size"] or 0, size)
+        elif fmt.get('height'):
+            meta["video_sizes"][fmt['height']] = max(meta["video_sizes"].get(fmt['height'], 0), size)
+    return meta
+
+def section_length(duration, section=None):
+    """Seconds of a track of the given duration that a download of section covers"""
+    if not section or not duration:
+        return duration or 0.0
+    start, end = section
+    return max(0.0, min(duration, end if end is not None else duration) - start)
+
+def estimate_size(meta, format_type, quality, section=None):
+    """Bytes the download will take in the given format, None when unknown"""
+    duration = meta.get("duration")
+    if not duration:
+        return None
+    length = section_length(duration, section)
+    if format_type == "mp3":
+        match = re.match(r"\d+", quality or "")
+        return length * int(match.group(0) if match else 320) * 1000 / 8
+    if format_type == "wav":
+        return length * WAV_BYTES_PER_SECOND
+    match = re.match(r"\d+", quality or "")
+    heights = [height for height in meta.get("video_sizes", {}) if not match or height <= int(match.group(0))]
+    if not heights:
+        return None
+    return (meta["video_sizes"][max(heights)] + (meta.get("audio_size") or 0)) * length / duration
+
+def format_size(size):
+    return f"{size / 1e9:.1f} GB" if size >= 1e9 else f"{size / 1e6:.0f} MB"
+
+class MetadataResolver(QObject):
+    """Looks up titles, durations and sizes of many links at once, ahead of their downloads.
+
+    Links fetched in the last METADATA_MAX_AGE are answered from the library's
+    metadata cache in one query. The rest are extracted METADATA_WORKERS at a
+    time on their own pipeline stage and written back to the cache; each result
+    is emitted as soon as it arrives, so a long list fills in row by row.
+    """
+    resolved = pyqtSignal(str, object)  # url_key, metadata dict
+    failed = pyqtSignal(str, str)  # url_key, error
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.stage = PipelineStage(AdaptiveLimit("metadata", METADATA_WORKERS, METADATA_WORKERS), 0)
+        self.futures = {}  # url_key -> Future of links being extracted
+        self.resolved.connect(lambda key, meta: self.futures.pop(key, None))
+        self.failed.connect(lambda key, error: self.futures.pop(key, None))
+
+    def resolve(self, links):
+        """Resolve [(url_key, url)], cached links are emitted before this returns"""
+        links = [(key, url) for key, url in links if key not in self.futures]
         try:
-            opts = {'quiet': True, 'skip_download': True}
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(self.url, download=False)
-                title = info.get('title', 'Unknown Title')
-                duration = info.get('duration', 0)
-                uploader = info.get('uploader', 'Unknown')
-                view_count = info.get('view_count', 0)
-                
-                # Format duration
-                if duration > 0:
-                    hours = duration // 3600
-                    minutes = (duration % 3600) // 60
-                    seconds = duration % 60
-                    if hours > 0:
-                        duration_str = f"{hours}h {minutes}m {seconds}s"
-                    else:
-                        duration_str = f"{minutes}m {seconds}s"
-                else:
-                    duration_str = "Unknown"
-                
-                # Format view count
-                if view_count >= 1000000:
-                    views_str = f"{view_count / 1000000:.1f}M"
-                elif view_count >= 1000:
-                    views_str = f"{view_count / 1000:.1f}K"
-                else:
-                    views_str = str(view_count)
-                
-                # Better formatting for smaller screens
-                info_text = f"""<div style="line-height: 1.5; padding-left: 25px;">
-<div style="margin-bottom: 5px;"><b>📺 {title}</b></div>
-<div style="font-size: 11pt;">⏱️ {duration_str} • 👤 {uploader} • 👁️ {views_str} views</div>
-</div>"""
-                self.info_ready.emit(info_text.strip())
-        except Exception:
-            self.error_occurred.emit()
+            cached = track_library.cached_metadata({key for key, _ in links}, METADATA_MAX_AGE)
+        except sqlite3.Error as e:
+            print("Error reading link metadata:", e)
+            cached = {}
+        for key, url in links:
+            if key in cached:
+                self.resolved.emit(key, cached[key])
+            elif key not in self.futures:
+                self.futures[key] = self.stage.submit(lambda key=key, url=url: self.fetch(key, url))
 
-# --- Audio Analysis Worker ---
-class AudioAnalysisWorker(QThread):
-    analysis_complete = pyqtSignal(float, str)  # BPM, Key
-    analysis_error = pyqtSignal(str)
-    analysis_progress = pyqtSignal(str)
-    
-    def __init__(self, audio_file_path):
-        super().__init__()
+    def fetch(self, key, url):
+        """Runs on the stage's threads"""
+        trace = JobTrace("info", url)
+        try:
+            with youtube_dl_pool.session(METADATA_OPTIONS) as ydl:
+                with trace.span("extract"):
+                    info = retry_policy.call(url, lambda: ydl.extract_info(url, download=False), attempts=2)
+            meta = link_metadata(info)
+        except Exception as e:
+            trace.finish("error")
+            self.failed.emit(key, str(e))
+            return
+        trace.finish("ok")
+        try:
+            track_library.store_metadata(key, meta)
+        except sqlite3.Error as e:
+            print("Error caching link metadata:", e)
+        self.resolved.emit(key, meta)
+
+    def pending(self):
+        return len(self.futures)
+
+    def cancel(self):
+        """Drop links that haven't started extracting, running extractions still finish"""
+        for future in self.futures.values():
+            future.cancel()
+        self.futures = {key: future for key, future in self.futures.items() if not future.cancelled()}
+
+# --- Audio Analysis ---
+class AudioAnalysis:
+    """Tempo, key, loudness, peaks and fingerprint of one audio file, saved to the library and its tags.
+
+    Plain class so it runs on any thread: AudioAnalysisWorker wraps it for the
+    Analyze button, analysis_stage runs it after downloads. Progress, cached
+    peaks and duplicates are reported through the optional callbacks.
+    """
+    def __init__(self, audio_file_path, on_progress=None, on_peaks=None, on_duplicate=None):
         self.audio_file_path = audio_file_path
+        self.on_progress = on_progress or (lambda message: None)
+        self.on_peaks = on_peaks or (lambda path: None)
+        self.on_duplicate = on_duplicate or (lambda title: None)
+        self.ticket = None  # memory reservation with analysis_scheduler while running
+        self.cancelled = False
+        self.trace = JobTrace("analysis", os.path.basename(audio_file_path))
+
+    def cancel(self):
+        """Stop at the next step, a job still waiting for memory gives up its place in line"""
+        self.cancelled = True
+        analysis_scheduler.wake()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise AnalysisCancelled()
         
+    def track_duration(self):
+        """Seconds from the library or the file header, ANALYSIS_UNKNOWN_DURATION when neither knows"""
+        try:
+            duration = track_library.duration_of(self.audio_file_path)
+        except sqlite3.Error:
+            duration = None
+        if not duration:
+            try:
+                duration = librosa.get_duration(path=self.audio_file_path)
+            except Exception:
+                duration = None
+        return duration or ANALYSIS_UNKNOWN_DURATION
+
     def run(self):
+        """Analyze the file, returns (bpm, key). Raises AnalysisCancelled or the error that stopped it"""
         try:
-            self.analysis_progress.emit("Loading audio file...")
+            self.on_progress("Loading audio file...")
             
-            # Load audio file (first 60 seconds for analysis)
-            y, sr = librosa.load(self.audio_file_path, duration=60.0, sr=22050)
+            # Load audio file (first 60 seconds for analysis). Without cached waveform
+            # peaks the whole file is decoded once and the pyramid built from it.
+            pyramid = PeakPyramid.load(self.audio_file_path)
+            build_peaks = pyramid is None
+            # Files that weren't measured while converting get their loudness from this decode
+            try:
+                measure_loudness_here = not track_library.has_loudness(self.audio_file_path)
+            except sqlite3.Error:
+                measure_loudness_here = False
+            # Start once the estimated peak memory of this job fits the analysis budget
+            estimate = estimate_analysis_memory(pyramid.duration if pyramid else self.track_duration(),
+                                                stereo=measure_loudness_here, full_decode=build_peaks)
+            self.ticket = analysis_scheduler.acquire(
+                estimate, on_wait=lambda: self.on_progress("Waiting for memory..."),
+                cancelled=lambda: self.cancelled)
+            self.on_progress("Loading audio file...")
+            loudness = None
+            with self.trace.span("load") as span:
+                y, sr = librosa.load(self.audio_file_path, duration=None if build_peaks else ANALYSIS_CLIP,
+                                     sr=ANALYSIS_SR, mono=not measure_loudness_here)
+                span['bytes'] = y.nbytes
+            if measure_loudness_here:
+                with self.trace.span("loudness") as span:
+                    loudness = measure_loudness(y, sr)
+                    span['bytes'] = y.nbytes
+                y = librosa.to_mono(y)
+            full_duration = pyramid.duration if pyramid else len(y) / sr
+            if build_peaks and len(y):
+                try:
+                    with self.trace.span("peaks") as span:
+                        save_peak_pyramid(self.audio_file_path, y, sr)
+                        span['bytes'] = y.nbytes
+                    self.on_peaks(self.audio_file_path)
+                except OSError as e:
+                    print("Error saving waveform peaks:", e)
+                # A copy, so the rest of the decoded file can be freed
+                y = y[:int(ANALYSIS_CLIP * sr)].copy()
             
             if len(y) == 0:
-                self.analysis_error.emit("Could not load audio data")
-                return
+                raise ValueError("Could not load audio data")
                 
-            self.analysis_progress.emit("Analyzing tempo...")
+            self.check_cancelled()
+            self.on_progress("Analyzing tempo...")
+            self.trace.begin("tempo")
             
             # BPM Detection using multiple methods for accuracy
             # Method 1: Beat tracking with dynamic programming
@@ -412,8 +3819,9 @@ class AudioAnalysisWorker(QThread):
             
             # Method 2: Tempogram-based analysis for verification
             onset_frames = librosa.onset.onset_detect(y=y, sr=sr, hop_length=512)
+            onset_env = librosa.onset.onset_strength(y=y, sr=sr)
             tempo_tempogram = librosa.feature.tempo(
-                onset_envelope=librosa.onset.onset_strength(y=y, sr=sr),
+                onset_envelope=onset_env,
                 sr=sr,
                 hop_length=512,
                 aggregate=np.median
@@ -428,8 +3836,13 @@ class AudioAnalysisWorker(QThread):
             
             # Round to reasonable BPM values
             final_bpm = round(final_bpm, 1)
+            beat_times = librosa.frames_to_time(beats, sr=sr, hop_length=512)
+            beat_grid = fit_beat_grid(beat_times, onset_env[np.minimum(beats, len(onset_env) - 1)])
             
-            self.analysis_progress.emit("Analyzing key signature...")
+            self.trace.end("tempo", y.nbytes)
+            self.check_cancelled()
+            self.on_progress("Analyzing key signature...")
+            self.trace.begin("key")
             
             # Key Detection using chromagram analysis
             # Compute chromagram (pitch class profile)
@@ -474,10 +3887,484 @@ class AudioAnalysisWorker(QThread):
             if best_correlation < 0.6:
                 best_key = "Unknown"
             
-            self.analysis_complete.emit(final_bpm, best_key)
+            self.trace.end("key", y.nbytes)
+            self.check_cancelled()
+            try:
+                track_id = track_library.update_analysis(self.audio_file_path, final_bpm, best_key)
+                feature_index.add(track_id, track_feature_vector(
+                    chroma_mean, final_bpm, onset_env, len(onset_frames), len(y) / sr))
+                if loudness and loudness[0] is not None:
+                    track_library.store_loudness(track_id, loudness)
+                if beat_grid:
+                    grid_bpm, first_downbeat = beat_grid
+                    track_library.store_beatgrid(track_id, grid_bpm, first_downbeat, beat_times)
+                    write_beat_grid_sidecar(self.audio_file_path,
+                                            beat_grid_dict(grid_bpm, first_downbeat, beat_times, full_duration))
+                if not track_library.has_fingerprint(track_id):
+                    with self.trace.span("fingerprint") as span:
+                        fingerprint = audio_fingerprint(y, sr)
+                        span['bytes'] = y.nbytes
+                        match = track_library.find_duplicate(fingerprint, exclude_id=track_id)
+                        track_library.store_fingerprint(track_id, fingerprint)
+                    if match:
+                        self.on_duplicate(match[1])
+            except (sqlite3.Error, OSError) as e:
+                print("Error saving analysis to library:", e)
+            try:
+                with self.trace.span("tag") as span:
+                    span['bytes'] = write_analysis_tags(self.audio_file_path, final_bpm, best_key)
+            except (OSError, ValueError) as e:
+                print("Error writing tags:", e)
+            self.trace.finish("ok")
+            return final_bpm, best_key
             
+        except AnalysisCancelled:
+            self.trace.finish("cancelled")
+            raise
+        except Exception:
+            self.trace.finish("error")
+            raise
+        finally:
+            if self.ticket is not None:
+                analysis_scheduler.release(self.ticket, self.trace)
+                self.ticket = None
+
+def analyze_downloaded_file(path):
+    """analysis_stage task, nobody waits on the result so failures are only logged"""
+    try:
+        return AudioAnalysis(path).run()
+    except Exception as e:
+        print(f"Error analyzing {os.path.basename(path)}:", str(e) or type(e).__name__)
+
+# --- Audio Analysis Worker ---
+class AudioAnalysisWorker(QThread):
+    """Runs an AudioAnalysis on its own thread and reports it through signals"""
+    analysis_complete = pyqtSignal(float, str)  # BPM, Key
+    analysis_error = pyqtSignal(str)
+    analysis_progress = pyqtSignal(str)
+    duplicate_found = pyqtSignal(str)  # Title of the existing track
+    peaks_ready = pyqtSignal(str)  # Audio file whose waveform peaks were cached
+
+    def __init__(self, audio_file_path):
+        super().__init__()
+        self.audio_file_path = audio_file_path
+        self.analysis = AudioAnalysis(audio_file_path, on_progress=self.analysis_progress.emit,
+                                      on_peaks=self.peaks_ready.emit, on_duplicate=self.duplicate_found.emit)
+
+    def cancel(self):
+        self.analysis.cancel()
+
+    def run(self):
+        try:
+            bpm, key = self.analysis.run()
+        except AnalysisCancelled:
+            return
         except Exception as e:
             self.analysis_error.emit(f"Analysis failed: {str(e)}")
+            return
+        self.analysis_complete.emit(bpm, key)
+
+
+# --- Tag Writer Worker ---
+class TagWriterWorker(QThread):
+    """Writes the stored BPM/key into the tags of many library tracks"""
+    progress = pyqtSignal(int, int)  # done, total
+    tagging_complete = pyqtSignal(int, int)  # tagged, failed
+
+    def __init__(self, track_ids):
+        super().__init__()
+        self.track_ids = track_ids
+        self.trace = JobTrace("tagging", f"{len(track_ids)} tracks")
+
+    def run(self):
+        tagged = failed = 0
+        total = len(self.track_ids)
+        for start in range(0, total, 500):
+            chunk = self.track_ids[start:start + 500]
+            rows = track_library.fetch_rows(chunk)
+            for track_id in chunk:
+                _, _, bpm, key, _, _, _, path, _ = rows.get(track_id, (None,) * 9)
+                if bpm:
+                    try:
+                        with self.trace.span("tag") as span:
+                            span['bytes'] = write_analysis_tags(path, bpm, key)
+                        tagged += 1
+                    except (OSError, ValueError):
+                        failed += 1
+            self.progress.emit(min(start + 500, total), total)
+        self.trace.finish("ok" if not failed else "error")
+        self.tagging_complete.emit(tagged, failed)
+
+# --- Beat Grid Export Worker ---
+class BeatGridExportWorker(QThread):
+    """Exports the beat grids of many library tracks to rekordbox XML and JSON sidecars"""
+    export_complete = pyqtSignal(int, str)  # exported tracks, error message
+
+    def __init__(self, track_ids, xml_path):
+        super().__init__()
+        self.track_ids = track_ids
+        self.xml_path = xml_path
+        self.trace = JobTrace("export", os.path.basename(xml_path))
+
+    def run(self):
+        try:
+            with self.trace.span("read"):
+                tracks = track_library.fetch_beatgrids(self.track_ids)
+            with self.trace.span("write") as span:
+                export_rekordbox_xml(tracks, self.xml_path)
+                for _, _, path, duration, _, _, grid_bpm, first_downbeat, beat_times in tracks:
+                    if os.path.exists(path):
+                        write_beat_grid_sidecar(path, beat_grid_dict(grid_bpm, first_downbeat, beat_times, duration))
+                span['bytes'] = os.path.getsize(self.xml_path)
+        except (OSError, sqlite3.Error) as e:
+            self.trace.finish("error")
+            self.export_complete.emit(0, str(e))
+            return
+        self.trace.finish("ok")
+        self.export_complete.emit(len(tracks), "")
+
+# --- Download Queue ---
+class DownloadQueue(QObject):
+    """Background ingestion: links from a watched drop folder and the clipboard are
+    downloaded, skipping anything already queued or downloaded.
+
+    As many jobs download at once as the adaptive download limit allows, a job
+    gives its slot back as soon as its files are fetched and only conversion is
+    left. Queued jobs run at playlist priority, so a manual download still gets
+    the bandwidth first. With auto_analyze the converted files go on to the
+    analysis stage.
+
+    Queued links are pre-flighted by a MetadataResolver: their rows fill in with
+    title, duration and estimated size while they wait, and the status line
+    totals what is still waiting.
+    """
+    status_changed = pyqtSignal(str)
+    file_downloaded = pyqtSignal(str)
+    TEXT_EXTENSIONS = ('.txt', '.url', '.urls', '.list')
+
+    def __init__(self, create_worker, jobs, parent=None, output_format=None):
+        super().__init__(parent)
+        self.create_worker = create_worker  # (url, section, priority) -> DownloadWorker
+        self.jobs = jobs  # JobListModel
+        self.output_format = output_format or (lambda: ("wav", "320k"))  # () -> (format_type, quality)
+        self.resolver = MetadataResolver(self)
+        self.resolver.resolved.connect(self.onResolved)
+        self.resolver.failed.connect(self.onResolveFailed)
+        self.metadata = {}  # url_key(url) -> resolved metadata
+        self.waiting = {}  # url_key(url) -> [(job key, section)] of links not started yet
+        self.unresolved = []  # [(url_key(url), url)] handed to the resolver in one batch
+        self.resolveTimer = QTimer(self)
+        self.resolveTimer.setSingleShot(True)
+        self.resolveTimer.timeout.connect(self.resolvePending)
+        self.pending = deque()
+        self.seen = set()
+        self.workers = {}  # running DownloadWorker -> (url, section)
+        self.fetching = set()  # workers holding a download slot
+        self.threads = set()  # workers whose thread hasn't stopped yet
+        self.controlTimer = QTimer(self)
+        self.controlTimer.setInterval(CONCURRENCY_INTERVAL_MS)
+        self.controlTimer.timeout.connect(self.adjustConcurrency)
+        self.resumeTimer = QTimer(self)  # Retries links held back by an open circuit breaker
+        self.resumeTimer.setSingleShot(True)
+        self.resumeTimer.timeout.connect(self.startNext)
+        self.watch_folder = ""
+        self.watch_clipboard = False
+        self.file_state = {}  # path -> (mtime, size) already read
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.scanFolder)
+        self.watcher.fileChanged.connect(self.scanFile)
+        self.auto_analyze = False
+        self.loaded_history = False
+
+    def configure(self, watch_folder, watch_clipboard):
+        if self.watcher.directories():
+            self.watcher.removePaths(self.watcher.directories())
+        if self.watcher.files():
+            self.watcher.removePaths(self.watcher.files())
+        self.watch_folder = watch_folder if watch_folder and os.path.isdir(watch_folder) else ""
+        clipboard = QApplication.clipboard()
+        if self.watch_clipboard and not watch_clipboard:
+            clipboard.dataChanged.disconnect(self.checkClipboard)
+        elif watch_clipboard and not self.watch_clipboard:
+            clipboard.dataChanged.connect(self.checkClipboard)
+        self.watch_clipboard = watch_clipboard
+        if self.watch_folder:
+            # inotify on Linux, ReadDirectoryChangesW on Windows
+            self.watcher.addPath(self.watch_folder)
+            self.scanFolder(self.watch_folder)
+
+    def loadHistory(self):
+        """Links already in the library count as done"""
+        if self.loaded_history:
+            return
+        self.loaded_history = True
+        try:
+            self.seen.update(url_key(url) for url in track_library.source_urls())
+        except sqlite3.Error as e:
+            print("Error reading library history:", e)
+
+    def enqueue(self, url, section=None):
+        """Queue a link, returns False if it was queued or downloaded before"""
+        self.loadHistory()
+        key = url_key(url, section)
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        self.pending.append((url, section))
+        self.jobs.addJob(key, url)
+        link = url_key(url)
+        self.waiting.setdefault(link, []).append((key, section))
+        # Links added in one go (a dropped list file) are looked up in one batch
+        self.unresolved.append((link, url))
+        if not self.resolveTimer.isActive():
+            self.resolveTimer.start(0)
+        self.startNext()
+        return True
+
+    def resolvePending(self):
+        batch, self.unresolved = self.unresolved, []
+        self.resolver.resolve(batch)
+        self.updateStatus()
+
+    def describeLink(self, meta, section):
+        """Row status of a waiting link: duration, playlist length and estimated size"""
+        parts = []
+        if meta["duration"]:
+            parts.append(format_timestamp(section_length(meta["duration"], section)))
+        if meta["entries"] is not None:
+            parts.append(f"{meta['entries']} videos")
+        size = estimate_size(meta, *self.output_format(), section)
+        if size:
+            parts.append(f"~{format_size(size)}")
+        return " \u2022 ".join(parts)
+
+    def onResolved(self, link, meta):
+        self.metadata[link] = meta
+        for key, section in self.waiting.get(link, []):
+            job = self.jobs.job(key)
+            if job is not None and job["state"] == JobListModel.QUEUED:
+                self.jobs.updateJob(key, title=meta["title"] or job["title"], status=self.describeLink(meta, section))
+        self.updateStatus()
+
+    def onResolveFailed(self, link, error):
+        # Shows dead links before their turn comes, the download still tries them
+        error = re.sub(r"^ERROR:\s*(\[[^\]]+\]\s*[\w-]+:\s*)?", "", error.strip().splitlines()[0] if error.strip() else "")
+        for key, section in self.waiting.get(link, []):
+            job = self.jobs.job(key)
+            if job is not None and job["state"] == JobListModel.QUEUED:
+                self.jobs.updateJob(key, status=f"\u26a0 {error or 'No info'}")
+        self.updateStatus()
+
+    def markDone(self, url, section=None):
+        """Record a link downloaded outside the queue"""
+        self.seen.add(url_key(url, section))
+
+    def scanFolder(self, folder):
+        try:
+            names = sorted(os.listdir(folder))
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(folder, name)
+            if name.lower().endswith(self.TEXT_EXTENSIONS) and os.path.isfile(path):
+                if path not in self.watcher.files():
+                    # Also watch the file itself so appended links are picked up
+                    self.watcher.addPath(path)
+                self.scanFile(path)
+
+    def scanFile(self, path):
+        try:
+            stat = os.stat(path)
+            if self.file_state.get(path) == (stat.st_mtime, stat.st_size):
+                return
+            with open(path, encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError:
+            return
+        self.file_state[path] = (stat.st_mtime, stat.st_size)
+        added = sum(self.enqueue(url, section) for url, section in extract_links(text))
+        if added:
+            self.status_changed.emit(f"Queued {added} link{'s' if added != 1 else ''} from {os.path.basename(path)}")
+        # Editors save by replacing the file, which drops it from the watch list
+        if path not in self.watcher.files() and os.path.exists(path):
+            self.watcher.addPath(path)
+
+    def checkClipboard(self):
+        links = extract_links(QApplication.clipboard().text(), youtube_only=True)
+        added = sum(self.enqueue(url, section) for url, section in links)
+        if added:
+            self.status_changed.emit(f"Queued {added} link{'s' if added != 1 else ''} from the clipboard")
+
+    def startNext(self):
+        held = []
+        resume = None
+        while self.pending:
+            paused = retry_policy.open_for(self.pending[0][0])
+            if paused:
+                # The host is throttling, links to other hosts go first
+                held.append(self.pending.popleft())
+                resume = min(resume or paused, paused)
+                continue
+            if not adaptive_concurrency.downloads.try_acquire():
+                break
+            url, section = self.pending.popleft()
+            link = url_key(url)
+            remaining = [entry for entry in self.waiting.get(link, []) if entry[1] != section]
+            if remaining:
+                self.waiting[link] = remaining
+            else:
+                self.waiting.pop(link, None)
+            worker = self.create_worker(url, section, PRIORITY_PLAYLIST)
+            worker.analyze = self.auto_analyze
+            self.workers[worker] = (url, section)
+            self.fetching.add(worker)
+            self.threads.add(worker)
+            self.jobs.track(url_key(url, section), worker)
+            worker.file_downloaded_signal.connect(self.file_downloaded)
+            worker.fetched_signal.connect(lambda worker=worker: self.onFetched(worker))
+            worker.finished_signal.connect(lambda worker=worker: self.onJobDone(worker))
+            worker.error_signal.connect(lambda error, worker=worker: self.onJobDone(worker, error))
+            # Keep a reference until the thread has actually stopped
+            worker.finished.connect(lambda worker=worker: self.threads.discard(worker))
+            worker.start()
+        self.pending.extendleft(reversed(held))
+        if resume is not None:
+            self.resumeTimer.start(int(resume * 1000) + 100)
+        adaptive_concurrency.downloads.backlog = len(self.pending)
+        if self.workers and not self.controlTimer.isActive():
+            adaptive_concurrency.restart()
+            self.controlTimer.start()
+        elif not self.workers:
+            self.controlTimer.stop()
+        self.updateStatus()
+
+    def adjustConcurrency(self):
+        adaptive_concurrency.update()
+        # A raised limit starts waiting jobs right away
+        self.startNext()
+
+    def onFetched(self, worker):
+        """The job only has conversions left, its download slot goes to the next link"""
+        if worker in self.fetching:
+            self.fetching.discard(worker)
+            adaptive_concurrency.downloads.release()
+            self.startNext()
+
+    def onJobDone(self, worker, error=None):
+        self.onFetched(worker)
+        link = self.workers.pop(worker, None)
+        if link is None:
+            return
+        if error is not None:
+            print(f"Queued download failed ({link[0]}):", error)
+            # Dropping or copying the link again retries it
+            self.seen.discard(url_key(*link))
+        self.startNext()
+
+    def updateStatus(self):
+        resolving = self.resolver.pending()
+        if not self.workers and not self.pending and not resolving:
+            self.status_changed.emit("")
+            return
+        parts = []
+        if len(self.fetching) == 1:
+            parts.append(f"downloading {self.workers[next(iter(self.fetching))][0]}")
+        elif self.fetching:
+            parts.append(f"downloading {len(self.fetching)} links")
+        if len(self.workers) > len(self.fetching):
+            parts.append(f"converting {len(self.workers) - len(self.fetching)}")
+        if self.pending:
+            duration = size = 0
+            for link, entries in self.waiting.items():
+                meta = self.metadata.get(link)
+                for _, section in entries if meta else ():
+                    duration += section_length(meta["duration"], section)
+                    size += estimate_size(meta, *self.output_format(), section) or 0
+            totals = [format_timestamp(duration)] if duration else []
+            totals += [f"~{format_size(size)}"] if size else []
+            parts.append(f"{len(self.pending)} waiting" + (f" ({', '.join(totals)})" if totals else ""))
+        if resolving:
+            parts.append(f"resolving {resolving}")
+        self.status_changed.emit("Queue: " + " \u2022 ".join(parts))
+
+    def pendingLinks(self):
+        """Links not finished yet, the running ones first"""
+        links = list(self.workers.values()) + list(self.pending)
+        return [url if not section else f"{url} {section[0]}-{section[1] if section[1] is not None else ''}"
+                for url, section in links]
+
+    def stop(self):
+        self.pending.clear()
+        self.controlTimer.stop()
+        self.resumeTimer.stop()
+        self.resolveTimer.stop()
+        self.resolver.cancel()
+        for worker in list(self.threads):
+            if worker.isRunning():
+                worker.wait(3000)
+
+# --- Settings Store ---
+class SettingsStore(QObject):
+    """QSettings front end that keeps values in memory and writes changed keys in batches.
+
+    setValue only marks a key dirty, a debounce timer then hands the batch to a
+    background thread, so option changes never touch the disk on the GUI thread.
+    Call flush(wait=True) at shutdown.
+    """
+    FLUSH_DELAY_MS = 1000
+    _MISSING = object()
+
+    def __init__(self, organization, application, parent=None):
+        super().__init__(parent)
+        self.organization = organization
+        self.application = application
+        self.settings = QSettings(organization, application)
+        self.values = {}
+        self.dirty = {}
+        self.writer = None
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.FLUSH_DELAY_MS)
+        self.timer.timeout.connect(self.flush)
+
+    def value(self, key, default=None, type=None):
+        if key in self.values:
+            return self.values[key]
+        if type is None:
+            value = self.settings.value(key, default)
+        else:
+            value = self.settings.value(key, default, type=type)
+        self.values[key] = value
+        return value
+
+    def setValue(self, key, value):
+        if self.values.get(key, self._MISSING) == value and key not in self.dirty:
+            return
+        self.values[key] = value
+        self.dirty[key] = value
+        self.timer.start()
+
+    def flush(self, wait=False):
+        if self.writer is not None and self.writer.is_alive():
+            if not wait:
+                # Keep batches in order, retry once the running write is done
+                self.timer.start()
+                return
+            self.writer.join()
+        self.timer.stop()
+        if self.dirty:
+            batch, self.dirty = self.dirty, {}
+            self.writer = threading.Thread(target=self.write_batch, args=(batch,), daemon=not wait)
+            self.writer.start()
+        if wait and self.writer is not None:
+            self.writer.join()
+
+    def write_batch(self, batch):
+        # QSettings is reentrant, the writer thread uses its own instance
+        settings = QSettings(self.organization, self.application)
+        for key, value in batch.items():
+            settings.setValue(key, value)
+        settings.sync()
 
 # --- Title Bar ---
 class TitleBar(QWidget):
@@ -486,25 +4373,26 @@ class TitleBar(QWidget):
         self.parent = parent
         self.start = QPoint(0, 0)
         self.pressing = False
-        self.setStyleSheet("background-color: " + parent.titleBarBg + ";")
+        self.setObjectName("titleBar")
+        self.setAttribute(Qt.WidgetAttribute.WA_StyledBackground, True)
         self.optionsButton = QPushButton("", self)
+        self.optionsButton.setObjectName("optionsButton")
         self.optionsButton.setFixedSize(140, 30)
         favicon = QPixmap(resource_path("UI_Photos/favicon.ico"))
         self.optionsButton.setIcon(QIcon(favicon))
         self.optionsButton.setIconSize(QSize(24, 24))
         self.optionsButton.setText(" Options")
-        self.optionsButton.setStyleSheet(parent.optionsBtnStyle)
         self.optionsButton.clicked.connect(self.parent.toggleOptions)
         self.titleLabel = QLabel(f"Waver v{__version__} by getbetter", self)
-        self.titleLabel.setStyleSheet(parent.titleLabelStyle)
+        self.titleLabel.setObjectName("titleLabel")
         self.titleLabel.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.btnMinimize = QPushButton("–", self)
         self.btnMinimize.setFixedSize(30, 30)
-        self.btnMinimize.setStyleSheet(parent.minimizeBtnStyle)
+        self.btnMinimize.setObjectName("minimizeButton")
         self.btnMinimize.clicked.connect(self.parent.showMinimized)
         self.btnClose = QPushButton("✕", self)
         self.btnClose.setFixedSize(30, 30)
-        self.btnClose.setStyleSheet(parent.closeBtnStyle)
+        self.btnClose.setObjectName("closeButton")
         self.btnClose.clicked.connect(self.parent.close)
         mainLayout = QHBoxLayout(self)
         mainLayout.setContentsMargins(10, 0, 10, 0)
@@ -543,146 +4431,14 @@ class MainWindow(QMainWindow):
         self.lightMode = False
         self.openFolderAfterDownload = True
         self.autoAnalyze = False
-        self.titleBarBg = "#0d0d0d"
-        self.optionsBtnStyle = """
-            QPushButton {
-                background-color: transparent;
-                color: white;
-                border: none;
-                font: 16pt 'Segoe UI';
-            }
-            QPushButton:hover { background-color: #2a2a2a; }
-            QPushButton:pressed { background-color: #444; }
-        """
-        self.titleLabelStyle = "color: white; font: bold 16pt 'Segoe UI';"
-        self.minimizeBtnStyle = """
-            QPushButton {
-                background-color: transparent;
-                color: white;
-                border: none;
-                font: bold 14pt 'Segoe UI';
-            }
-            QPushButton:hover { background-color: #555; }
-        """
-        self.closeBtnStyle = """
-            QPushButton { background-color: transparent; color: white; border: none; }
-            QPushButton:hover { background-color: #ff5555; }
-        """
-        self.bgColor = "#0d0d0d"
-        self.lineEditStyle = """
-            QLineEdit {
-                background-color: #161616;
-                border: 2px solid #333;
-                padding: 10px;
-                border-radius: 5px;
-                color: white;
-                font: 14pt 'Segoe UI';
-            }
-            QLineEdit:focus { border: 2px solid #1e90ff; }
-        """
-        self.darkDropdownStyle = (
-            "QComboBox {"
-            "   background-color: #161616;"
-            "   border: 2px solid #444;"
-            "   padding: 10px 16px;"
-            "   border-radius: 8px;"
-            "   color: white;"
-            "   font: 13pt 'Segoe UI';"
-            "   outline: none;"
-            "   min-width: 80px;"
-            "}"
-            "QComboBox:hover { border: 2px solid #555; background-color: #1a1a1a; }"
-            "QComboBox:focus { border: 2px solid #1e90ff; outline: none; }"
-            "QComboBox::drop-down {"
-            "   subcontrol-origin: padding;"
-            "   subcontrol-position: top right;"
-            "   width: 20px;"
-            "   border: none;"
-            "   background: transparent;"
-            "}"
-            "QComboBox::down-arrow {"
-            "   image: url(data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMTIiIGhlaWdodD0iOCIgdmlld0JveD0iMCAwIDEyIDgiIGZpbGw9Im5vbmUiIHhtbG5zPSJodHRwOi8vd3d3LnczLm9yZy8yMDAwL3N2ZyI+CjxwYXRoIGQ9Ik0xIDFMNiA2TDExIDEiIHN0cm9rZT0iI2FhYSIgc3Ryb2tlLXdpZHRoPSIyIiBzdHJva2UtbGluZWNhcD0icm91bmQiIHN0cm9rZS1saW5lam9pbj0icm91bmQiLz4KPC9zdmc+);"
-            "   width: 12px;"
-            "   height: 8px;"
-            "}"
-            "QComboBox QAbstractItemView {"
-            "   background: #1a1a1a;"
-            "   border: 2px solid #444;"
-            "   border-radius: 8px;"
-            "   color: white;"
-            "   padding: 4px;"
-            "   selection-background-color: #1e90ff;"
-            "   outline: none;"
-            "}"
-            "QComboBox QAbstractItemView::item {"
-            "   padding: 8px 12px;"
-            "   border: none;"
-            "   min-height: 20px;"
-            "}"
-            "QComboBox QAbstractItemView::item:selected {"
-            "   background: #1e90ff;"
-            "   color: white;"
-            "   border-radius: 4px;"
-            "}"
-            "QComboBox QAbstractItemView::item:hover {"
-            "   background: #2a2a2a;"
-            "   border-radius: 4px;"
-            "}"
-        )
-        self.lightDropdownStyle = (
-            "QComboBox {"
-            "   background-color: #ffffff;"
-            "   border: 2px solid #ddd;"
-            "   padding: 10px 16px;"
-            "   border-radius: 8px;"
-            "   color: black;"
-            "   font: 13pt 'Segoe UI';"
-            "   outline: none;"
-            "   min-width: 80px;"
-            "}"
-            "QComboBox:hover { border: 2px solid #bbb; background-color: #f8f8f8; }"
-            "QComboBox:focus { border: 2px solid #1e90ff; outline: none; }"
-            "QComboBox::drop-down {"
-            "   subcontrol-origin: padding;"
-            "   subcontrol-position: top right;"
-            "   width: 20px;"
-            "   border: none;"
-            "   background: transparent;"
-            "}"
-            "QComboBox::down-arrow {"
-            "   image: url(data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMTIiIGhlaWdodD0iOCIgdmlld0JveD0iMCAwIDEyIDgiIGZpbGw9Im5vbmUiIHhtbG5zPSJodHRwOi8vd3d3LnczLm9yZy8yMDAwL3N2ZyI+CjxwYXRoIGQ9Ik0xIDFMNiA2TDExIDEiIHN0cm9rZT0iIzY2NiIgc3Ryb2tlLXdpZHRoPSIyIiBzdHJva2UtbGluZWNhcD0icm91bmQiIHN0cm9rZS1saW5lam9pbj0icm91bmQiLz4KPC9zdmc+);"
-            "   width: 12px;"
-            "   height: 8px;"
-            "}"
-            "QComboBox QAbstractItemView {"
-            "   background: #ffffff;"
-            "   border: 2px solid #ddd;"
-            "   border-radius: 8px;"
-            "   color: black;"
-            "   padding: 4px;"
-            "   selection-background-color: #1e90ff;"
-            "   outline: none;"
-            "}"
-            "QComboBox QAbstractItemView::item {"
-            "   padding: 8px 12px;"
-            "   border: none;"
-            "   min-height: 20px;"
-            "}"
-            "QComboBox QAbstractItemView::item:selected {"
-            "   background: #1e90ff;"
-            "   color: white;"
-            "   border-radius: 4px;"
-            "}"
-            "QComboBox QAbstractItemView::item:hover {"
-            "   background: #f0f0f0;"
-            "   border-radius: 4px;"
-            "}"
-        )
-        self.currentDropdownStyle = self.darkDropdownStyle
+        self.appliedTheme = None
+        self.manualJobIds = itertools.count(1)
 
         self.optionsWidget = None
+        self.diagnosticsWidget = None
+        self.libraryWidget = None
 
-        self.settings = QSettings("MyCompany", "WaverApp")
+        self.settings = SettingsStore("MyCompany", "WaverApp", self)
         self.loadSettings()
 
         # Set minimum size but allow dynamic resizing
@@ -691,6 +4447,19 @@ class MainWindow(QMainWindow):
         self.initUI()
         self.initAudio()
         self.installEventFilter(self)
+        # Probe (or load the cached capabilities of) ffmpeg before the first job needs them
+        threading.Thread(target=ffmpeg_caps.get, daemon=True).start()
+
+        self.downloadQueue = DownloadQueue(
+            self.createDownloadWorker, self.jobModel, self,
+            output_format=lambda: (self.formatDropdown.currentText().lower(), self.qualityDropdown.currentText()))
+        self.downloadQueue.auto_analyze = self.autoAnalyze
+        self.downloadQueue.status_changed.connect(self.onQueueStatus)
+        self.downloadQueue.file_downloaded.connect(self.onQueuedFileDownloaded)
+        # Links still queued when the app was closed
+        for url, section in extract_links(self.savedQueue):
+            self.downloadQueue.enqueue(url, section)
+        self.downloadQueue.configure(self.watchFolder, self.watchClipboard)
 
     def getDefaultDownloadsFolder(self):
         """Get the user's default Downloads folder path dynamically"""
@@ -746,6 +4515,36 @@ class MainWindow(QMainWindow):
         self.qualitySetting = self.settings.value("quality", default_quality)
         self._savedDownloadDir = downloadDir
 
+        # Bandwidth limit in KB/s (0 = unlimited) and optional time-of-day schedule
+        self.bandwidthLimit = self.settings.value("bandwidthLimit", 0, type=int)
+        self.bandwidthSchedule = self.settings.value("bandwidthSchedule", "")
+        bandwidth_scheduler.configure(self.bandwidthLimit * 1024, parse_bandwidth_schedule(self.bandwidthSchedule))
+
+        # Job metrics are always written as a Prometheus text file, the HTTP endpoint is opt-in
+        self.metricsPort = self.settings.value("metricsPort", 0, type=int)
+        metrics.textfile_path = app_data_path("metrics.prom")
+        metrics.serve(self.metricsPort)
+
+        # Downloads that fingerprint as a track already in the library are not converted or kept
+        self.skipDuplicates = self.settings.value("skipDuplicates", True, type=bool)
+
+        # Integrated loudness target in LUFS for audio downloads, 0 = measure only
+        self.loudnessTarget = self.settings.value("loudnessTarget", 0.0, type=float)
+
+        # Memory budget in MB for concurrent analysis jobs, 0 = a quarter of physical memory
+        self.analysisMemoryBudget = self.settings.value("analysisMemoryBudget", 0, type=int)
+        analysis_scheduler.configure(self.analysisMemoryBudget)
+
+        # Upper bounds for the adaptive download and transcode limits, 0 = 6 downloads and one transcode per core
+        self.maxDownloads = self.settings.value("maxDownloads", 0, type=int)
+        self.maxTranscodes = self.settings.value("maxTranscodes", 0, type=int)
+        adaptive_concurrency.configure(self.maxDownloads, self.maxTranscodes)
+
+        # Ingestion: links dropped as text files into watchFolder and/or copied to the clipboard are queued
+        self.watchFolder = self.settings.value("watchFolder", "")
+        self.watchClipboard = self.settings.value("watchClipboard", False, type=bool)
+        self.savedQueue = self.settings.value("downloadQueue", "")
+
     def saveSettings(self):
         self.settings.setValue("audioMuted", self.isMuted)
         self.settings.setValue("lightMode", self.lightMode)
@@ -755,169 +4554,21 @@ class MainWindow(QMainWindow):
         self.settings.setValue("downloadDir", self.downloaderLocInput.text())
         self.settings.setValue("downloadFormat", self.formatDropdown.currentText())
         self.settings.setValue("quality", self.qualityDropdown.currentText())
-
-    def setDarkStyles(self):
-        self.titleBarBg = "#0d0d0d"
-        self.optionsBtnStyle = """
-            QPushButton {
-                background-color: transparent;
-                color: white;
-                border: none;
-                font: 16pt 'Segoe UI';
-            }
-            QPushButton:hover { background-color: #2a2a2a; }
-            QPushButton:pressed { background-color: #444; }
-        """
-        self.titleLabelStyle = "color: white; font: bold 16pt 'Segoe UI';"
-        self.minimizeBtnStyle = """
-            QPushButton {
-                background-color: transparent;
-                color: white;
-                border: none;
-                font: bold 14pt 'Segoe UI';
-            }
-            QPushButton:hover { background-color: #555; }
-        """
-        self.closeBtnStyle = """
-            QPushButton { background-color: transparent; color: white; border: none; }
-            QPushButton:hover { background-color: #ff5555; }
-        """
-        self.bgColor = "#0d0d0d"
-        self.lineEditStyle = """
-            QLineEdit {
-                background-color: #161616;
-                border: 2px solid #333;
-                padding: 10px;
-                border-radius: 5px;
-                color: white;
-                font: 14pt 'Segoe UI';
-            }
-            QLineEdit:focus { border: 2px solid #1e90ff; }
-        """
-        self.currentDropdownStyle = self.darkDropdownStyle
-
-    def setLightStyles(self):
-        self.titleBarBg = "#f0f0f0"
-        self.optionsBtnStyle = """
-            QPushButton {
-                background-color: transparent;
-                color: black;
-                border: none;
-                font: 16pt 'Segoe UI';
-            }
-            QPushButton:hover { background-color: #ddd; }
-            QPushButton:pressed { background-color: #bbb; }
-        """
-        self.titleLabelStyle = "color: black; font: bold 16pt 'Segoe UI';"
-        self.minimizeBtnStyle = """
-            QPushButton {
-                background-color: transparent;
-                color: black;
-                border: none;
-                font: bold 14pt 'Segoe UI';
-            }
-            QPushButton:hover { background-color: #ccc; }
-        """
-        self.closeBtnStyle = """
-            QPushButton { background-color: transparent; color: black; border: none; }
-            QPushButton:hover { background-color: #ffaaaa; }
-        """
-        self.bgColor = "#f0f0f0"
-        self.lineEditStyle = """
-            QLineEdit {
-                background-color: #ffffff;
-                border: 2px solid #ccc;
-                padding: 10px;
-                border-radius: 5px;
-                color: black;
-                font: 14pt 'Segoe UI';
-            }
-            QLineEdit:focus { border: 2px solid #1e90ff; }
-        """
-        self.currentDropdownStyle = self.lightDropdownStyle
-
-    def updateStyles(self):
-        if self.lightMode:
-            self.setLightStyles()
-        else:
-            self.setDarkStyles()
-        self.backgroundWidget.bg_color = QColor(self.bgColor)
-        self.backgroundWidget.update()
-        self.titleBar.setStyleSheet("background-color: " + self.titleBarBg + ";")
-        self.titleBar.optionsButton.setStyleSheet(self.optionsBtnStyle)
-        self.titleBar.titleLabel.setStyleSheet(self.titleLabelStyle)
-        self.titleBar.btnMinimize.setStyleSheet(self.minimizeBtnStyle)
-        self.titleBar.btnClose.setStyleSheet(self.closeBtnStyle)
-        self.downloaderLocInput.setStyleSheet(self.lineEditStyle)
-        self.downloaderUrlInput.setStyleSheet(self.lineEditStyle)
-        self.formatDropdown.setStyleSheet(self.currentDropdownStyle)
-        self.qualityDropdown.setStyleSheet(self.currentDropdownStyle)
-        self.fileTypeLabel.setStyleSheet("color: " + ("white" if not self.lightMode else "black") + "; font: 13pt 'Segoe UI';")
-        self.qualityLabel.setStyleSheet("color: " + ("white" if not self.lightMode else "black") + "; font: 13pt 'Segoe UI';")
-        self.videoInfoLabel.setStyleSheet("color: " + ("#ddd" if not self.lightMode else "#333") + "; font: 10pt 'Segoe UI';")
-        self.downloadStatusLabel.setStyleSheet("color: " + ("white" if not self.lightMode else "black") + "; font: bold 14pt 'Segoe UI';")
-        if self.lightMode:
-            self.pasteButton.setStyleSheet("""
-                QPushButton {
-                    background-color: #ffffff;
-                    color: black;
-                    border: 2px solid #ccc;
-                    padding: 10px 15px;
-                    border-radius: 5px;
-                    font: 12pt 'Segoe UI';
-                }
-                QPushButton:hover { background-color: #ddd; }
-                QPushButton:pressed { background-color: #bbb; }
-            """)
-            self.muteButton.setStyleSheet("""
-                QPushButton {
-                    background-color: #ffffff;
-                    color: black;
-                    border: 2px solid #ccc;
-                    border-radius: 8px;
-                    font: bold 12pt 'Segoe UI';
-                }
-                QPushButton:hover { background-color: #ddd; }
-                QPushButton:pressed { background-color: #bbb; }
-            """)
-            self.titleBar.optionsButton.setStyleSheet("""
-                QPushButton {
-                    background-color: transparent;
-                    color: black;
-                    border: none;
-                    font: 16pt 'Segoe UI';
-                }
-                QPushButton:hover { background-color: #ddd; }
-                QPushButton:pressed { background-color: #bbb; }
-            """)
-        else:
-            self.pasteButton.setStyleSheet("""
-                QPushButton {
-                    background-color: #161616;
-                    color: white;
-                    border: 2px solid #333;
-                    padding: 10px 15px;
-                    border-radius: 5px;
-                    font: 12pt 'Segoe UI';
-                }
-                QPushButton:hover { background-color: #2a2a2a; }
-                QPushButton:pressed { background-color: #444; }
-            """)
-            self.muteButton.setStyleSheet("""
-                QPushButton {
-                    background-color: #161616;
-                    color: white;
-                    border: 2px solid #333;
-                    border-radius: 8px;
-                    font: bold 12pt 'Segoe UI';
-                }
-                QPushButton:hover { background-color: #2a2a2a; }
-                QPushButton:pressed { background-color: #444; }
-            """)
-            self.titleBar.optionsButton.setStyleSheet(self.optionsBtnStyle)
+        self.settings.setValue("bandwidthLimit", self.bandwidthLimit)
+        self.settings.setValue("bandwidthSchedule", self.bandwidthSchedule)
+        self.settings.setValue("metricsPort", self.metricsPort)
+        self.settings.setValue("skipDuplicates", self.skipDuplicates)
+        self.settings.setValue("loudnessTarget", self.loudnessTarget)
+        self.settings.setValue("analysisMemoryBudget", self.analysisMemoryBudget)
+        self.settings.setValue("maxDownloads", self.maxDownloads)
+        self.settings.setValue("maxTranscodes", self.maxTranscodes)
+        self.settings.setValue("watchFolder", self.watchFolder)
+        self.settings.setValue("watchClipboard", self.watchClipboard)
+        if hasattr(self, "downloadQueue"):
+            self.settings.setValue("downloadQueue", "\n".join(self.downloadQueue.pendingLinks()))
 
     def initUI(self):
-        self.backgroundWidget = BackgroundWidget(self, bg_color=self.bgColor)
+        self.backgroundWidget = BackgroundWidget(self, bg_color=THEME_COLORS[self.lightMode]["window"])
         mainLayout = QVBoxLayout(self.backgroundWidget)
         mainLayout.setSpacing(0)
         mainLayout.setContentsMargins(0, 0, 0, 0)
@@ -925,6 +4576,7 @@ class MainWindow(QMainWindow):
         self.titleBar.setFixedHeight(40)
         mainLayout.addWidget(self.titleBar)
         contentWidget = QWidget()
+        contentWidget.setObjectName("mainContent")
         contentLayout = QVBoxLayout(contentWidget)
         contentLayout.setSpacing(15)
         contentLayout.setContentsMargins(25, 20, 25, 20)
@@ -934,12 +4586,11 @@ class MainWindow(QMainWindow):
         fileTypeLayout.setSpacing(2)
         self.fileTypeLabel = QLabel("File Type:")
         self.fileTypeLabel.setFixedWidth(80)
-        self.fileTypeLabel.setStyleSheet("color: " + ("white" if not self.lightMode else "black") + "; font: 13pt 'Segoe UI';")
+        self.fileTypeLabel.setObjectName("fieldLabel")
         fileTypeLayout.addWidget(self.fileTypeLabel)
         self.formatDropdown = NoFocusComboBox()
         self.formatDropdown.addItems(["WAV", "MP3", "MP4"])
         self.formatDropdown.setCurrentText(self.formatSetting)
-        self.formatDropdown.setStyleSheet(self.currentDropdownStyle)
         self.formatDropdown.setSizeAdjustPolicy(QComboBox.SizeAdjustPolicy.AdjustToContents)
         self.formatDropdown.currentTextChanged.connect(self.onFormatChanged)
         fileTypeLayout.addWidget(self.formatDropdown)
@@ -948,10 +4599,9 @@ class MainWindow(QMainWindow):
         qualityLayout.setSpacing(2)
         self.qualityLabel = QLabel("Quality:")
         self.qualityLabel.setFixedWidth(80)
-        self.qualityLabel.setStyleSheet("color: " + ("white" if not self.lightMode else "black") + "; font: 13pt 'Segoe UI';")
+        self.qualityLabel.setObjectName("fieldLabel")
         qualityLayout.addWidget(self.qualityLabel)
         self.qualityDropdown = NoFocusComboBox()
-        self.qualityDropdown.setStyleSheet(self.currentDropdownStyle)
         self.qualityDropdown.setSizeAdjustPolicy(QComboBox.SizeAdjustPolicy.AdjustToContents)
         qualityLayout.addWidget(self.qualityDropdown)
         
@@ -961,17 +4611,7 @@ class MainWindow(QMainWindow):
         topControlsLayout.addLayout(qualityLayout)
         self.muteButton = QPushButton("Mute")
         self.muteButton.setFixedSize(100, 40)
-        self.muteButton.setStyleSheet("""
-            QPushButton {
-                background-color: #161616;
-                color: white;
-                border: 2px solid #333;
-                border-radius: 8px;
-                font: bold 12pt 'Segoe UI';
-            }
-            QPushButton:hover { background-color: #2a2a2a; }
-            QPushButton:pressed { background-color: #444; }
-        """)
+        self.muteButton.setObjectName("muteButton")
         self.muteButton.clicked.connect(self.toggleMute)
         topControlsLayout.addWidget(self.muteButton)
         contentLayout.addLayout(topControlsLayout)
@@ -981,40 +4621,17 @@ class MainWindow(QMainWindow):
         self.downloaderLocInput.setText(self._savedDownloadDir)
         self.downloaderLocInput.setPlaceholderText("Download folder path...")
         self.downloaderLocInput.setToolTip(f"Current: {self._savedDownloadDir}\nDefault: {self.getDefaultDownloadsFolder()}")
-        self.downloaderLocInput.setStyleSheet(self.lineEditStyle)
         pathLayout.addWidget(self.downloaderLocInput, stretch=1)
         
         browseBtn = QPushButton("Browse")
         browseBtn.clicked.connect(self.browseDownloadFolder)
-        browseBtn.setStyleSheet("""
-            QPushButton {
-                background-color: #147cd3;
-                color: white;
-                border: none;
-                padding: 10px 15px;
-                border-radius: 8px;
-                font: 12pt 'Segoe UI';
-            }
-            QPushButton:hover { background-color: #126bb0; }
-            QPushButton:pressed { background-color: #0f5a8e; }
-        """)
+        browseBtn.setObjectName("browseButton")
         pathLayout.addWidget(browseBtn)
         
         resetBtn = QPushButton("Reset")
         resetBtn.clicked.connect(self.resetToDefaultFolder)
         resetBtn.setToolTip("Reset to default Downloads folder")
-        resetBtn.setStyleSheet("""
-            QPushButton {
-                background-color: #666;
-                color: white;
-                border: none;
-                padding: 10px 15px;
-                border-radius: 8px;
-                font: 12pt 'Segoe UI';
-            }
-            QPushButton:hover { background-color: #777; }
-            QPushButton:pressed { background-color: #555; }
-        """)
+        resetBtn.setObjectName("resetButton")
         pathLayout.addWidget(resetBtn)
         
         contentLayout.addLayout(pathLayout)
@@ -1022,24 +4639,23 @@ class MainWindow(QMainWindow):
         urlInputLayout = QHBoxLayout()
         self.downloaderUrlInput = CustomLineEdit()
         self.downloaderUrlInput.setPlaceholderText("Enter YouTube URL")
-        self.downloaderUrlInput.setStyleSheet(self.lineEditStyle)
         self.downloaderUrlInput.focusOut.connect(self.updateVideoInfo)
         urlInputLayout.addWidget(self.downloaderUrlInput, stretch=1)
         self.pasteButton = QPushButton("Paste")
         self.pasteButton.clicked.connect(self.handlePaste)
-        self.pasteButton.setStyleSheet("""
-            QPushButton {
-                background-color: #161616;
-                color: white;
-                border: 2px solid #333;
-                padding: 10px 15px;
-                border-radius: 5px;
-                font: 12pt 'Segoe UI';
-            }
-            QPushButton:hover { background-color: #2a2a2a; }
-            QPushButton:pressed { background-color: #444; }
-        """)
+        self.pasteButton.setObjectName("pasteButton")
         urlInputLayout.addWidget(self.pasteButton)
+        # Optional section, only this part of the video is downloaded and analyzed
+        self.sectionStartInput = QLineEdit()
+        self.sectionStartInput.setPlaceholderText("Start")
+        self.sectionStartInput.setToolTip("Only download from this time, e.g. 1:30\nA URL can also end with a range: <url> 1:30-2:00")
+        self.sectionStartInput.setFixedWidth(90)
+        urlInputLayout.addWidget(self.sectionStartInput)
+        self.sectionEndInput = QLineEdit()
+        self.sectionEndInput.setPlaceholderText("End")
+        self.sectionEndInput.setToolTip("Only download until this time, e.g. 2:00 (empty = until the end)")
+        self.sectionEndInput.setFixedWidth(90)
+        urlInputLayout.addWidget(self.sectionEndInput)
         contentLayout.addLayout(urlInputLayout)
         
         # Create a container widget for video info with proper margins
@@ -1049,96 +4665,69 @@ class MainWindow(QMainWindow):
         videoInfoLayout.setSpacing(0)
         
         self.videoInfoLabel = QLabel("")
-        self.videoInfoLabel.setStyleSheet("""
-            QLabel {
-                color: #bbb;
-                font: 12pt 'Segoe UI';
-                background-color: #1a1a1a;
-                border: 1px solid #333;
-                border-radius: 8px;
-                padding: 15px;
-                line-height: 1.5;
-                min-height: 60px;
-                max-width: 100%;
-            }
-        """)
+        self.videoInfoLabel.setObjectName("videoInfoLabel")
         self.videoInfoLabel.setWordWrap(True)
         self.videoInfoLabel.setContentsMargins(20, 8, 20, 8)
         self.videoInfoLabel.setTextFormat(Qt.TextFormat.RichText)
         
         videoInfoLayout.addWidget(self.videoInfoLabel)
         contentLayout.addWidget(videoInfoContainer)
-        # --- Download Progress Bar, Status, and Button ---
-        self.downloadProgressBar = DynamicProgressBar()
-        self.downloadProgressBar.setMinimum(0)
-        self.downloadProgressBar.setMaximum(100)
-        self.downloadProgressBar.setValue(0)
-        self.downloadProgressBar.hide()
-        contentLayout.addWidget(self.downloadProgressBar)
+        # --- Job List, Status, and Button ---
+        # Only the visible rows are painted, so a long queue costs the same as a few jobs
+        self.jobModel = JobListModel(self)
+        self.jobDelegate = JobDelegate(self.lightMode, self)
+        self.jobListView = QListView()
+        self.jobListView.setObjectName("jobList")
+        self.jobListView.setModel(self.jobModel)
+        self.jobListView.setItemDelegate(self.jobDelegate)
+        self.jobListView.setUniformItemSizes(True)
+        self.jobListView.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.jobListView.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.jobListView.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.jobListView.hide()
+        self.jobModel.rowsInserted.connect(self.updateJobListHeight)
+        self.jobModel.rowsRemoved.connect(self.updateJobListHeight)
+        contentLayout.addWidget(self.jobListView)
         self.downloadStatusLabel = QLabel("")
-        self.downloadStatusLabel.setStyleSheet("color: " + ("white" if not self.lightMode else "black") + "; font: bold 14pt 'Segoe UI';")
+        self.downloadStatusLabel.setObjectName("downloadStatusLabel")
         self.downloadStatusLabel.setAlignment(Qt.AlignmentFlag.AlignCenter)
         contentLayout.addWidget(self.downloadStatusLabel)
+        self.queueStatusLabel = QLabel("")
+        self.queueStatusLabel.setObjectName("queueStatusLabel")
+        self.queueStatusLabel.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.queueStatusLabel.hide()
+        contentLayout.addWidget(self.queueStatusLabel)
         self.downloadButton = QPushButton("Download")
         self.downloadButton.clicked.connect(self.startDownload)
-        self.downloadButton.setStyleSheet("""
-            QPushButton {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #147cd3, stop:1 #126bb0);
-                color: white;
-                border: none;
-                padding: 12px 20px;
-                border-radius: 8px;
-                font: bold 14pt 'Segoe UI';
-            }
-            QPushButton:hover { background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #126bb0, stop:1 #0f5a8e); }
-            QPushButton:pressed { background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #0f5a8e, stop:1 #0c4675); }
-        """)
+        self.downloadButton.setObjectName("downloadButton")
         contentLayout.addWidget(self.downloadButton)
         
         # --- Audio Analysis Components ---
         self.analyzeButton = QPushButton("🎵 Analyze Key and BPM")
         self.analyzeButton.clicked.connect(self.startAudioAnalysis)
-        self.analyzeButton.setStyleSheet("""
-            QPushButton {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #9333ea, stop:1 #7c3aed);
-                color: white;
-                border: none;
-                padding: 12px 20px;
-                border-radius: 8px;
-                font: bold 14pt 'Segoe UI';
-            }
-            QPushButton:hover { background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #7c3aed, stop:1 #6d28d9); }
-            QPushButton:pressed { background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #6d28d9, stop:1 #5b21b6); }
-        """)
+        self.analyzeButton.setObjectName("analyzeButton")
         self.analyzeButton.hide()  # Hidden by default
 
         contentLayout.addWidget(self.analyzeButton)
         
         # Analysis results display
         self.analysisResultsLabel = QLabel("")
-        self.analysisResultsLabel.setStyleSheet("""
-            QLabel {
-                color: #bbb;
-                font: 14pt 'Segoe UI';
-                background-color: #1a1a1a;
-                border: 1px solid #333;
-                border-radius: 8px;
-                padding: 8px;
-                min-height: 50px;
-                width: 100%;
-                qproperty-wordWrap: true;
-            }
-        """)
+        self.analysisResultsLabel.setObjectName("analysisResultsLabel")
         self.analysisResultsLabel.setWordWrap(True)
         self.analysisResultsLabel.setContentsMargins(0, 5, 0, 5)
         self.analysisResultsLabel.setTextFormat(Qt.TextFormat.RichText)
         self.analysisResultsLabel.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.analysisResultsLabel.hide()  # Hidden by default
         contentLayout.addWidget(self.analysisResultsLabel)
+
+        # Waveform overview of the last downloaded file
+        self.waveformWidget = WaveformWidget(self.lightMode)
+        self.waveformWidget.hide()
+        contentLayout.addWidget(self.waveformWidget)
         
         # Analysis progress label
         self.analysisProgressLabel = QLabel("")
-        self.analysisProgressLabel.setStyleSheet("color: " + ("white" if not self.lightMode else "black") + "; font: italic 12pt 'Segoe UI';")
+        self.analysisProgressLabel.setObjectName("analysisProgressLabel")
         self.analysisProgressLabel.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.analysisProgressLabel.hide()  # Hidden by default
         contentLayout.addWidget(self.analysisProgressLabel)
@@ -1146,6 +4735,7 @@ class MainWindow(QMainWindow):
         # Store downloaded file path for analysis
         self.lastDownloadedFile = None
         self.audioAnalysisWorker = None
+        self.cancelledAnalysisWorkers = set()  # kept until their threads have stopped
         
         mainLayout.addWidget(contentWidget)
         self.setCentralWidget(self.backgroundWidget)
@@ -1167,18 +4757,31 @@ class MainWindow(QMainWindow):
         # Adjust window size for progress display
         self.adjustWindowSize()
         
-        # Terminate previous worker if running
+        # Cancel the previous worker if running, it stops at its next step and releases its memory itself
         if self.audioAnalysisWorker and self.audioAnalysisWorker.isRunning():
-            self.audioAnalysisWorker.terminate()
-            self.audioAnalysisWorker.wait()
+            previous = self.audioAnalysisWorker
+            for signal in (previous.analysis_progress, previous.analysis_complete, previous.analysis_error,
+                           previous.peaks_ready, previous.duplicate_found):
+                signal.disconnect()
+            previous.cancel()
+            self.cancelledAnalysisWorkers.add(previous)
+            previous.finished.connect(lambda: self.cancelledAnalysisWorkers.discard(previous))
         
         # Start analysis
         self.audioAnalysisWorker = AudioAnalysisWorker(self.lastDownloadedFile)
         self.audioAnalysisWorker.analysis_progress.connect(self.updateAnalysisProgress)
         self.audioAnalysisWorker.analysis_complete.connect(self.onAnalysisComplete)
         self.audioAnalysisWorker.analysis_error.connect(self.onAnalysisError)
+        self.audioAnalysisWorker.peaks_ready.connect(self.showWaveform)
+        self.audioAnalysisWorker.duplicate_found.connect(
+            lambda title: self.downloadStatusLabel.setText(f"Looks like a duplicate of \u201c{title}\u201d"))
         self.audioAnalysisWorker.start()
     
+    def showWaveform(self, file_path):
+        if file_path == self.lastDownloadedFile:
+            self.waveformWidget.setFile(file_path)
+            self.adjustWindowSize()
+
     def updateAnalysisProgress(self, message):
         """Update analysis progress message"""
         self.analysisProgressLabel.setText(message)
@@ -1186,6 +4789,7 @@ class MainWindow(QMainWindow):
     def onAnalysisComplete(self, bpm, key):
         """Handle completed audio analysis"""
         self.analysisProgressLabel.hide()
+        self.refreshLibraryView()
         
         # Format and display results - full width horizontal layout
         results_html = f"""
@@ -1233,10 +4837,12 @@ class MainWindow(QMainWindow):
 
         
         self.lastDownloadedFile = file_path
+        self.refreshLibraryView()
         
         # Hide previous analysis results
         self.analysisResultsLabel.hide()
         self.analysisProgressLabel.hide()
+        self.waveformWidget.setFile(file_path)
         
         # Only analyze audio files (not videos)
         if not file_path.lower().endswith('.mp4'):
@@ -1272,6 +4878,13 @@ class MainWindow(QMainWindow):
         # Add height for analysis progress
         if self.analysisProgressLabel.isVisible():
             extra_height += 40
+
+        if self.waveformWidget.isVisible():
+            extra_height += 80
+
+        # The first job row takes the place the progress bar had
+        if self.jobListView.isVisible():
+            extra_height += self.jobListView.height() - JobDelegate.ROW_HEIGHT
         
         # Calculate new height with some padding
         new_height = base_height + extra_height + 20
@@ -1283,55 +4896,64 @@ class MainWindow(QMainWindow):
         # Optional: Center the window after resize
         # self.centerWindow()
 
+    def updateJobListHeight(self):
+        """Show up to five job rows, the rest scroll"""
+        rows = min(self.jobModel.rowCount(), 5)
+        self.jobListView.setFixedHeight(rows * JobDelegate.ROW_HEIGHT + 2 * self.jobListView.frameWidth())
+        self.jobListView.setVisible(rows > 0)
+        self.adjustWindowSize()
+
     def initAudio(self):
-        self.audioPlayer = QMediaPlayer()
-        self.audioOutput = QAudioOutput()
-        self.audioPlayer.setAudioOutput(self.audioOutput)
-        
-        # Get the audio file path and check if it exists
-        wav_path = resource_path(os.path.join("music", "ooiiaa.mp3"))
-        
-        if os.path.exists(wav_path):
-            url = QUrl.fromLocalFile(os.path.abspath(wav_path))
-            self.audioPlayer.setSource(url)
-            self.audioOutput.setVolume(0.5)
-            
-            # Connect signals for error handling
-            self.audioPlayer.errorOccurred.connect(self.onAudioError)
-            
-            # Apply the saved mute state
-            self.audioOutput.setMuted(self.isMuted)
-            if self.isMuted:
-                self.muteButton.setText("Unmute")
-            else:
-                # Start playback if not muted
-                self.audioPlayer.play()
-                # Try with a delay in case immediate doesn't work
-                QTimer.singleShot(500, self.audioPlayer.play)
-                self.muteButton.setText("Mute")
-        else:
-            print(f"Warning: Audio file not found at {wav_path}")
-            self.muteButton.setText("Mute")
+        """The intro sound starts after the first paint, muted users never load the media backend"""
+        self.audioPlayer = None
+        self.audioOutput = None
+        self.audioPending = False
+        self.audioPath = resource_path(os.path.join("music", "ooiiaa.mp3"))
+        if not os.path.exists(self.audioPath):
+            print(f"Warning: Audio file not found at {self.audioPath}")
             # Disable audio functionality if file doesn't exist
-            self.audioPlayer = None
-            self.audioOutput = None
+            self.audioPath = None
+            self.muteButton.setText("Mute")
+            return
+        self.muteButton.setText("Unmute" if self.isMuted else "Mute")
+        # Picked up by eventFilter on the first paint of the window
+        self.audioPending = not self.isMuted
+
+    def startAudio(self):
+        """Create the media player on first use (this imports QtMultimedia) and play the intro sound"""
+        if self.audioPlayer is None:
+            try:
+                from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
+            except ImportError as e:
+                print(f"Audio unavailable: {e}")
+                self.audioPath = None
+                return
+            self.audioPlayer = QMediaPlayer(self)
+            self.audioOutput = QAudioOutput(self)
+            self.audioPlayer.setAudioOutput(self.audioOutput)
+            self.audioPlayer.errorOccurred.connect(self.onAudioError)
+            self.audioOutput.setVolume(0.5)
+            # play() before the source has loaded just starts once it has
+            self.audioPlayer.setSource(QUrl.fromLocalFile(os.path.abspath(self.audioPath)))
+        self.audioOutput.setMuted(self.isMuted)
+        self.audioPlayer.play()
 
     def toggleMute(self):
-        if self.audioOutput is None:
+        if self.audioPath is None:
             return  # No audio available
-            
-        if self.audioOutput.isMuted():
-            self.audioOutput.setMuted(False)
-            self.isMuted = False
-            # Need to explicitly start playback when unmuting
-            self.audioPlayer.play()
-            self.muteButton.setText("Mute")
+
+        self.isMuted = not self.isMuted
+        self.muteButton.setText("Unmute" if self.isMuted else "Mute")
+        if self.audioPlayer is None:
+            if not self.isMuted:
+                self.audioPending = False
+                self.startAudio()
         else:
-            self.audioOutput.setMuted(True)
-            self.isMuted = True
-            self.muteButton.setText("Unmute")
-        
-        # Save the mute state immediately
+            self.audioOutput.setMuted(self.isMuted)
+            if not self.isMuted:
+                # Need to explicitly start playback when unmuting
+                self.audioPlayer.play()
+
         self.settings.setValue("audioMuted", self.isMuted)
 
     def pasteFromClipboard(self):
@@ -1361,11 +4983,13 @@ class MainWindow(QMainWindow):
             self.downloaderLocInput.setText(folder)
             # Update the tooltip to show current vs default
             self.downloaderLocInput.setToolTip(f"Current: {folder}\nDefault: {self.getDefaultDownloadsFolder()}")
-            # Immediately save this preference
             self.settings.setValue("downloadDir", folder)
 
     def updateVideoInfo(self):
-        url = self.downloaderUrlInput.text().strip()
+        try:
+            url = split_url_and_range(self.downloaderUrlInput.text())[0]
+        except ValueError:
+            url = self.downloaderUrlInput.text().strip()
         if not url:
             self.videoInfoLabel.setText("")
             return
@@ -1387,23 +5011,29 @@ class MainWindow(QMainWindow):
 
 
     def startDownload(self):
-        url = self.downloaderUrlInput.text().strip()
+        try:
+            url, section = split_url_and_range(self.downloaderUrlInput.text())
+            if section is None and (self.sectionStartInput.text().strip() or self.sectionEndInput.text().strip()):
+                section = parse_time_range(f"{self.sectionStartInput.text().strip()}-{self.sectionEndInput.text().strip()}")
+        except ValueError as e:
+            self.downloadStatusLabel.setText(f"Invalid section: {e}")
+            return
         if not url:
             self.downloadStatusLabel.setText("Please enter a YouTube URL.")
             return
-        self.downloadProgressBar.setValue(0)
-        self.downloadProgressBar.show()
         self.downloadButton.setEnabled(False)
         self.downloadStatusLabel.setText("Starting download...")
         download_dir = self.downloaderLocInput.text()
-        format_type = self.formatDropdown.currentText().lower()
-        quality = self.qualityDropdown.currentText()
-        self.worker = DownloadWorker(url, download_dir, format_type=format_type, quality=quality)
-        self.worker.progress_signal.connect(lambda value: self.downloadProgressBar.setValue(int(value)))
+        # Playlists are bulk backlog and only get the bandwidth single downloads leave over
+        priority = PRIORITY_PLAYLIST if "list=" in url else PRIORITY_SINGLE
+        self.downloadQueue.markDone(url, section)
+        self.worker = self.createDownloadWorker(url, section, priority)
+        jobKey = f"manual:{next(self.manualJobIds)}"
+        self.jobModel.addJob(jobKey, url, JobListModel.RUNNING, first=True)
+        self.jobModel.track(jobKey, self.worker)
         self.worker.status_signal.connect(self.downloadStatusLabel.setText)
         self.worker.details_signal.connect(lambda details: self.downloadStatusLabel.setText(f"{self.downloadStatusLabel.text()} | {details}"))
         self.worker.error_signal.connect(lambda err: self.downloadStatusLabel.setText(f"Error: {err}"))
-        self.worker.finished_signal.connect(lambda: self.downloadStatusLabel.setText("Download completed!"))
         self.worker.finished_signal.connect(lambda: self.downloadButton.setEnabled(True))
         self.worker.file_downloaded_signal.connect(self.onFileDownloaded)
         if self.openFolderAfterDownload:
@@ -1411,6 +5041,19 @@ class MainWindow(QMainWindow):
         self.worker.error_signal.connect(lambda err: self.downloadButton.setEnabled(True))
         self.worker.start()
 
+    def createDownloadWorker(self, url, section, priority):
+        """A DownloadWorker with the current format, quality and folder settings"""
+        return DownloadWorker(url, self.downloaderLocInput.text(), format_type=self.formatDropdown.currentText().lower(),
+                              quality=self.qualityDropdown.currentText(), priority=priority, section=section,
+                              skip_duplicates=self.skipDuplicates, loudness_target=self.loudnessTarget or None)
+
+    def onQueuedFileDownloaded(self, file_path):
+        self.refreshLibraryView()
+
+    def onQueueStatus(self, text):
+        self.queueStatusLabel.setText(text)
+        self.queueStatusLabel.setVisible(bool(text))
+
     def openDownloadFolder(self, folder):
         try:
             os.startfile(folder)
@@ -1426,28 +5069,76 @@ class MainWindow(QMainWindow):
             btn_pos = self.titleBar.optionsButton.mapToGlobal(QPoint(0, self.titleBar.optionsButton.height()))
             self.optionsWidget.lightModeCheck.setChecked(self.lightMode)
             self.optionsWidget.openFolderCheck.setChecked(self.openFolderAfterDownload)
-            self.optionsWidget.updateStyleMode()
+            self.optionsWidget.setIngestion(self.watchFolder, self.watchClipboard)
             self.optionsWidget.move(btn_pos)
             self.optionsWidget.show()
 
+    def toggleDiagnostics(self):
+        if self.diagnosticsWidget is None:
+            self.diagnosticsWidget = DiagnosticsWidget()
+        if self.diagnosticsWidget.isVisible():
+            self.diagnosticsWidget.hide()
+        else:
+            self.diagnosticsWidget.show()
+            self.diagnosticsWidget.raise_()
+
+    def toggleLibrary(self):
+        if self.libraryWidget is None:
+            self.libraryWidget = LibraryWidget(self)
+        if self.libraryWidget.isVisible():
+            self.libraryWidget.hide()
+        else:
+            self.libraryWidget.show()
+            self.libraryWidget.raise_()
+
+    def refreshLibraryView(self):
+        if self.libraryWidget and self.libraryWidget.isVisible():
+            self.libraryWidget.refresh()
+
+    def chooseWatchFolder(self):
+        if self.optionsWidget:
+            self.optionsWidget.hide()
+        folder = QFileDialog.getExistingDirectory(
+            self, "Select Folder to Watch for Link Lists",
+            self.watchFolder if os.path.isdir(self.watchFolder) else self.getDefaultDownloadsFolder(),
+            QFileDialog.Option.ShowDirsOnly)
+        if folder:
+            self.setIngestion(folder, self.watchClipboard)
+
+    def setIngestion(self, watch_folder, watch_clipboard):
+        """Start or stop queueing links from a watched folder and the clipboard"""
+        self.watchFolder = watch_folder
+        self.watchClipboard = watch_clipboard
+        self.downloadQueue.configure(watch_folder, watch_clipboard)
+        self.saveSettings()
+        if self.optionsWidget:
+            self.optionsWidget.setIngestion(watch_folder, watch_clipboard)
+
     def setOptions(self, light_mode, open_folder_after_download, auto_analyze=None):
         self.lightMode = light_mode
         self.openFolderAfterDownload = open_folder_after_download
         if auto_analyze is not None:
             self.autoAnalyze = auto_analyze
+            if hasattr(self, "downloadQueue"):
+                self.downloadQueue.auto_analyze = auto_analyze
 
-        
-        # Save settings immediately when they change
+        # Only keys that changed are written, batched by the settings store
         self.saveSettings()
-        
+
         self.updateStyles()
         if self.optionsWidget and self.optionsWidget.isVisible():
             self.optionsWidget.lightModeCheck.setChecked(self.lightMode)
             self.optionsWidget.openFolderCheck.setChecked(self.openFolderAfterDownload)
             self.optionsWidget.autoAnalyzeCheck.setChecked(self.autoAnalyze)
-            self.optionsWidget.updateStyleMode()
+        self.waveformWidget.setLightMode(self.lightMode)
+        self.jobDelegate.setLightMode(self.lightMode)
+        self.jobListView.viewport().update()
 
     def eventFilter(self, obj, event):
+        if self.audioPending and event.type() == QEvent.Type.Paint:
+            # The window is on screen, the media backend can load without delaying it
+            self.audioPending = False
+            QTimer.singleShot(0, self.startAudio)
         # If a mouse button is pressed outside the URL field, clear its focus.
         if event.type() == QEvent.Type.MouseButtonPress:
             if self.downloaderUrlInput.hasFocus():
@@ -1462,84 +5153,13 @@ class MainWindow(QMainWindow):
         return super().eventFilter(obj, event)
 
     def updateStyles(self):
-        if self.lightMode:
-            self.setLightStyles()
-        else:
-            self.setDarkStyles()
-        self.backgroundWidget.bg_color = QColor(self.bgColor)
+        """Apply the cached stylesheet of the current theme to the whole application"""
+        if self.appliedTheme == self.lightMode:
+            return
+        self.appliedTheme = self.lightMode
+        self.backgroundWidget.bg_color = QColor(THEME_COLORS[self.lightMode]["window"])
         self.backgroundWidget.update()
-        self.titleBar.setStyleSheet("background-color: " + self.titleBarBg + ";")
-        self.titleBar.optionsButton.setStyleSheet(self.optionsBtnStyle)
-        self.titleBar.titleLabel.setStyleSheet(self.titleLabelStyle)
-        self.titleBar.btnMinimize.setStyleSheet(self.minimizeBtnStyle)
-        self.titleBar.btnClose.setStyleSheet(self.closeBtnStyle)
-        self.downloaderLocInput.setStyleSheet(self.lineEditStyle)
-        self.downloaderUrlInput.setStyleSheet(self.lineEditStyle)
-        self.formatDropdown.setStyleSheet(self.currentDropdownStyle)
-        self.qualityDropdown.setStyleSheet(self.currentDropdownStyle)
-        self.fileTypeLabel.setStyleSheet("color: " + ("white" if not self.lightMode else "black") + "; font: 13pt 'Segoe UI';")
-        self.qualityLabel.setStyleSheet("color: " + ("white" if not self.lightMode else "black") + "; font: 13pt 'Segoe UI';")
-        self.videoInfoLabel.setStyleSheet("color: " + ("#ddd" if not self.lightMode else "#333") + "; font: 10pt 'Segoe UI';")
-        self.downloadStatusLabel.setStyleSheet("color: " + ("white" if not self.lightMode else "black") + "; font: bold 14pt 'Segoe UI';")
-        if self.lightMode:
-            self.pasteButton.setStyleSheet("""
-                QPushButton {
-                    background-color: #ffffff;
-                    color: black;
-                    border: 2px solid #ccc;
-                    padding: 10px 15px;
-                    border-radius: 5px;
-                    font: 12pt 'Segoe UI';
-                }
-                QPushButton:hover { background-color: #ddd; }
-                QPushButton:pressed { background-color: #bbb; }
-            """)
-            self.muteButton.setStyleSheet("""
-                QPushButton {
-                    background-color: #ffffff;
-                    color: black;
-                    border: 2px solid #ccc;
-                    border-radius: 8px;
-                    font: bold 12pt 'Segoe UI';
-                }
-                QPushButton:hover { background-color: #ddd; }
-                QPushButton:pressed { background-color: #bbb; }
-            """)
-            self.titleBar.optionsButton.setStyleSheet("""
-                QPushButton {
-                    background-color: transparent;
-                    color: black;
-                    border: none;
-                    font: 16pt 'Segoe UI';
-                }
-                QPushButton:hover { background-color: #ddd; }
-                QPushButton:pressed { background-color: #bbb; }
-            """)
-        else:
-            self.pasteButton.setStyleSheet("""
-                QPushButton {
-                    background-color: #161616;
-                    color: white;
-                    border: 2px solid #333;
-                    padding: 10px 15px;
-                    border-radius: 5px;
-                    font: 12pt 'Segoe UI';
-                }
-                QPushButton:hover { background-color: #2a2a2a; }
-                QPushButton:pressed { background-color: #444; }
-            """)
-            self.muteButton.setStyleSheet("""
-                QPushButton {
-                    background-color: #161616;
-                    color: white;
-                    border: 2px solid #333;
-                    border-radius: 8px;
-                    font: bold 12pt 'Segoe UI';
-                }
-                QPushButton:hover { background-color: #2a2a2a; }
-                QPushButton:pressed { background-color: #444; }
-            """)
-            self.titleBar.optionsButton.setStyleSheet(self.optionsBtnStyle)
+        QApplication.instance().setStyleSheet(THEME_STYLESHEETS[self.lightMode])
 
     def onAudioError(self, error):
         """Callback for audio errors"""
@@ -1547,6 +5167,19 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         self.saveSettings()
+        self.settings.flush(wait=True)
+        self.downloadQueue.stop()
+        for worker in [self.audioAnalysisWorker, *self.cancelledAnalysisWorkers]:
+            if worker and worker.isRunning():
+                worker.cancel()
+                worker.wait(3000)
+        youtube_dl_pool.close_all()
+        metrics.shutdown()
+        if self.diagnosticsWidget:
+            self.diagnosticsWidget.close()
+        if self.libraryWidget:
+            self.libraryWidget.close()
+        track_library.close()
         event.accept()
 
 
@@ -1580,6 +5213,9 @@ if __name__ == '__main__':
     app.setWindowIcon(QIcon(resource_path(os.path.join("UI_Photos", "favicon.ico"))))
     window = MainWindow()
     window.show()
+    # Build reports time a start that quits as soon as the window is up
+    if os.environ.get("WAVER_EXIT_AFTER_START"):
+        QTimer.singleShot(0, app.quit)
     if sys.platform == "win32":
         GCL_HICON = -14
         GCL_HICONSM = -34
@@ -1,7 +1,15 @@
 # -*- mode: python ; coding: utf-8 -*-
 # Waver v1.1.0 PyInstaller Specification (Simplified)
 
-# Basic data files
+import os
+import json
+
+# "full" (default) or "slim". The slim profile leaves out what the import audit
+# (python build_profile.py audit) saw unused at runtime, see build_profile.py
+PROFILE = os.environ.get('WAVER_BUILD_PROFILE', 'full')
+AUDIT_FILE = os.path.join(SPECPATH, 'build_audit', 'import_audit.json')
+
+# Basic data files, FFmpeg extras are only bundled if present (the bootstrap only installs the binaries)
 datas = [
     ('music', 'music'),
     ('UI_Photos', 'UI_Photos'),
@@ -9,6 +17,7 @@ datas = [
     ('ffmpeg_bin/doc', 'ffmpeg_bin/doc'),
     ('ffmpeg_bin/presets', 'ffmpeg_bin/presets'),
     ('ffmpeg_bin/LICENSE', 'ffmpeg_bin/'),
+    ('ffmpeg_bin/LICENSE.txt', 'ffmpeg_bin/'),
     ('ffmpeg_bin/README.txt', 'ffmpeg_bin/'),
     ('README.md', '.'),
     ('CHANGELOG.md', '.'),
@@ -16,6 +25,9 @@ datas = [
     ('VERSION', '.'),
     ('requirements.txt', '.'),
 ]
+datas = [(src, dest) for src, dest in datas if os.path.exists(src)]
+if PROFILE == 'slim':
+    datas = [(src, dest) for src, dest in datas if src not in ('ffmpeg_bin/doc', 'ffmpeg_bin/presets')]
 
 # Essential hidden imports
 hiddenimports = [
@@ -40,6 +52,24 @@ hiddenimports = [
     'soxr',
 ]
 
+excludes = [
+    'matplotlib',
+    'tkinter',
+    'PIL',
+    'pandas',
+    'sklearn',
+    'jupyter',
+    'IPython',
+    'pytest',
+    'sphinx',
+]
+
+if PROFILE == 'slim':
+    with open(AUDIT_FILE, encoding='utf-8') as f:
+        audit = json.load(f)
+    hiddenimports = [name for name in hiddenimports if name not in audit['unused']]
+    excludes += audit['excludes']
+
 # Analysis
 a = Analysis(
     ['Waver.py'],
@@ -50,17 +80,7 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[
-        'matplotlib',
-        'tkinter',
-        'PIL',
-        'pandas',
-        'sklearn',
-        'jupyter',
-        'IPython',
-        'pytest',
-        'sphinx',
-    ],
+    excludes=excludes,
     noarchive=False,
 )
 
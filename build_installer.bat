@@ -56,7 +56,8 @@ for %%f in (*.spec) do (
 echo.
 echo Step 5: Building executable with PyInstaller...
 echo ================================================
-pyinstaller Waver.spec --clean --noconfirm
+REM Slim profile: audits runtime imports first, reports bundle size and startup time after
+python build_profile.py build --profile slim
 
 REM Check if build was successful
 if not exist "dist\Waver_v1.1.0\Waver.exe" (
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Waver Build Profiles
+Audits which modules Waver imports at runtime, builds the full or slim PyInstaller
+profile and reports bundle size and cold-start time per build
+"""
+
+import os
+import sys
+import json
+import time
+import pkgutil
+import platform
+import argparse
+import statistics
+import subprocess
+import importlib.util
+from datetime import datetime
+
+AUDIT_DIR = "build_audit"
+AUDIT_FILE = os.path.join(AUDIT_DIR, "import_audit.json")
+REPORT_FILE = os.path.join(AUDIT_DIR, "build_report.json")
+HISTORY_FILE = os.path.join(AUDIT_DIR, "build_history.jsonl")
+DIST_DIR = os.path.join("dist", "Waver_v1.1.0")
+
+# Top-level packages that are only bundled in the slim profile if the audit saw them imported
+OPTIONAL_PACKAGES = [
+    "numba", "llvmlite", "joblib", "resampy", "pooch", "soundfile", "audioread", "soxr",
+    "lazy_loader", "msgpack", "sklearn", "requests", "urllib3", "certifi", "packaging",
+]
+
+# Packages whose unused subpackages are left out of the slim profile
+SPLIT_PACKAGES = ["scipy", "numba", "librosa", "PyQt6"]
+
+# Never left out: used by code paths the audit session can't reach
+ALWAYS_KEEP = {
+    "PyQt6.sip",
+    "PyQt6.QtSvg",  # stylesheet icons are SVG data URIs
+    # The intro sound imports these lazily, and only when the media backend loads on the build machine
+    "PyQt6.QtMultimedia",
+    "PyQt6.QtMultimediaWidgets",
+}
+
+STARTUP_RUNS = 3
+
+
+def write_test_tone(path, seconds=12, sr=22050, bpm=120):
+    """Clicks on every beat over a quiet sine, enough for tempo and key detection"""
+    import math
+    import wave
+    from array import array
+
+    samples = array("h")
+    beat = int(sr * 60 / bpm)
+    for i in range(seconds * sr):
+        value = 0.2 * math.sin(2 * math.pi * 440 * i / sr)
+        if i % beat < 200:
+            value += 0.6 * math.exp(-(i % beat) / 40)
+        samples.append(int(max(-1.0, min(1.0, value)) * 32767))
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sr)
+        f.writeframes(samples.tobytes())
+
+
+def exercise(output):
+    """Drive Waver through its main code paths and record what got imported.
+
+    Runs in a fresh interpreter (see audit), with Qt's test paths so the
+    user's library and caches are left alone.
+    """
+    import tempfile
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtCore import QStandardPaths
+    QStandardPaths.setTestModeEnabled(True)
+
+    start = time.perf_counter()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import Waver
+    from PyQt6.QtWidgets import QApplication
+    app = QApplication(sys.argv)
+    window = Waver.MainWindow()
+    window.show()
+    app.processEvents()
+    startup = time.perf_counter() - start
+
+    # The intro sound's media backend is only loaded when it plays
+    if window.audioPath:
+        window.isMuted = True
+        window.startAudio()
+    for toggle in (window.toggleOptions, window.toggleDiagnostics, window.toggleLibrary):
+        toggle()
+        app.processEvents()
+        toggle()
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "audit.wav")
+        write_test_tone(path)
+        worker = Waver.AudioAnalysisWorker(path)
+        errors = []
+        worker.analysis_error.connect(errors.append)
+        worker.run()
+        app.processEvents()
+        if errors:
+            print(f"⚠ Analysis failed during the audit: {errors[0]}")
+        window.showWaveform(path)
+        app.processEvents()
+        Waver.track_library.search_ids("bpm:100-140")
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"modules": sorted(sys.modules), "startup_seconds": startup}, f)
+    os._exit(0)
+
+
+def parse_import_times(stderr):
+    """Cumulative milliseconds of the first import of each top-level package (-X importtime)"""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        name = name.strip()
+        try:
+            micros = int(cumulative.split()[-1])
+        except (ValueError, IndexError):
+            continue
+        if "." not in name:
+            times[name] = max(times.get(name, 0), micros / 1000)
+    return times
+
+
+def submodules(package):
+    """(name, is_package) of the direct submodules of an installed package, without importing them"""
+    try:
+        spec = importlib.util.find_spec(package)
+    except (ImportError, ValueError):
+        return []
+    if spec is None or not spec.submodule_search_locations:
+        return []
+    return [(f"{package}.{info.name}", info.ispkg) for info in pkgutil.iter_modules(spec.submodule_search_locations)]
+
+
+def slim_excludes(modules):
+    """Modules the slim profile leaves out: everything audited as unused, except ALWAYS_KEEP"""
+    imported = set(modules)
+    top_level = {name.split(".")[0] for name in imported}
+    excludes = [name for name in OPTIONAL_PACKAGES if name not in top_level]
+    for package in SPLIT_PACKAGES:
+        if package not in top_level:
+            continue
+        for name, is_package in submodules(package):
+            if name.split(".")[-1].startswith("_") or name in ALWAYS_KEEP:
+                continue
+            if name not in imported:
+                excludes.append(name)
+            elif is_package:
+                # Test suites of used subpackages are never imported by the app
+                excludes += [child for child, _ in submodules(name)
+                             if child.endswith(".tests") and child not in imported]
+    return sorted(set(excludes))
+
+
+def audit():
+    """Run the audit session and write AUDIT_FILE, returns the audit"""
+    print("🔍 Auditing runtime imports...")
+    os.makedirs(AUDIT_DIR, exist_ok=True)
+    session = os.path.join(AUDIT_DIR, "session.json")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(__file__), "exercise", session],
+        capture_output=True, text=True, timeout=600,
+    )
+    if result.returncode != 0 or not os.path.exists(session):
+        print(result.stdout)
+        print(result.stderr[-4000:])
+        raise RuntimeError("the audit session failed")
+    with open(session, encoding="utf-8") as f:
+        data = json.load(f)
+    os.remove(session)
+
+    import_ms = parse_import_times(result.stderr)
+    data.update({
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "excludes": slim_excludes(data["modules"]),
+        "unused": [name for name in OPTIONAL_PACKAGES if name not in {m.split(".")[0] for m in data["modules"]}],
+        "import_ms": dict(sorted(import_ms.items(), key=lambda item: -item[1])[:15]),
+    })
+    with open(AUDIT_FILE, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+
+    print(f"✓ {len(data['modules'])} modules imported, startup {data['startup_seconds']:.2f}s (from source)")
+    print(f"  Unused optional packages: {', '.join(data['unused']) or 'none'}")
+    print(f"  Left out of the slim profile: {len(data['excludes'])} modules")
+    print("  Slowest imports:")
+    for name, ms in list(data["import_ms"].items())[:8]:
+        print(f"    {name:<20} {ms:8.0f} ms")
+    return data
+
+
+def build(profile):
+    """Build the given profile with PyInstaller, returns True on success"""
+    if profile == "slim":
+        audit()
+    print(f"\n🛠 Building the {profile} profile...")
+    env = dict(os.environ, WAVER_BUILD_PROFILE=profile)
+    result = subprocess.run([sys.executable, "-m", "PyInstaller", "Waver.spec", "--clean", "--noconfirm"], env=env)
+    return result.returncode == 0
+
+
+def folder_size(path):
+    total = count = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+            count += 1
+    return total, count
+
+
+def measure_startup(exe, runs=STARTUP_RUNS):
+    """Seconds from launch until the main window is up, first run is the cold one"""
+    env = dict(os.environ, WAVER_EXIT_AFTER_START="1")
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([exe], env=env, timeout=120, capture_output=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def report(profile, dist_dir=DIST_DIR):
+    """Measure the built bundle, append it to the history and print it next to the previous build"""
+    exe = os.path.join(dist_dir, "Waver.exe" if sys.platform == "win32" else "Waver")
+    if not os.path.exists(exe):
+        print(f"❌ No build found at {exe}")
+        return None
+    total, count = folder_size(dist_dir)
+    # PyInstaller 6 keeps everything but the executable in _internal
+    content_dir = os.path.join(dist_dir, "_internal")
+    if not os.path.isdir(content_dir):
+        content_dir = dist_dir
+    largest = []
+    for name in os.listdir(content_dir):
+        path = os.path.join(content_dir, name)
+        largest.append((name, folder_size(path)[0] if os.path.isdir(path) else os.path.getsize(path)))
+    largest.sort(key=lambda item: -item[1])
+
+    print("\n⏱ Measuring startup...")
+    startup = measure_startup(exe)
+    entry = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "profile": profile,
+        "bundle_bytes": total,
+        "files": count,
+        "cold_start_seconds": round(startup[0], 3),
+        "warm_start_seconds": round(statistics.median(startup[1:] or startup), 3),
+        "largest": [[name, size] for name, size in largest[:10]],
+    }
+
+    previous = None
+    if os.path.exists(HISTORY_FILE):
+        with open(HISTORY_FILE, encoding="utf-8") as f:
+            history = [json.loads(line) for line in f if line.strip()]
+        previous = history[-1] if history else None
+    os.makedirs(AUDIT_DIR, exist_ok=True)
+    with open(HISTORY_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    with open(REPORT_FILE, "w", encoding="utf-8") as f:
+        json.dump(entry, f, indent=1)
+
+    print(f"\n📊 {profile} build: {total / 1024 ** 2:.1f} MB in {count} files, "
+          f"cold start {entry['cold_start_seconds']:.2f}s, warm start {entry['warm_start_seconds']:.2f}s")
+    if previous:
+        print(f"  Previous ({previous['profile']}, {previous['time']}): "
+              f"{(total - previous['bundle_bytes']) / 1024 ** 2:+.1f} MB, "
+              f"cold start {entry['cold_start_seconds'] - previous['cold_start_seconds']:+.2f}s")
+    print("  Largest entries:")
+    for name, size in largest[:10]:
+        print(f"    {name:<30} {size / 1024 ** 2:8.1f} MB")
+    return entry
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "exercise":
+        exercise(sys.argv[2])
+
+    parser = argparse.ArgumentParser(description="Audit, build and measure Waver bundles")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("audit", help=f"Record the modules imported at runtime in {AUDIT_FILE}")
+    build_parser = sub.add_parser("build", help="Build with PyInstaller and report size and startup time")
+    build_parser.add_argument("--profile", choices=["full", "slim"], default="slim")
+    report_parser = sub.add_parser("report", help="Report size and startup time of the current build")
+    report_parser.add_argument("--profile", choices=["full", "slim"], default="slim")
+    args = parser.parse_args()
+
+    if args.command == "audit":
+        audit()
+    elif args.command == "build":
+        if not build(args.profile):
+            print("❌ PyInstaller build failed")
+            sys.exit(1)
+        sys.exit(0 if report(args.profile) else 1)
+    else:
+        sys.exit(0 if report(args.profile) else 1)
@@ -7,12 +7,7 @@ Handles FFmpeg download and dependency management for developers
 import os
 import sys
 import subprocess
-import urllib.request
-import zipfile
-import shutil
-import platform
-import time
-from pathlib import Path
+from ffmpeg_bootstrap import install_ffmpeg
 
 def check_python_version():
     """Check if Python version is sufficient"""
@@ -75,117 +70,9 @@ def install_dependencies():
         return False
 
 def download_ffmpeg():
-    """Download and extract FFmpeg binaries"""
+    """Download FFmpeg binaries (resumable, checksum verified)"""
     print("\n🎬 Setting up FFmpeg...")
-    
-    ffmpeg_dir = "ffmpeg_bin"
-    ffmpeg_exe = os.path.join(ffmpeg_dir, "bin", "ffmpeg.exe")
-    
-    if os.path.exists(ffmpeg_exe):
-        print(f"✓ FFmpeg already exists at {ffmpeg_exe}")
-        return True
-    
-    # Determine platform and URL
-    system = platform.system().lower()
-    if system == "windows":
-        url = "https://github.com/BtbN/FFmpeg-Builds/releases/download/latest/ffmpeg-master-latest-win64-gpl.zip"
-        executable = "ffmpeg.exe"
-    else:
-        print(f"⚠ Platform {system} not supported for automatic FFmpeg download")
-        print("Please install FFmpeg manually and place it in ffmpeg_bin/bin/")
-        return False
-    
-    try:
-        print("Downloading FFmpeg (this may take a while)...")
-        
-        # Create directories
-        os.makedirs(ffmpeg_dir, exist_ok=True)
-        
-        # Download with retry logic and better HTTPS handling
-        zip_path = "ffmpeg_temp.zip"
-        
-        # Setup SSL context for better HTTPS handling
-        import ssl
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        
-        # Create request with user agent
-        request = urllib.request.Request(url, headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-        
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                print(f"Download attempt {attempt + 1}/{max_retries}...")
-                with urllib.request.urlopen(request, context=ssl_context) as response:
-                    total_size = int(response.headers.get('content-length', 0))
-                    block_size = 8192
-                    downloaded = 0
-                    
-                    with open(zip_path, 'wb') as f:
-                        while True:
-                            block = response.read(block_size)
-                            if not block:
-                                break
-                            f.write(block)
-                            downloaded += len(block)
-                            if total_size > 0:
-                                percent = (downloaded / total_size) * 100
-                                print(f"\rProgress: {percent:.1f}%", end="", flush=True)
-                break  # Success, exit retry loop
-            except Exception as e:
-                print(f"\nDownload attempt {attempt + 1} failed: {e}")
-                if attempt == max_retries - 1:
-                    raise  # Re-raise on final attempt
-                time.sleep(2)  # Wait before retry
-        
-        print("\n📦 Extracting FFmpeg...")
-        
-        # Extract
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall("temp_ffmpeg")
-        
-        # Find extracted folder
-        temp_dir = Path("temp_ffmpeg")
-        extracted_folders = [f for f in temp_dir.iterdir() if f.is_dir()]
-        
-        if not extracted_folders:
-            raise Exception("No folders found in extracted archive")
-        
-        source_dir = extracted_folders[0]
-        
-        # Copy files
-        dirs_to_copy = ["bin", "doc", "presets"]
-        for dir_name in dirs_to_copy:
-            src = source_dir / dir_name
-            dst = Path(ffmpeg_dir) / dir_name
-            if src.exists():
-                shutil.copytree(src, dst, dirs_exist_ok=True)
-        
-        # Copy license files
-        for file_name in ["LICENSE", "README.txt"]:
-            src = source_dir / file_name
-            dst = Path(ffmpeg_dir) / file_name
-            if src.exists():
-                shutil.copy2(src, dst)
-        
-        # Cleanup
-        os.remove(zip_path)
-        shutil.rmtree("temp_ffmpeg")
-        
-        print("✓ FFmpeg setup completed successfully")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error setting up FFmpeg: {e}")
-        # Cleanup on error
-        if os.path.exists(zip_path):
-            os.remove(zip_path)
-        if os.path.exists("temp_ffmpeg"):
-            shutil.rmtree("temp_ffmpeg")
-        return False
+    return install_ffmpeg()
 
 def setup_development_environment():
     """Set up the development environment"""
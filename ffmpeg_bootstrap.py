@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Waver FFmpeg Bootstrap
+Downloads the FFmpeg build with parallel range requests, resumes partial
+downloads, verifies the SHA-256 checksum and extracts only the binaries Waver needs
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import platform
+import threading
+import urllib.error
+import urllib.request
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+FFMPEG_URL = "https://github.com/BtbN/FFmpeg-Builds/releases/download/latest/ffmpeg-master-latest-win64-gpl.zip"
+CHECKSUM_URL = "https://github.com/BtbN/FFmpeg-Builds/releases/download/latest/checksums.sha256"
+FFMPEG_DIR = "ffmpeg_bin"
+
+# Archive members Waver uses, by path below the archive's top folder
+NEEDED_FILES = ("bin/ffmpeg.exe", "bin/ffprobe.exe", "LICENSE.txt")
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+CONNECTIONS = 4
+PART_SIZE = 4 * 1024 * 1024
+MAX_RETRIES = 3
+BLOCK_SIZE = 256 * 1024
+TIMEOUT = 30
+
+
+class BootstrapError(Exception):
+    pass
+
+
+def open_url(url, start=None, end=None):
+    headers = {"User-Agent": USER_AGENT}
+    if start is not None:
+        headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+    return urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=TIMEOUT)
+
+
+def probe(url):
+    """Final URL after redirects, total size and whether byte ranges are served"""
+    with open_url(url, 0, 0) as response:
+        final_url = response.geturl()
+        content_range = response.headers.get("Content-Range", "")
+        if response.status == 206 and "/" in content_range and not content_range.endswith("/*"):
+            return final_url, int(content_range.rsplit("/", 1)[1]), True
+        length = response.headers.get("Content-Length")
+        return final_url, int(length) if length else None, False
+
+
+def fetch_checksum(checksum_url, file_name):
+    """Expected SHA-256 of file_name from a sha256sum style listing, None if unavailable"""
+    try:
+        with open_url(checksum_url) as response:
+            listing = response.read().decode("utf-8", "replace")
+    except (urllib.error.URLError, OSError) as e:
+        print(f"⚠ Could not fetch checksums ({e}), the download will not be verified")
+        return None
+    for line in listing.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[1].lstrip("*") == file_name:
+            return parts[0].lower()
+    print(f"⚠ No checksum listed for {file_name}, the download will not be verified")
+    return None
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RangeDownload:
+    """Downloads a file in parts over several connections into <dest>.part.
+
+    Finished parts are recorded in <dest>.part.json, so an interrupted download
+    only fetches the missing parts next time.
+    """
+    def __init__(self, url, dest, size, connections=CONNECTIONS, part_size=PART_SIZE):
+        self.url = url
+        self.dest = dest
+        self.size = size
+        self.connections = connections
+        self.part_size = part_size
+        self.part_path = dest + ".part"
+        self.state_path = dest + ".part.json"
+        self.parts = [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+        self.done = set()
+        self.lock = threading.Lock()
+        self.downloaded = 0
+
+    def load_state(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (state.get("size") == self.size and state.get("part_size") == self.part_size
+                and os.path.exists(self.part_path) and os.path.getsize(self.part_path) == self.size):
+            self.done = set(state.get("done", []))
+
+    def save_state(self):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"size": self.size, "part_size": self.part_size, "done": sorted(self.done)}, f)
+        os.replace(tmp, self.state_path)
+
+    def run(self):
+        self.load_state()
+        if not self.done:
+            with open(self.part_path, "wb") as f:
+                f.truncate(self.size)
+        self.downloaded = sum(end - start + 1 for i, (start, end) in enumerate(self.parts) if i in self.done)
+        if self.done:
+            print(f"Resuming, {self.downloaded / self.size * 100:.1f}% already downloaded")
+        missing = [i for i in range(len(self.parts)) if i not in self.done]
+        with ThreadPoolExecutor(max_workers=self.connections) as pool:
+            for _ in pool.map(self.fetch_part, missing):
+                pass
+        print()
+
+    def fetch_part(self, index):
+        start, end = self.parts[index]
+        for attempt in range(MAX_RETRIES):
+            written = 0
+            try:
+                with open_url(self.url, start, end) as response, open(self.part_path, "r+b") as f:
+                    if response.status != 206:
+                        raise BootstrapError(f"server ignored the range request (HTTP {response.status})")
+                    f.seek(start)
+                    while True:
+                        block = response.read(BLOCK_SIZE)
+                        if not block:
+                            break
+                        f.write(block)
+                        written += len(block)
+                        self.report(len(block))
+                if written != end - start + 1:
+                    raise BootstrapError(f"part {index} ended after {written} of {end - start + 1} bytes")
+                with self.lock:
+                    self.done.add(index)
+                    self.save_state()
+                return
+            except (urllib.error.URLError, OSError, BootstrapError) as e:
+                self.report(-written)
+                if attempt == MAX_RETRIES - 1:
+                    raise BootstrapError(f"part {index} failed after {MAX_RETRIES} attempts: {e}")
+                time.sleep(2 ** attempt)
+
+    def report(self, count):
+        with self.lock:
+            self.downloaded += count
+            print(f"\rProgress: {self.downloaded / self.size * 100:.1f}%", end="", flush=True)
+
+
+def download_stream(url, dest):
+    """Single connection download for servers without range support"""
+    part_path = dest + ".part"
+    for attempt in range(MAX_RETRIES):
+        try:
+            with open_url(url) as response, open(part_path, "wb") as f:
+                total = int(response.headers.get("Content-Length") or 0)
+                downloaded = 0
+                for block in iter(lambda: response.read(BLOCK_SIZE), b""):
+                    f.write(block)
+                    downloaded += len(block)
+                    if total:
+                        print(f"\rProgress: {downloaded / total * 100:.1f}%", end="", flush=True)
+            print()
+            return part_path
+        except (urllib.error.URLError, OSError) as e:
+            print(f"\nDownload attempt {attempt + 1} failed: {e}")
+            if attempt == MAX_RETRIES - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def download(url, dest, sha256=None, connections=CONNECTIONS, part_size=PART_SIZE):
+    """Download url to dest, resuming a previous partial download of it.
+
+    The file only appears at dest once it is complete and matches sha256 (if given).
+    """
+    final_url, size, ranges = probe(url)
+    if ranges and size:
+        RangeDownload(final_url, dest, size, connections, part_size).run()
+        part_path = dest + ".part"
+    else:
+        part_path = download_stream(final_url, dest)
+    if sha256:
+        actual = file_sha256(part_path)
+        if actual != sha256.lower():
+            # A corrupt part would be resumed again, start over next time
+            for path in (part_path, dest + ".part.json"):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise BootstrapError(f"checksum mismatch: expected {sha256}, got {actual}")
+        print("✓ Checksum verified")
+    os.replace(part_path, dest)
+    if os.path.exists(dest + ".part.json"):
+        os.remove(dest + ".part.json")
+    return dest
+
+
+def extract_needed(zip_path, target_dir, needed=NEEDED_FILES):
+    """Extract only the needed members straight to target_dir, returns the paths written"""
+    written = []
+    with zipfile.ZipFile(zip_path) as archive:
+        for info in archive.infolist():
+            # Builds wrap everything in one top folder named after the build
+            relative = info.filename.split("/", 1)[1] if "/" in info.filename else info.filename
+            if info.is_dir() or relative not in needed:
+                continue
+            target = os.path.join(target_dir, *relative.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = target + ".tmp"
+            with archive.open(info) as src, open(tmp, "wb") as dst:
+                for block in iter(lambda: src.read(BLOCK_SIZE), b""):
+                    dst.write(block)
+            os.replace(tmp, target)
+            written.append(target)
+    missing = set(needed) - {os.path.relpath(path, target_dir).replace(os.sep, "/") for path in written}
+    if any(name.startswith("bin/") for name in missing):
+        raise BootstrapError(f"archive is missing {', '.join(sorted(missing))}")
+    return written
+
+
+def install_ffmpeg(target_dir=FFMPEG_DIR, url=None, checksum_url=CHECKSUM_URL, sha256=None):
+    """Download and install the FFmpeg binaries into target_dir, returns True on success"""
+    ffmpeg_exe = os.path.join(target_dir, "bin", "ffmpeg.exe")
+    if os.path.exists(ffmpeg_exe):
+        print(f"✓ FFmpeg already exists at {ffmpeg_exe}")
+        return True
+
+    if url is None:
+        if platform.system().lower() != "windows":
+            print(f"⚠ Platform {platform.system().lower()} not supported for automatic FFmpeg download")
+            print("Please install FFmpeg manually and place it in ffmpeg_bin/bin/")
+            return False
+        url = FFMPEG_URL
+
+    zip_path = os.path.basename(url.split("?", 1)[0]) or "ffmpeg.zip"
+    try:
+        if sha256 is None and checksum_url:
+            sha256 = fetch_checksum(checksum_url, zip_path)
+        print(f"Downloading {url}")
+        download(url, zip_path, sha256=sha256)
+        print("📦 Extracting FFmpeg...")
+        for path in extract_needed(zip_path, target_dir):
+            print(f"  {path}")
+        os.remove(zip_path)
+        print("✓ FFmpeg setup completed successfully")
+        return True
+    except (urllib.error.URLError, OSError, zipfile.BadZipFile, BootstrapError) as e:
+        # The partial download is kept, running again resumes it
+        print(f"\n❌ Error setting up FFmpeg: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Download the FFmpeg binaries for Waver")
+    parser.add_argument("--url", help="Archive URL (default: latest win64 GPL build)")
+    parser.add_argument("--sha256", help="Expected SHA-256 of the archive")
+    parser.add_argument("--checksum-url", default=CHECKSUM_URL, help="sha256sum listing to look the checksum up in")
+    parser.add_argument("--no-checksum", action="store_true", help="Skip checksum verification")
+    parser.add_argument("--target", default=FFMPEG_DIR, help="Install folder (default: ffmpeg_bin)")
+    args = parser.parse_args()
+
+    ok = install_ffmpeg(args.target, url=args.url, sha256=args.sha256,
+                        checksum_url=None if args.no_checksum else args.checksum_url)
+    sys.exit(0 if ok else 1)
@@ -4,13 +4,8 @@ Waver v1.1.0 Setup Script
 Handles installation of dependencies and application packaging
 """
 
-import os
 import sys
 import subprocess
-import urllib.request
-import zipfile
-import shutil
-from pathlib import Path
 from setuptools import setup, find_packages
 
 # Version information
@@ -55,71 +50,10 @@ FFMPEG_URL = f"https://github.com/BtbN/FFmpeg-Builds/releases/download/latest/ff
 FFMPEG_DIR = "ffmpeg_bin"
 
 def download_ffmpeg():
-    """Download and extract FFmpeg binaries if not present"""
+    """Download FFmpeg binaries if not present (resumable, checksum verified)"""
     print("Checking for FFmpeg binaries...")
-    
-    ffmpeg_exe = os.path.join(FFMPEG_DIR, "bin", "ffmpeg.exe")
-    if os.path.exists(ffmpeg_exe):
-        print(f"FFmpeg already exists at {ffmpeg_exe}")
-        return True
-    
-    print("FFmpeg not found. Downloading...")
-    try:
-        # Create ffmpeg directory
-        os.makedirs(FFMPEG_DIR, exist_ok=True)
-        
-        # Download FFmpeg
-        zip_path = "ffmpeg.zip"
-        print(f"Downloading from {FFMPEG_URL}")
-        urllib.request.urlretrieve(FFMPEG_URL, zip_path)
-        
-        # Extract FFmpeg
-        print("Extracting FFmpeg...")
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            # Extract all files
-            zip_ref.extractall("temp_ffmpeg")
-            
-            # Find the extracted folder (it will have a specific name)
-            temp_dir = "temp_ffmpeg"
-            extracted_folders = [f for f in os.listdir(temp_dir) if os.path.isdir(os.path.join(temp_dir, f))]
-            
-            if extracted_folders:
-                source_dir = os.path.join(temp_dir, extracted_folders[0])
-                
-                # Copy bin folder
-                if os.path.exists(os.path.join(source_dir, "bin")):
-                    shutil.copytree(os.path.join(source_dir, "bin"), 
-                                  os.path.join(FFMPEG_DIR, "bin"), 
-                                  dirs_exist_ok=True)
-                
-                # Copy doc folder if it exists
-                if os.path.exists(os.path.join(source_dir, "doc")):
-                    shutil.copytree(os.path.join(source_dir, "doc"), 
-                                  os.path.join(FFMPEG_DIR, "doc"), 
-                                  dirs_exist_ok=True)
-                
-                # Copy presets folder if it exists
-                if os.path.exists(os.path.join(source_dir, "presets")):
-                    shutil.copytree(os.path.join(source_dir, "presets"), 
-                                  os.path.join(FFMPEG_DIR, "presets"), 
-                                  dirs_exist_ok=True)
-                
-                # Copy license files
-                for file in ["LICENSE", "README.txt"]:
-                    src_file = os.path.join(source_dir, file)
-                    if os.path.exists(src_file):
-                        shutil.copy2(src_file, os.path.join(FFMPEG_DIR, file))
-        
-        # Cleanup
-        os.remove(zip_path)
-        shutil.rmtree("temp_ffmpeg")
-        
-        print("FFmpeg download and extraction completed successfully!")
-        return True
-        
-    except Exception as e:
-        print(f"Error downloading FFmpeg: {e}")
-        return False
+    from ffmpeg_bootstrap import install_ffmpeg
+    return install_ffmpeg(FFMPEG_DIR, url=FFMPEG_URL)
 
 def install_dependencies():
     """Install Python dependencies"""
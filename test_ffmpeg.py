@@ -44,15 +44,18 @@ def test_ffmpeg_installation():
             version_line = lines[0] if lines else "Unknown version"
             print(f"✅ FFmpeg is working: {version_line}")
             
-            # Show some key capabilities
-            output = result.stdout.lower()
+            # Show some key capabilities, by encoder name rather than -version text
+            encoders = subprocess.run([str(ffmpeg_exe), "-hide_banner", "-encoders"],
+                                      capture_output=True, text=True, timeout=10).stdout
+            names = {line.split()[1] for line in encoders.splitlines()
+                     if len(line.split()) > 1 and len(line.split()[0]) == 6}
             formats = []
-            if 'libx264' in output:
+            if 'libx264' in names:
                 formats.append("H.264/MP4")
-            if 'libmp3lame' in output or 'mp3' in output:
+            if names & {'libmp3lame', 'mp3_mf', 'libshine'}:
                 formats.append("MP3")
-            if 'libvorbis' in output or 'vorbis' in output:
-                formats.append("OGG/Vorbis")
+            if 'pcm_s16le' in names:
+                formats.append("WAV")
             
             if formats:
                 print(f"📋 Supported formats: {', '.join(formats)}")
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Retry Policy Test Script for Waver
+Runs Waver's retry policy and circuit breaker against a local server that
+injects throttling and server errors, no network access needed
+"""
+
+import os
+import sys
+import time
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ErrorInjectingHandler(BaseHTTPRequestHandler):
+    """Answers /<name> with the next status queued for name, 200 once the queue is empty"""
+    script = {}
+    hits = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        name = self.path.strip("/")
+        with self.lock:
+            self.hits[name] = self.hits.get(name, 0) + 1
+            statuses = self.script.get(name, [])
+            status = statuses.pop(0) if statuses else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def fetch(url):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.read()
+
+
+def test_retry_policy():
+    """Test retries, backoff and the circuit breaker against the local server"""
+    print("🔁 Testing Waver's Retry Policy")
+    print("=" * 50)
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtCore import QStandardPaths
+    QStandardPaths.setTestModeEnabled(True)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import Waver
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ErrorInjectingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    script, hits = ErrorInjectingHandler.script, ErrorInjectingHandler.hits
+    passed = True
+
+    def check(ok, message):
+        nonlocal passed
+        print(f"{'✅' if ok else '❌'} {message}")
+        passed = passed and ok
+
+    # Short delays so the whole run takes a few seconds
+    def policy():
+        return Waver.RetryPolicy(attempts=4, base_delay=0.05, max_delay=0.2, threshold=3, cooldown=0.5)
+
+    try:
+        # Test 1: transient server errors are retried
+        print("\n🔍 Server errors, then success...")
+        script["flaky"] = [500, 502]
+        retries = []
+        result = policy().call(f"{base}/flaky", lambda: fetch(f"{base}/flaky"),
+                               on_retry=lambda attempt, delay, e: retries.append(delay))
+        check(result == b"ok" and hits["flaky"] == 3, f"Succeeded after {len(retries)} retries")
+        check(all(0.025 <= d <= 0.2 for d in retries) and retries[1] >= retries[0] / 2,
+              f"Backoff delays: {', '.join(f'{d:.3f}s' for d in retries)}")
+
+        # Test 2: errors that retrying can't fix are not retried
+        print("\n🔍 Not found...")
+        script["missing"] = [404]
+        try:
+            policy().call(f"{base}/missing", lambda: fetch(f"{base}/missing"))
+            check(False, "404 should have raised")
+        except Exception as e:
+            check(hits["missing"] == 1, f"Gave up at once: {e}")
+
+        # Test 3: throttling opens the breaker, waiting callers don't hit the server
+        print("\n🔍 Throttling and the circuit breaker...")
+        script["busy"] = [429] * 3 + [503]
+        retry_policy = policy()
+        url = f"{base}/busy"
+        try:
+            retry_policy.call(url, lambda: fetch(url), attempts=3)
+            check(False, "Three 429s should have raised")
+        except Exception as e:
+            print(f"  First caller gave up: {e}")
+        check(retry_policy.open_for(url) > 0, f"Breaker open ({retry_policy.describe()})")
+        try:
+            retry_policy.call(url, lambda: fetch(url), wait=False)
+            check(False, "An open breaker should refuse callers that don't wait")
+        except Waver.HostThrottledError as e:
+            check(hits["busy"] == 3, f"Refused without a request: {e}")
+
+        # The first probe gets a 503 and reopens the breaker for longer, the second one closes it
+        results, waits = [], []
+        callers = [threading.Thread(target=lambda: results.append(retry_policy.call(
+                       url, lambda: fetch(url), on_wait=lambda host, seconds: waits.append(seconds))))
+                   for _ in range(3)]
+        start = time.monotonic()
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join(10)
+        elapsed = time.monotonic() - start
+        check(results == [b"ok"] * 3, f"All waiting callers finished after {elapsed:.1f}s")
+        check(hits["busy"] == 3 + 1 + 3, f"Server saw {hits['busy']} requests (3 throttled, 1 failed probe, 3 ok)")
+        check(elapsed >= 0.5 + 1.0 - 0.1, "Second cooldown was doubled")
+        check(not retry_policy.open_for(url), f"Breaker closed ({retry_policy.describe()})")
+
+        # Test 4: hosts are grouped by site
+        print("\n🔍 Host grouping...")
+        check(Waver.host_of("https://www.youtube.com/watch?v=x") == Waver.host_of("https://youtu.be/x")
+              == Waver.host_of("https://m.youtube.com/watch?v=x") == "youtube.com", "YouTube URLs share one host")
+        check(Waver.host_of("https://www.bbc.co.uk/x") != Waver.host_of("https://news.example.co.uk/a"),
+              "Sites under co.uk get their own breakers")
+        check(Waver.classify_error("ERROR: unable to download video data: HTTP Error 429: Too Many Requests")
+              == "throttled", "yt-dlp 429 counts as throttling")
+        check(Waver.classify_error("ERROR: Video unavailable") is None, "Unavailable video is not retried")
+    finally:
+        server.shutdown()
+
+    print("\n" + "=" * 50)
+    print("🎉 Retry policy test complete!" if passed else "❌ Some retry policy checks failed")
+    return passed
+
+
+def main():
+    """Main function"""
+    try:
+        return 0 if test_retry_policy() else 1
+    except KeyboardInterrupt:
+        print("\n\nTest interrupted by user")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Tag Writer Test Script for Waver
+Tags generated WAV and MP4 files with BPM and key and checks that their
+structure survives: header sizes, chunk alignment and the tag reading back
+"""
+
+import os
+import sys
+import wave
+import struct
+import tempfile
+
+
+def write_wav(path, frames):
+    """Mono 8-bit silence, an odd frame count gives an odd-sized data chunk"""
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(1)
+        f.setframerate(8000)
+        f.writeframes(b"\x80" * frames)
+
+
+def riff_chunks(path):
+    """(riff_size, file_size, [(chunk_id, offset, size)], end of the last chunk)"""
+    with open(path, "rb") as f:
+        data = f.read()
+    chunks, pos = [], 12
+    while pos + 8 <= len(data):
+        chunk_id, size = struct.unpack("<4sI", data[pos:pos + 8])
+        chunks.append((chunk_id, pos, size))
+        pos += 8 + size + (size & 1)
+    return struct.unpack("<I", data[4:8])[0], len(data), chunks, pos
+
+
+def mp4_atom(atom_type, payload, large=False):
+    """An MP4 atom, with a 64-bit size field when large"""
+    if large:
+        return struct.pack(">I4sQ", 1, atom_type, 16 + len(payload)) + payload
+    return struct.pack(">I4s", 8 + len(payload), atom_type) + payload
+
+
+def test_wav_tagging():
+    """Test that tagging a WAV keeps its RIFF header and chunks consistent"""
+    print("🏷️ Testing Waver's WAV Tagging")
+    print("=" * 50)
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import Waver
+
+    passed = True
+
+    def check(ok, message):
+        nonlocal passed
+        print(f"{'✅' if ok else '❌'} {message}")
+        passed = passed and ok
+
+    with tempfile.TemporaryDirectory() as folder:
+        for frames in (8000, 8001):
+            path = os.path.join(folder, f"tone{frames}.wav")
+            write_wav(path, frames)
+            print(f"\n🔍 {frames}-byte data chunk...")
+            # First run appends the tag chunk, later ones rewrite it in place
+            for bpm, key in ((128.0, "A Minor"), (96.0, "F# Major"), (140.0, "C Major")):
+                Waver.tag_wav(path, bpm, key)
+                riff_size, file_size, chunks, end = riff_chunks(path)
+                check(riff_size == file_size - 8, f"RIFF size {riff_size} = file size {file_size} - 8")
+                check(end == file_size and file_size % 2 == 0, "Chunks are word aligned and end at the end of the file")
+                id3 = [chunk for chunk in chunks if chunk[0] == b"id3 "]
+                check(len(id3) == 1, f"One id3 chunk ({', '.join(c[0].decode() for c in chunks)})")
+                with open(path, "rb") as f:
+                    f.seek(id3[0][1] + 8)
+                    tag = Waver._read_id3(f)
+                values = {frame_id: raw[11:].decode("latin-1") for frame_id, raw in tag[2]} if tag else {}
+                check(values.get(b"TBPM") == str(int(bpm)) and values.get(b"TKEY") == Waver.key_tag_value(key),
+                      f"Tag reads back as {values.get(b'TBPM')} BPM, {values.get(b'TKEY')}")
+            with wave.open(path, "rb") as f:
+                check(f.getnframes() == frames, "Audio is unchanged")
+
+        print("\n🔍 Repairing a file with a stale RIFF size and stray bytes...")
+        path = os.path.join(folder, "tone8000.wav")
+        size = os.path.getsize(path)
+        with open(path, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            f.write(struct.pack("<I", size - 8))
+            f.seek(4)
+            f.write(struct.pack("<I", size - 2108))
+        Waver.tag_wav(path, 120.0, "D Minor")
+        riff_size, file_size, chunks, end = riff_chunks(path)
+        check(riff_size == file_size - 8 and file_size == size, f"Repaired: RIFF size {riff_size}, file size {file_size}")
+
+    print("\n" + "=" * 50)
+    print("🎉 WAV tagging test complete!" if passed else "❌ Some WAV tagging checks failed")
+    return passed
+
+
+def test_mp4_tagging():
+    """Test that tagging an MP4 whose moov atom has a 64-bit size keeps its children intact"""
+    print("\n🏷️ Testing Waver's MP4 Tagging")
+    print("=" * 50)
+
+    import Waver
+
+    passed = True
+
+    def check(ok, message):
+        nonlocal passed
+        print(f"{'✅' if ok else '❌'} {message}")
+        passed = passed and ok
+
+    mvhd = mp4_atom(b"mvhd", bytes(range(100)))
+    mdat = mp4_atom(b"mdat", b"\x55" * 1000)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "large_moov.m4a")
+        with open(path, "wb") as f:
+            f.write(mp4_atom(b"ftyp", b"M4A \x00\x00\x00\x00") + mdat + mp4_atom(b"moov", mvhd, large=True))
+        print("\n🔍 moov with a 64-bit size...")
+        for bpm in (128.0, 96.0):
+            Waver.tag_mp4(path, bpm, "A Minor")
+            with open(path, "rb") as f:
+                data = f.read()
+            atoms = Waver._mp4_atoms(data)
+            check(atoms[-1][1] + atoms[-1][3] == len(data), f"Atoms cover the file ({', '.join(a[0].decode() for a in atoms)})")
+            check(mdat in data, "Media data is unchanged")
+            moov = [atom for atom in atoms if atom[0] == b"moov"]
+            children = Waver._mp4_atoms(data, moov[0][1] + moov[0][2], moov[0][1] + moov[0][3]) if moov else []
+            check([child[0] for child in children] == [b"mvhd", b"udta"],
+                  f"moov holds {', '.join(child[0].decode(errors='replace') for child in children)}")
+            check(mvhd in data and struct.pack(">H", int(bpm)) in data, f"mvhd kept, tagged as {int(bpm)} BPM")
+
+    print("\n" + "=" * 50)
+    print("🎉 MP4 tagging test complete!" if passed else "❌ Some MP4 tagging checks failed")
+    return passed
+
+
+def main():
+    """Main function"""
+    try:
+        return 0 if test_wav_tagging() & test_mp4_tagging() else 1
+    except KeyboardInterrupt:
+        print("\n\nTest interrupted by user")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())